@@ -3,52 +3,456 @@ import sqlite3
 import os
 import sys
 import datetime
-from dateutil.relativedelta import relativedelta
+import json
+import base64
+import hashlib
+import threading
+import weakref
+import time
+from collections import OrderedDict
 from flask import (
-    Flask, render_template, request, g, redirect, url_for, flash
+    Flask, render_template, request, g, redirect, url_for, flash, jsonify, Response, stream_with_context, session,
+    before_render_template, template_rendered
 )
+from inventory_ops import (receive_stock_order, resolve_part_identifiers, fts_match_query, age_threshold,
+                           claim_items, claim_available_units, assign_items_to_booking, booking_item_status,
+                           release_booking_items, cascade_booking_status, fetch_booking_parts,
+                           status_history, time_in_status, booking_turnaround,
+                           ITEM_DAYS_IN_SYSTEM_SQL, BOOKING_MONTHS_IN_SYSTEM_SQL)
+from export_data import stream_export, export_filename, EXPORTS, EXPORT_FORMATS
+from db_pool import ConnectionPool, begin_immediate, dict_row_factory
+from markupsafe import Markup
+import db_metrics
 
 # --- Configuration ---
 DATABASE = 'inventory.db'
 ALLOWED_ITEM_STATUSES = ['Available', 'Reserved', 'Installed', 'Broken', 'Returned']
 PART_TYPES_CATEGORIES = ["Screen", "Battery", "Back Cover", "Charging Port", "Camera", "Adhesive", "Small Parts", "Tools", "Other"]
 OLD_STOCK_THRESHOLD_MONTHS = 5
+OPEN_ITEM_STATUSES = ('Available', 'Reserved') # Items still on the shelf; old orders holding these are 'aged'
+AGED_STOCK_REFRESH_SECONDS = 300 # Ages move with the clock, so recompute at least this often
 ALLOWED_BOOKING_STATUSES = ['Booked In', 'In Progress', 'Awaiting Part', 'Ready for Collection', 'Completed', 'Cancelled']
-DB_SCHEMA_REQ = 8 # Required schema version for this app
+DB_SCHEMA_REQ = 19 # Required schema version for this app
+INDEX_PAGE_SIZE_DEFAULT = 100
+INDEX_PAGE_SIZE_MAX = 500
+PARTS_LOOKUP_LIMIT_DEFAULT = 50
+PARTS_LOOKUP_LIMIT_MAX = 200
+PARTS_LOOKUP_MAX_AGE = 10 # Seconds; availability changes as bookings reserve items
+API_PAGE_SIZE_DEFAULT = 100
+API_PAGE_SIZE_MAX = 1000
+CATALOGUE_FRAGMENT_CACHE_SIZE = 16 # Rendered catalogue tables kept per process (LRU)
+BULK_STATUS_MAX_ITEMS = 5000 # Upper bound on items one bulk status change may touch
+SQLITE_MAX_INT = 2 ** 63 - 1 # Largest INTEGER / rowid SQLite stores
+EXPORT_STATUSES = {'inventory': ALLOWED_ITEM_STATUSES, 'bookings': ALLOWED_BOOKING_STATUSES} # Valid 'status' filter per export
+DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', 8))
+DB_WRITE_POOL_SIZE = 1 # Single writer: POST requests queue in the pool instead of fighting over the SQLite lock
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 250)) # Queries at or above this are logged with their plan
 
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY', 'a_very_secret_dev_key_change_me')
 
 # --- Database Connection Handling ---
-def get_db():
-    if 'db' not in g:
+# GET routes read through get_read_db() (mode=ro, query_only) so long overview
+# queries never hold up goods-in; routes that write use get_db(), the serialized
+# writer, and open their transactions with begin_immediate().
+_db_pools = {}
+
+def get_db_pool(read_only=False):
+    """Returns the process-wide reader or writer pool, (re)creating it if DATABASE changed."""
+    pool = _db_pools.get(read_only)
+    if pool is None or pool.database != DATABASE:
+        if pool is not None:
+            pool.close()
+        if read_only:
+            get_db_pool(read_only=False) # Writer sets WAL mode before any mode=ro connection opens
+            pool = ConnectionPool(DATABASE, max_size=DB_READ_POOL_SIZE, timeout=DB_POOL_TIMEOUT, read_only=True,
+                                  factory=db_metrics.InstrumentedConnection)
+        else:
+            pool = ConnectionPool(DATABASE, max_size=DB_WRITE_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                                  factory=db_metrics.InstrumentedConnection)
+            pool.release(pool.acquire())
+        _db_pools[read_only] = pool
+    return pool
+
+def _acquire_db(attr, read_only):
+    if attr not in g:
         try:
-            g.db = sqlite3.connect(DATABASE)
-            g.db.row_factory = sqlite3.Row
-            g.db.execute("PRAGMA foreign_keys = ON")
+            setattr(g, attr, get_db_pool(read_only).acquire())
         except sqlite3.Error as e:
             print(f"DB CONNECT ERROR: {e}", file=sys.stderr)
-            g.db = None
             raise e
-    return g.db
+    return getattr(g, attr)
+
+def get_db():
+    """Connection from the single-writer pool, for routes that modify data."""
+    return _acquire_db('db', read_only=False)
+
+def get_read_db():
+    """Read-only connection for GET routes."""
+    return _acquire_db('read_db', read_only=True)
 
 @app.teardown_appcontext
 def close_db(error):
-    db = g.pop('db', None)
-    if db is not None:
-        try:
-            db.close()
-        except sqlite3.Error as e:
-            print(f"ERROR CLOSING DB: {e}", file=sys.stderr)
+    for attr, read_only in (('db', False), ('read_db', True)):
+        db = g.pop(attr, None)
+        if db is not None:
+            try:
+                get_db_pool(read_only).release(db) # Rolls back anything the request left uncommitted
+            except sqlite3.Error as e:
+                print(f"ERROR RELEASING DB: {e}", file=sys.stderr)
     if error:
         print(f"Request teardown error: {error}", file=sys.stderr)
 
+# --- Request Instrumentation ---
+# Every pooled connection is a db_metrics.InstrumentedConnection: while a request
+# is active its cursors record each statement's time and row count. After the
+# request, statements slower than SLOW_QUERY_MS are logged with EXPLAIN QUERY PLAN,
+# totals go to a Server-Timing header, and aggregates are served at /metrics.
+metrics_registry = db_metrics.MetricsRegistry()
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.request_stats, g.request_stats_token = db_metrics.start_request()
+
+@app.after_request
+def record_request_metrics(response):
+    stats = g.get('request_stats')
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    slow_queries = db_metrics.log_slow_queries(stats, SLOW_QUERY_MS / 1000, context=f"[{request.method} {request.path}]")
+    metrics_registry.observe_request(request.endpoint, request.method, response.status_code, elapsed, stats, slow_queries)
+    response.headers['Server-Timing'] = (
+        f'db;dur={stats.query_seconds * 1000:.1f};desc="{len(stats.queries)} queries, {stats.rows} rows", '
+        f'tpl;dur={stats.template_seconds * 1000:.1f}, total;dur={elapsed * 1000:.1f}')
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error):
+    token = g.pop('request_stats_token', None)
+    if token is not None:
+        db_metrics.finish_request(token)
+
+def _template_started(sender, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+def _template_finished(sender, template, context, **extra):
+    stats, starts = db_metrics.current_stats(), g.get('template_starts')
+    if stats is not None and starts:
+        stats.add_template(template.name or '(string)', time.perf_counter() - starts.pop())
+
+before_render_template.connect(_template_started, app)
+template_rendered.connect(_template_finished, app)
+
 # --- Utility ---
 def flash_errors(errors):
     for e in errors:
         flash(e, 'error')
 
+def parse_page_size(value, default=INDEX_PAGE_SIZE_DEFAULT, maximum=INDEX_PAGE_SIZE_MAX):
+    """Parses a page size query arg, clamped to 1..maximum."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+def parse_db_id(value):
+    """Parses a row ID from JSON or form input: an int or a string of digits (not a bool, float, list...).
+
+    Raises TypeError / ValueError otherwise, or when it is outside SQLite's positive integer range.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise TypeError(f"ID must be an integer, not {type(value).__name__}")
+    row_id = int(value)
+    if not 0 < row_id <= SQLITE_MAX_INT:
+        raise ValueError(f"ID {row_id} out of range")
+    return row_id
+
+def parse_min_age(value):
+    """Parses an 'older than N' query arg; returns a non-negative int or None when absent/invalid."""
+    try:
+        age = int(value)
+    except (TypeError, ValueError):
+        return None
+    return age if age >= 0 else None
+
+def encode_cursor(values):
+    """Encodes a keyset position (list of sort key values) as an opaque URL-safe token."""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token, length):
+    """Decodes a token from encode_cursor(). Returns None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    return values
+
+def like_escape(term):
+    """Escapes LIKE wildcards in user input; use with ESCAPE '\\'."""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def json_response(payload, max_age=0):
+    """Builds a JSON response with a content-hash ETag and answers If-None-Match with 304."""
+    response = jsonify(payload)
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+# --- Filter Facet Cache ---
+# Distinct brand / model / part type values for the index filters. They only change
+# when part types are written, so they are cached per process. The cache is dropped
+# when this process writes part types (bump_catalogue_generation()) or when another
+# connection or process commits a catalogue change: PRAGMA data_version on the reading
+# connection moved and catalogue_version (bumped by part_types triggers) differs.
+_facet_lock = threading.Lock()
+_facet_cache = {'generation': 0, 'catalogue_version': None, 'values': {}}
+_catalogue_generation = 0
+_seen_data_versions = {} # id(connection) -> PRAGMA data_version when last checked
+
+def bump_catalogue_generation():
+    global _catalogue_generation
+    with _facet_lock:
+        _catalogue_generation += 1
+
+def _check_facet_cache(conn):
+    """Drops the cached facets if the catalogue changed since they were loaded."""
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    with _facet_lock:
+        if _facet_cache['generation'] != _catalogue_generation:
+            _facet_cache.update(generation=_catalogue_generation, catalogue_version=None, values={})
+        if _seen_data_versions.get(id(conn)) == data_version and _facet_cache['catalogue_version'] is not None:
+            return
+    catalogue_version = conn.execute("SELECT version FROM catalogue_version WHERE id = 1").fetchone()[0]
+    with _facet_lock:
+        _seen_data_versions[id(conn)] = data_version
+        if _facet_cache['catalogue_version'] != catalogue_version:
+            _facet_cache.update(catalogue_version=catalogue_version, values={})
+
+def _cached_facet(conn, key, sql, params=()):
+    with _facet_lock:
+        values = _facet_cache['values'].get(key)
+    if values is None:
+        values = [row[0] for row in conn.execute(sql, params).fetchall()]
+        with _facet_lock:
+            _facet_cache['values'][key] = values
+    return values
+
+def get_filter_facets(conn, brand='', model=''):
+    """Returns (brands, models, part_types) for the filter dropdowns.
+
+    Models are narrowed to the selected brand, and part types to the selected
+    brand/model, so the dropdowns only offer combinations that exist.
+    """
+    _check_facet_cache(conn)
+    brands = _cached_facet(conn, ('brands',),
+        "SELECT DISTINCT brand FROM part_types WHERE brand IS NOT NULL AND brand != '' ORDER BY brand")
+    model_sql = "SELECT DISTINCT model FROM part_types WHERE model IS NOT NULL AND model != ''"
+    type_sql = "SELECT DISTINCT part_type FROM part_types WHERE part_type IS NOT NULL AND part_type != ''"
+    if brand:
+        model_sql += " AND brand = ?"
+    models = _cached_facet(conn, ('models', brand), model_sql + " ORDER BY model", (brand,) if brand else ())
+    type_params = []
+    if brand: type_sql += " AND brand = ?"; type_params.append(brand)
+    if model: type_sql += " AND model = ?"; type_params.append(model)
+    part_types = _cached_facet(conn, ('part_types', brand, model), type_sql + " ORDER BY part_type", tuple(type_params))
+    return brands, models, part_types
+
+# --- Aged Stock Service ---
+# The aged set (orders older than OLD_STOCK_THRESHOLD_MONTHS that still hold open
+# items) is computed with one grouped query and kept in process. It is recomputed
+# after AGED_STOCK_REFRESH_SECONDS or when a stock write in this process calls
+# invalidate_aged_stock(), so the index page alert is a lookup, not a scan.
+_aged_stock_lock = threading.Lock()
+_aged_stock = {'computed_at': None, 'threshold': None, 'lines': [], 'order_ids': frozenset()}
+
+def invalidate_aged_stock():
+    with _aged_stock_lock:
+        _aged_stock['computed_at'] = None
+
+def get_aged_stock(conn, force=False):
+    """Returns the aged stock snapshot, recomputing it if it is stale.
+
+    The snapshot has 'lines' (one row per aged order and part type with open item
+    counts), 'order_ids' (the aged order ids), 'threshold' and 'computed_at'.
+    """
+    with _aged_stock_lock:
+        computed_at = _aged_stock['computed_at']
+        if not force and computed_at is not None and time.monotonic() - computed_at < AGED_STOCK_REFRESH_SECONDS:
+            return dict(_aged_stock)
+
+    threshold = age_threshold(months=OLD_STOCK_THRESHOLD_MONTHS)
+    status_placeholders = ", ".join("?" * len(OPEN_ITEM_STATUSES))
+    # Driven from idx_stock_order_date; open items per line come from idx_invitem_line_status
+    rows = conn.execute(f"""
+        SELECT so.id AS order_id, so.order_number, so.order_date,
+               pt.id AS part_type_id, pt.part_name, pt.part_number, pt.artikelnummer, pt.brand, pt.model,
+               SUM(i.status = 'Available') AS available_count,
+               SUM(i.status = 'Reserved') AS reserved_count
+        FROM stock_orders so
+        JOIN stock_order_lines sol ON sol.stock_order_id = so.id
+        JOIN inventory_items i ON i.stock_order_line_id = sol.id AND i.status IN ({status_placeholders})
+        JOIN part_types pt ON sol.part_id = pt.id
+        WHERE so.order_date < ?
+        GROUP BY so.id, pt.id
+        ORDER BY so.order_date ASC, so.id ASC, pt.brand, pt.model, pt.part_name
+    """, OPEN_ITEM_STATUSES + (threshold,)).fetchall()
+
+    snapshot = {'computed_at': time.monotonic(), 'threshold': threshold,
+                'lines': [dict(row) for row in rows],
+                'order_ids': frozenset(row['order_id'] for row in rows)}
+    with _aged_stock_lock:
+        _aged_stock.update(snapshot)
+    return snapshot
+
+# --- Inventory Listing (keyset pagination) ---
+# Part type half of the seek key. NULL brand/model sort as '' so the row-value
+# comparisons never hit NULL; matches idx_pt_sort_key (schema v9). Ties are broken
+# by pt.id and then i.id so the planner can walk part types in index order and read
+# each part type's items through idx_invitem_parttype_id without a sort.
+INVENTORY_PART_KEY = ("COALESCE(pt.brand, '')", "COALESCE(pt.model, '')", "pt.part_name", "pt.id")
+# Age sorts seek on (date_received, id), served by idx_invitem_date_received (schema v15)
+INVENTORY_AGE_SORTS = {'oldest': 'ASC', 'newest': 'DESC'}
+INVENTORY_SORTS = ('part',) + tuple(INVENTORY_AGE_SORTS)
+
+def inventory_cursor_len(sort):
+    return 2 if sort in INVENTORY_AGE_SORTS else len(INVENTORY_PART_KEY) + 1
+
+def inventory_sort_values(row, sort='part'):
+    if sort in INVENTORY_AGE_SORTS:
+        return [row['date_received'], row['id']]
+    return [row['brand'] or '', row['model'] or '', row['part_name'], row['part_type_id'], row['id']]
+
+def fetch_inventory_page(cursor, filters, page_size, after=None, before=None, sort='part'):
+    """Fetches one page of inventory items by seeking past a cursor instead of using OFFSET.
+
+    'after' / 'before' are decoded cursors (sort key value lists) for the given
+    'sort' ('part', 'oldest' or 'newest'). filters['min_days'] keeps only items at
+    least that many days old. Rows are dicts with a computed 'days_in_system'.
+    Returns (rows, next_cursor, prev_cursor); a cursor is None when there is no
+    page in that direction.
+    """
+    query = f"""
+        SELECT i.id, i.serial_number, i.status, i.current_location, i.notes, i.last_updated, i.date_received,
+               {ITEM_DAYS_IN_SYSTEM_SQL} AS days_in_system,
+               pt.id AS part_type_id, pt.part_name, pt.part_number, pt.artikelnummer, pt.brand, pt.model,
+               pt.part_type, pt.storage_location,
+               so.order_number
+        FROM part_types pt
+        JOIN inventory_items i ON i.part_type_id = pt.id
+        LEFT JOIN stock_order_lines sol ON i.stock_order_line_id = sol.id
+        LEFT JOIN stock_orders so ON sol.stock_order_id = so.id
+        WHERE 1=1
+    """
+    # Filters are written with a unary '+' so they cannot drive an index of their own: the
+    # planner keeps walking the sort key index in order and stops after LIMIT rows, instead
+    # of collecting every matching row and sorting them in a temp b-tree.
+    params = []
+    if filters.get('brand'): query += " AND +pt.brand = ?"; params.append(filters['brand'])
+    if filters.get('model'): query += " AND +pt.model = ?"; params.append(filters['model'])
+    if filters.get('type'): query += " AND +pt.part_type = ?"; params.append(filters['type'])
+    if filters.get('status'): query += " AND +i.status = ?"; params.append(filters['status'])
+    if filters.get('min_days') is not None:
+        # Age sorts walk idx_invitem_date_received anyway, so there the bound may seek into it
+        date_col = "i.date_received" if sort in INVENTORY_AGE_SORTS else "+i.date_received"
+        query += f" AND {date_col} <= ?"; params.append(age_threshold(days=filters['min_days']))
+
+    backwards = before is not None and after is None
+    seek = after if after is not None else before
+    if sort in INVENTORY_AGE_SORTS:
+        descending = (INVENTORY_AGE_SORTS[sort] == 'DESC') != backwards
+        if seek is not None:
+            query += f" AND (i.date_received, i.id) {'<' if descending else '>'} (?, ?)"
+            params.extend(seek)
+        direction = "DESC" if descending else "ASC"
+        query += f" ORDER BY i.date_received {direction}, i.id {direction}"
+    else:
+        if seek is not None:
+            cmp, item_cmp = ('<=', '>=') if backwards else ('>=', '<=')
+            part_key = ", ".join(INVENTORY_PART_KEY)
+            placeholders = ", ".join("?" * len(INVENTORY_PART_KEY))
+            # The single-column bound is redundant but lets SQLite seek into idx_pt_sort_key.
+            query += f"""
+                AND {INVENTORY_PART_KEY[0]} {cmp} ?
+                AND ({part_key}) {cmp} ({placeholders})
+                AND NOT (({part_key}) = ({placeholders}) AND i.id {item_cmp} ?)"""
+            params.append(seek[0])
+            params.extend(seek[:-1])
+            params.extend(seek)
+        direction = "DESC" if backwards else "ASC"
+        query += " ORDER BY " + ", ".join(f"{col} {direction}" for col in INVENTORY_PART_KEY + ("i.id",))
+    query += " LIMIT ?"; params.append(page_size + 1) # One extra row tells us if another page exists
+
+    cursor.row_factory = dict_row_factory
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, after is not None
+
+    next_cursor = encode_cursor(inventory_sort_values(rows[-1], sort)) if rows and has_next else None
+    prev_cursor = encode_cursor(inventory_sort_values(rows[0], sort)) if rows and has_prev else None
+    return rows, next_cursor, prev_cursor
+
+# --- Stock Levels (materialized in part_stock_levels, schema v12) ---
+def fetch_stock_levels(cursor, filters, in_stock_only=False):
+    """Per part type item counts by status, read from part_stock_levels.
+
+    Cost is O(part types x statuses) regardless of how many items exist.
+    Returns a list of dicts with part type details, 'counts' ({status: n}),
+    'total' and 'oldest_available' (date_received of the oldest Available item).
+    """
+    query = """
+        SELECT pt.id AS part_type_id, pt.part_name, pt.part_number, pt.artikelnummer,
+               pt.brand, pt.model, pt.part_type,
+               psl.status, psl.item_count, psl.oldest_date_received
+        FROM part_types pt
+        LEFT JOIN part_stock_levels psl ON psl.part_type_id = pt.id
+        WHERE 1=1
+    """
+    params = []
+    if filters.get('brand'): query += " AND pt.brand = ?"; params.append(filters['brand'])
+    if filters.get('model'): query += " AND pt.model = ?"; params.append(filters['model'])
+    if filters.get('type'): query += " AND pt.part_type = ?"; params.append(filters['type'])
+    if filters.get('status'):
+        query += " AND pt.id IN (SELECT part_type_id FROM part_stock_levels WHERE status = ?)"; params.append(filters['status'])
+    elif in_stock_only:
+        query += " AND psl.part_type_id IS NOT NULL"
+    query += " ORDER BY pt.brand, pt.model, pt.part_name, pt.id"
+    cursor.execute(query, params)
+
+    levels = {}
+    for row in cursor.fetchall():
+        level = levels.get(row['part_type_id'])
+        if level is None:
+            level = levels[row['part_type_id']] = {
+                'part_type_id': row['part_type_id'], 'part_name': row['part_name'],
+                'part_number': row['part_number'], 'artikelnummer': row['artikelnummer'],
+                'brand': row['brand'], 'model': row['model'], 'part_type': row['part_type'],
+                'counts': {status: 0 for status in ALLOWED_ITEM_STATUSES},
+                'total': 0, 'oldest_available': None}
+        if row['status'] is None:
+            continue
+        level['counts'][row['status']] = row['item_count']
+        level['total'] += row['item_count']
+        if row['status'] == 'Available':
+            level['oldest_available'] = row['oldest_date_received']
+    return list(levels.values())
+
 # --- Routes ---
 
 @app.route('/')
@@ -60,63 +464,29 @@ def index():
     filter_model = request.args.get('model', '')
     filter_type = request.args.get('type', '')
     filter_status = request.args.get('status', '')
+    current_filters = {'brand': filter_brand, 'model': filter_model, 'type': filter_type, 'status': filter_status}
+    min_days = parse_min_age(request.args.get('min_days'))
+    sort = request.args.get('sort', 'part')
+    if sort not in INVENTORY_SORTS: sort = 'part'
+    page_size = parse_page_size(request.args.get('page_size'))
+    next_cursor = prev_cursor = None
 
     try:
-        conn = get_db()
+        conn = get_read_db()
         cursor = conn.cursor()
-        threshold_date_str = (datetime.datetime.now() - relativedelta(months=OLD_STOCK_THRESHOLD_MONTHS)).strftime('%Y-%m-%d %H:%M:%S')
-        alert_query = """
-            SELECT 1 FROM stock_orders so
-            WHERE so.order_date < ? AND EXISTS (
-                SELECT 1 FROM stock_order_lines sol
-                JOIN inventory_items i ON sol.id = i.stock_order_line_id
-                WHERE sol.stock_order_id = so.id AND i.status IN ('Available', 'Reserved')
-            ) LIMIT 1;
-        """
-        cursor.execute(alert_query, (threshold_date_str,))
-        if cursor.fetchone():
-            show_old_stock_alert = True
-
-        cursor.execute("SELECT DISTINCT brand FROM part_types WHERE brand IS NOT NULL AND brand != '' ORDER BY brand")
-        brands = [row['brand'] for row in cursor.fetchall()]
-        cursor.execute("SELECT DISTINCT model FROM part_types WHERE model IS NOT NULL AND model != '' ORDER BY model")
-        models = [row['model'] for row in cursor.fetchall()]
-        cursor.execute("SELECT DISTINCT part_type FROM part_types WHERE part_type IS NOT NULL AND part_type != '' ORDER BY part_type")
-        part_type_list = [row['part_type'] for row in cursor.fetchall()]
-
-        # Fetch order_number along with other item details
-        query = """
-            SELECT i.id, i.serial_number, i.status, i.current_location, i.notes, i.last_updated, i.date_received,
-                   pt.part_name, pt.part_number, pt.artikelnummer, pt.brand, pt.model, pt.part_type, pt.storage_location,
-                   so.order_number
-            FROM inventory_items i 
-            JOIN part_types pt ON i.part_type_id = pt.id
-            LEFT JOIN stock_order_lines sol ON i.stock_order_line_id = sol.id
-            LEFT JOIN stock_orders so ON sol.stock_order_id = so.id
-            WHERE 1=1
-        """
-        params = []
-        if filter_brand: query += " AND pt.brand = ?"; params.append(filter_brand)
-        if filter_model: query += " AND pt.model = ?"; params.append(filter_model)
-        if filter_type: query += " AND pt.part_type = ?"; params.append(filter_type)
-        if filter_status: query += " AND i.status = ?"; params.append(filter_status)
-        query += " ORDER BY pt.brand, pt.model, pt.part_name, i.id ASC"
-        cursor.execute(query, params)
-        items_raw = cursor.fetchall()
-
-        now = datetime.datetime.now()
-        for item_row in items_raw:
-            item_dict = dict(item_row) # This will include 'order_number' if fetched
-            days_in_system = 0
-            date_received_str = item_dict.get('date_received')
-            if date_received_str:
-                try:
-                    date_received_dt = datetime.datetime.strptime(date_received_str.split('.')[0], '%Y-%m-%d %H:%M:%S')
-                    days_in_system = (now - date_received_dt).days
-                except (ValueError, TypeError) as e:
-                    print(f"Warning: Could not parse date_received '{date_received_str}' for item ID {item_dict.get('id')}: {e}", file=sys.stderr)
-            item_dict['days_in_system'] = days_in_system
-            items_processed.append(item_dict)
+        show_old_stock_alert = bool(get_aged_stock(conn)['order_ids'])
+
+        brands, models, part_type_list = get_filter_facets(conn, brand=filter_brand, model=filter_model)
+        # Keep a stale selection visible (e.g. model from another brand) so it can be cleared
+        if filter_model and filter_model not in models: models = models + [filter_model]
+        if filter_type and filter_type not in part_type_list: part_type_list = part_type_list + [filter_type]
+
+        cursor_len = inventory_cursor_len(sort)
+        items_processed, next_cursor, prev_cursor = fetch_inventory_page(
+            cursor, dict(current_filters, min_days=min_days), page_size,
+            after=decode_cursor(request.args.get('after'), cursor_len),
+            before=decode_cursor(request.args.get('before'), cursor_len),
+            sort=sort)
     except sqlite3.Error as e:
         print(f"DB Error index: {e}", file=sys.stderr)
         flash(f"Error retrieving inventory items: {e}", "error")
@@ -124,14 +494,70 @@ def index():
         print(f"Error index: {e}", file=sys.stderr)
         flash("An unexpected error occurred.", "error")
 
+    # Pagination links keep the active filters and page size
+    page_args = {k: v for k, v in current_filters.items() if v}
+    if min_days is not None: page_args['min_days'] = min_days
+    if sort != 'part': page_args['sort'] = sort
+    if page_size != INDEX_PAGE_SIZE_DEFAULT: page_args['page_size'] = page_size
+    next_url = url_for('index', after=next_cursor, **page_args) if next_cursor else None
+    prev_url = url_for('index', before=prev_cursor, **page_args) if prev_cursor else None
+
     return render_template('index.html',
                            items=items_processed,
                            brands=brands, models=models, part_type_list=part_type_list,
                            allowed_statuses=ALLOWED_ITEM_STATUSES,
-                           current_filters={'brand': filter_brand, 'model': filter_model, 'type': filter_type, 'status': filter_status},
+                           current_filters=current_filters,
+                           page_size=page_size, next_url=next_url, prev_url=prev_url,
+                           min_days=min_days, sort=sort,
                            show_old_stock_alert=show_old_stock_alert,
                            OLD_STOCK_THRESHOLD_MONTHS=OLD_STOCK_THRESHOLD_MONTHS)
 
+@app.route('/stock/summary')
+def stock_summary():
+    stock_levels = []
+    filters = {'brand': request.args.get('brand', ''), 'model': request.args.get('model', ''),
+               'type': request.args.get('type', '')}
+    in_stock_only = request.args.get('in_stock_only', '1') == '1'
+    try:
+        stock_levels = fetch_stock_levels(get_read_db().cursor(), filters, in_stock_only=in_stock_only)
+    except sqlite3.Error as e:
+        print(f"DB Error stock_summary: {e}", file=sys.stderr)
+        flash(f"Error retrieving stock levels: {e}", "error")
+    return render_template('stock_summary.html',
+                           stock_levels=stock_levels,
+                           allowed_statuses=ALLOWED_ITEM_STATUSES,
+                           current_filters=filters, in_stock_only=in_stock_only)
+
+@app.route('/stock/aged')
+def aged_stock_report():
+    aged = {'lines': [], 'order_ids': frozenset(), 'threshold': None}
+    try:
+        aged = get_aged_stock(get_read_db(), force=request.args.get('refresh') == '1')
+    except sqlite3.Error as e:
+        print(f"DB Error aged_stock_report: {e}", file=sys.stderr)
+        flash(f"Error retrieving aged stock: {e}", "error")
+    return render_template('aged_stock.html',
+                           aged_lines=aged['lines'],
+                           aged_order_count=len(aged['order_ids']),
+                           threshold=aged['threshold'],
+                           OLD_STOCK_THRESHOLD_MONTHS=OLD_STOCK_THRESHOLD_MONTHS)
+
+@app.route('/reports/status_times')
+def status_times_report():
+    since_days = parse_min_age(request.args.get('days'))
+    booking_times, item_times, turnaround = {}, {}, None
+    try:
+        cursor = get_read_db().cursor()
+        booking_times = time_in_status(cursor, 'booking', since_days)
+        item_times = time_in_status(cursor, 'item', since_days)
+        turnaround = booking_turnaround(cursor, since_days)
+    except sqlite3.Error as e:
+        print(f"DB Error status_times_report: {e}", file=sys.stderr)
+        flash(f"Error retrieving status times: {e}", "error")
+    return render_template('status_times.html',
+                           booking_times=booking_times, item_times=item_times,
+                           turnaround=turnaround, since_days=since_days)
+
 @app.route('/inventory/item/<int:item_id>/status', methods=['POST'])
 def update_item_status(item_id):
     new_status = request.form.get('new_status')
@@ -142,11 +568,13 @@ def update_item_status(item_id):
     conn = get_db()
     try:
         cursor = conn.cursor()
+        begin_immediate(conn)
         cursor.execute("UPDATE inventory_items SET status = ?, last_updated = CURRENT_TIMESTAMP WHERE id = ?", (new_status, item_id))
         if cursor.rowcount == 0:
             flash(f"Inventory item ID {item_id} not found.", "error")
         else:
             conn.commit()
+            invalidate_aged_stock()
             flash(f"Status for item ID {item_id} updated to '{new_status}'.", "success")
     except sqlite3.Error as e:
         print(e, file=sys.stderr); flash(f"Database error updating status: {e}", "error")
@@ -156,6 +584,85 @@ def update_item_status(item_id):
         if conn: conn.rollback()
     return redirect(return_url)
 
+@app.route('/api/inventory/items/status', methods=['POST'])
+def bulk_update_item_status():
+    """Sets one status on many inventory items in a single transaction.
+
+    Body (JSON or form): new_status plus either item_ids, or a filter of
+    part_type_id / stock_order_id / current_status. Returns one result per item
+    ('updated', 'unchanged' or 'not_found') so the index page can patch rows in place.
+    """
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {key: request.form.get(key) for key in ('new_status', 'part_type_id', 'stock_order_id', 'current_status')}
+        data['item_ids'] = request.form.getlist('item_ids') or None
+    if not isinstance(data, dict):
+        return jsonify({'error_message': 'Request body must be a JSON object.'}), 400
+    new_status = data.get('new_status')
+    if not new_status or new_status not in ALLOWED_ITEM_STATUSES:
+        return jsonify({'error_message': f"Invalid status '{new_status}'."}), 400
+
+    item_ids = None
+    where, params = [], []
+    try:
+        if data.get('item_ids') is not None:
+            if not isinstance(data['item_ids'], list):
+                raise TypeError("item_ids must be a list")
+            item_ids = list(dict.fromkeys(parse_db_id(item_id) for item_id in data['item_ids']))
+            if not item_ids:
+                return jsonify({'error_message': 'No item IDs given.'}), 400
+            if len(item_ids) > BULK_STATUS_MAX_ITEMS:
+                return jsonify({'error_message': f"At most {BULK_STATUS_MAX_ITEMS} items per request."}), 400
+            where.append("id IN (SELECT value FROM json_each(?))"); params.append(json.dumps(item_ids))
+        else:
+            if data.get('part_type_id'):
+                where.append("part_type_id = ?"); params.append(parse_db_id(data['part_type_id']))
+            if data.get('stock_order_id'):
+                where.append("stock_order_line_id IN (SELECT id FROM stock_order_lines WHERE stock_order_id = ?)")
+                params.append(parse_db_id(data['stock_order_id']))
+            if data.get('current_status'):
+                if data['current_status'] not in ALLOWED_ITEM_STATUSES:
+                    return jsonify({'error_message': f"Invalid current status '{data['current_status']}'."}), 400
+                where.append("status = ?"); params.append(data['current_status'])
+            if not where:
+                return jsonify({'error_message': 'Give item_ids or at least one of part_type_id, stock_order_id, current_status.'}), 400
+    except (TypeError, ValueError):
+        return jsonify({'error_message': 'Item, part type and order IDs must be integers.'}), 400
+    where_sql = " AND ".join(where)
+
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        begin_immediate(conn) # Holds the write lock, so the statuses read here are the ones the UPDATE replaces
+        cursor.execute(f"SELECT id, status FROM inventory_items WHERE {where_sql} ORDER BY id LIMIT ?",
+                       params + [BULK_STATUS_MAX_ITEMS + 1])
+        old_statuses = {row['id']: row['status'] for row in cursor.fetchall()}
+        if len(old_statuses) > BULK_STATUS_MAX_ITEMS:
+            conn.rollback()
+            return jsonify({'error_message': f"Filter matches more than {BULK_STATUS_MAX_ITEMS} items; narrow it down."}), 400
+        cursor.execute(f"UPDATE inventory_items SET status = ?, last_updated = CURRENT_TIMESTAMP WHERE {where_sql} AND status != ?",
+                       [new_status] + params + [new_status])
+        updated_count = cursor.rowcount
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"DB Error bulk_update_item_status: {e}", file=sys.stderr)
+        if conn: conn.rollback()
+        return jsonify({'error_message': 'Database error updating statuses.'}), 500
+    if updated_count:
+        invalidate_aged_stock()
+
+    results = []
+    for item_id in (item_ids if item_ids is not None else old_statuses):
+        old_status = old_statuses.get(item_id)
+        if old_status is None:
+            results.append({'id': item_id, 'result': 'not_found'})
+        else:
+            results.append({'id': item_id, 'result': 'unchanged' if old_status == new_status else 'updated',
+                            'old_status': old_status, 'status': new_status})
+    return jsonify({'new_status': new_status, 'updated': updated_count,
+                    'unchanged': len(old_statuses) - updated_count,
+                    'not_found': len(results) - len(old_statuses), 'results': results})
+
 @app.route('/part_types/add', methods=['GET'])
 def add_part_type_form():
     return render_template('add_part_type.html',
@@ -193,12 +700,14 @@ def add_part_type():
     conn = get_db()
     try:
         cursor = conn.cursor()
+        begin_immediate(conn)
         sql = """INSERT INTO part_types
                  (part_name, part_number, artikelnummer, part_type, brand, model, cost_price, storage_location, description, created_at)
                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)"""
         values = (part_name, part_number, artikelnummer, part_type_category, brand, model, cost_price, storage_location, description)
         cursor.execute(sql, values)
         conn.commit()
+        bump_catalogue_generation()
         flash(f"Part Type '{part_name}' added successfully!", 'success')
         return redirect(url_for('part_types_overview')) # Redirect to overview after add
     except sqlite3.IntegrityError as e:
@@ -219,32 +728,98 @@ def add_part_type():
     return render_template('add_part_type.html', part_types_categories=PART_TYPES_CATEGORIES, submitted_data=request.form), 500
 
 # --- New Routes for Part Type Management ---
+def part_types_query(filters):
+    """SQL and params for the part types list; filters: brand, model, type."""
+    sql = "SELECT id, part_name, part_number, artikelnummer, brand, model, part_type FROM part_types WHERE 1=1"
+    params = []
+    if filters.get('brand'): sql += " AND brand = ?"; params.append(filters['brand'])
+    if filters.get('model'): sql += " AND model = ?"; params.append(filters['model'])
+    if filters.get('type'): sql += " AND part_type = ?"; params.append(filters['type'])
+    sql += " ORDER BY brand, model, part_name ASC, id"
+    return sql, params
+
+# --- Catalogue Page Cache ---
+# part_types_overview and receive_stock_form list the whole part type catalogue,
+# which changes a few times a week. Both are keyed on catalogue_version (bumped by
+# part_types triggers, schema v13): a browser revalidating with If-None-Match or
+# If-Modified-Since gets a 304 after a single-row lookup, and the table rows are
+# rendered once per catalogue version and kept in a small LRU.
+_catalogue_fragment_lock = threading.Lock()
+_catalogue_fragments = OrderedDict() # (template, catalogue version) -> (rendered rows, row count)
+_catalogue_page_salt = str(time.time()) # A restart (possibly with new templates) invalidates browser copies
+_catalogue_page_started = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+def get_catalogue_version(conn):
+    """(version, updated_at) of the catalogue; re-read only after PRAGMA data_version moves."""
+    return api_fingerprint(conn, 'catalogue')
+
+def render_catalogue_rows(template, catalogue, conn):
+    """Rendered table rows for the part type catalogue plus the row count, from the LRU when possible."""
+    key = (template, catalogue[0])
+    with _catalogue_fragment_lock:
+        cached = _catalogue_fragments.get(key)
+        if cached is not None:
+            _catalogue_fragments.move_to_end(key)
+            return cached
+    cursor = conn.cursor()
+    cursor.execute(*part_types_query({}))
+    part_types = cursor.fetchall()
+    cached = (Markup(render_template(template, part_types=part_types)), len(part_types))
+    with _catalogue_fragment_lock:
+        _catalogue_fragments[key] = cached
+        _catalogue_fragments.move_to_end(key)
+        while len(_catalogue_fragments) > CATALOGUE_FRAGMENT_CACHE_SIZE:
+            _catalogue_fragments.popitem(last=False)
+    return cached
+
+def _catalogue_validators(response, page, catalogue):
+    version, updated_at = catalogue
+    response.set_etag(hashlib.sha1(f"{page}:{version}:{_catalogue_page_salt}".encode('utf-8')).hexdigest(), weak=True)
+    last_modified = datetime.datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=datetime.timezone.utc)
+    response.last_modified = max(last_modified, _catalogue_page_started)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True # Always revalidate; a match costs one catalogue_version lookup
+    return response
+
+def catalogue_not_modified(page, catalogue):
+    """304 response if the client's copy of this page is current, else None.
+
+    Pages with pending flash messages are never answered from the browser cache.
+    """
+    if session.get('_flashes'):
+        return None
+    response = _catalogue_validators(Response(), page, catalogue).make_conditional(request)
+    return response if response.status_code == 304 else None
+
+def render_catalogue_page(page, catalogue, template, **context):
+    """Renders a catalogue page with ETag / Last-Modified, unless it shows flash messages or errors."""
+    cacheable = catalogue is not None and not session.get('_flashes') # Checked before rendering consumes them
+    response = Response(render_template(template, **context))
+    return _catalogue_validators(response, page, catalogue) if cacheable else response
+
 @app.route('/part_types/overview')
 def part_types_overview():
-    part_types_list = []
+    part_types_rows, catalogue = '', None
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        # Fetch all relevant columns for the overview
-        cursor.execute("""
-            SELECT id, part_name, part_number, artikelnummer, brand, model, part_type
-            FROM part_types
-            ORDER BY brand, model, part_name ASC
-        """)
-        part_types_list = cursor.fetchall()
+        conn = get_read_db()
+        catalogue = get_catalogue_version(conn)
+        not_modified = catalogue_not_modified('part_types_overview', catalogue)
+        if not_modified is not None:
+            return not_modified
+        part_types_rows, _ = render_catalogue_rows('part_types_rows.html', catalogue, conn)
     except sqlite3.Error as e:
         print(f"DB Error part_types_overview: {e}", file=sys.stderr)
         flash(f"Error retrieving part types: {e}", "error")
     except Exception as e:
         print(f"Error part_types_overview: {e}", file=sys.stderr)
         flash("An unexpected error occurred.", "error")
-    return render_template('part_types_overview.html', part_types=part_types_list)
+    return render_catalogue_page('part_types_overview', catalogue, 'part_types_overview.html', part_types_rows=part_types_rows)
 
 @app.route('/part_type/<int:part_type_id>/edit', methods=['GET'])
 def edit_part_type_form(part_type_id):
     part_type_data = None
     try:
-        conn = get_db()
+        conn = get_read_db()
         cursor = conn.cursor()
         cursor.execute("""
             SELECT id, part_name, part_number, artikelnummer, part_type, brand, model,
@@ -336,6 +911,7 @@ def update_part_type(part_type_id):
 
     try:
         cursor = conn.cursor()
+        begin_immediate(conn)
         sql = """UPDATE part_types SET
                  part_name = ?, part_number = ?, artikelnummer = ?, part_type = ?,
                  brand = ?, model = ?, cost_price = ?, storage_location = ?, description = ?
@@ -344,6 +920,7 @@ def update_part_type(part_type_id):
                   cost_price, storage_location, description, part_type_id)
         cursor.execute(sql, values)
         conn.commit()
+        bump_catalogue_generation()
         flash(f"Part Type '{part_name}' (ID: {part_type_id}) updated successfully!", 'success')
         return redirect(url_for('part_types_overview'))
     except sqlite3.IntegrityError as e:
@@ -391,25 +968,26 @@ def update_part_type(part_type_id):
 
 @app.route('/receive', methods=['GET'])
 def receive_stock_form():
-    part_types_list = []
+    part_types_rows, part_type_count, catalogue = '', 0, None
     try:
-        cursor = get_db().cursor()
-        # Include artikelnummer
-        cursor.execute("SELECT id, part_name, part_number, artikelnummer, brand, model FROM part_types ORDER BY brand, model, part_name ASC")
-        part_types_list = cursor.fetchall()
+        conn = get_read_db()
+        catalogue = get_catalogue_version(conn)
+        not_modified = catalogue_not_modified('receive_stock_form', catalogue)
+        if not_modified is not None:
+            return not_modified
+        part_types_rows, part_type_count = render_catalogue_rows('receive_stock_rows.html', catalogue, conn)
     except sqlite3.Error as e: flash(f"Error loading part types: {e}", "error"); print(e, file=sys.stderr)
     except Exception as e: flash(f"An unexpected error occurred: {e}", "error"); print(e, file=sys.stderr)
-    return render_template('receive_stock.html',
-                           part_types_list=part_types_list,
-                           submitted_order_number='',
-                           submitted_order_date='', # Add this
-                           submitted_notes='')
+    return render_catalogue_page('receive_stock_form', catalogue, 'receive_stock.html',
+                                 part_types_rows=part_types_rows, part_type_count=part_type_count,
+                                 submitted_order_number='',
+                                 submitted_order_date='', # Add this
+                                 submitted_notes='')
 
 @app.route('/receive', methods=['POST'])
 def receive_stock():
     conn = get_db()
     cursor = conn.cursor()
-    items_created_count = 0
     errors = []
     lines_to_process = []
     order_number_ref = request.form.get('order_number') or None
@@ -444,14 +1022,14 @@ def receive_stock():
 
     if errors:
         flash_errors(errors)
-        part_types_list = []
+        part_types_rows, part_type_count = '', 0
         try:
-            cursor.execute("SELECT id, part_name, part_number, artikelnummer, brand, model FROM part_types ORDER BY brand, model, part_name ASC")
-            part_types_list = cursor.fetchall()
+            read_conn = get_read_db()
+            part_types_rows, part_type_count = render_catalogue_rows('receive_stock_rows.html', get_catalogue_version(read_conn), read_conn)
         except sqlite3.Error as e_fetch:
             print(f"Error re-fetching part types for form: {e_fetch}", file=sys.stderr)
         return render_template('receive_stock.html',
-                               part_types_list=part_types_list,
+                               part_types_rows=part_types_rows, part_type_count=part_type_count,
                                submitted_order_number=order_number_ref,
                                submitted_order_date=order_date_str, # Pass back to form
                                submitted_notes=order_notes), 400
@@ -461,45 +1039,27 @@ def receive_stock():
         return redirect(url_for('index'))
 
     try:
-        cursor.execute("BEGIN TRANSACTION")
-        # Modify SQL to use the provided date or default to CURRENT_TIMESTAMP
-        if order_date_to_insert:
-            cursor.execute("INSERT INTO stock_orders (order_number, notes, order_date) VALUES (?, ?, ?)",
-                           (order_number_ref, order_notes, order_date_to_insert))
-        else:
-            cursor.execute("INSERT INTO stock_orders (order_number, notes, order_date) VALUES (?, ?, CURRENT_TIMESTAMP)",
-                           (order_number_ref, order_notes))
-
-        stock_order_id = cursor.lastrowid
-        if not stock_order_id: raise sqlite3.Error("Failed to create stock order record.")
-
-        for line in lines_to_process:
-            part_type_id, qty_received = line['part_type_id'], line['qty']
-            cursor.execute("INSERT INTO stock_order_lines (stock_order_id, part_id, quantity_received) VALUES (?, ?, ?)",
-                           (stock_order_id, part_type_id, qty_received))
-            line_id = cursor.lastrowid
-            if not line_id: raise sqlite3.Error("Failed to create stock order line record.")
-            for _ in range(qty_received):
-                cursor.execute("""INSERT INTO inventory_items (part_type_id, status, stock_order_line_id, date_received, last_updated)
-                                  VALUES (?, 'Available', ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)""",
-                               (part_type_id, line_id))
-                items_created_count += 1
+        begin_immediate(conn)
+        result = receive_stock_order(cursor, lines_to_process, order_number=order_number_ref,
+                                     notes=order_notes, order_date=order_date_to_insert)
         conn.commit()
-        flash(f"Stock received for order '{order_number_ref or '(No Ref)'}'. {items_created_count} item(s) added as 'Available'.", 'success')
-        return redirect(url_for('orders_overview', search_order=order_number_ref or ''))
+        invalidate_aged_stock() # A back-dated order can be aged on arrival
+        flash(f"Stock received for order '{order_number_ref or '(No Ref)'}'. {result['items_created']} item(s) added as 'Available' "
+              f"in {result['elapsed_ms']:.0f} ms.", 'success')
+        return redirect(url_for('orders_overview', search_term=order_number_ref or ''))
     except sqlite3.Error as e:
         conn.rollback(); print(e, file=sys.stderr); flash(f"Database error receiving stock: {e}", 'error')
     except Exception as e:
         conn.rollback(); print(e, file=sys.stderr); flash(f"Unexpected error receiving stock: {e}", 'error')
 
-    part_types_list = []
+    part_types_rows, part_type_count = '', 0
     try:
-        cursor.execute("SELECT id, part_name, part_number, artikelnummer, brand, model FROM part_types ORDER BY brand, model, part_name ASC")
-        part_types_list = cursor.fetchall()
+        read_conn = get_read_db()
+        part_types_rows, part_type_count = render_catalogue_rows('receive_stock_rows.html', get_catalogue_version(read_conn), read_conn)
     except sqlite3.Error as e_fetch:
         print(f"Error re-fetching part types for form after exception: {e_fetch}", file=sys.stderr)
     return render_template('receive_stock.html',
-                           part_types_list=part_types_list,
+                           part_types_rows=part_types_rows, part_type_count=part_type_count,
                            submitted_order_number=order_number_ref,
                            submitted_order_date=order_date_str, # Pass back to form
                            submitted_notes=order_notes), 500
@@ -508,52 +1068,55 @@ import sys # Make sure sys is imported at the top of your app.py if not already
 
 # ... (other imports and app setup) ...
 
+def orders_overview_query(search_term):
+    """SQL and params for the stock order lines list; a search term ranks FTS matches first."""
+    select_cols = """
+        SELECT so.id as order_id, so.order_number, so.order_date,
+               sol.id as line_id, sol.quantity_received,
+               pt.id as part_type_id, pt.part_name, pt.part_number, pt.artikelnummer,
+               pt.brand, pt.model"""
+    params = []
+
+    match_query = fts_match_query(search_term) if search_term else None
+    if match_query:
+        # Lines whose order number or part number / artikelnummer match, best FTS rank first
+        sql = """
+        WITH line_hits AS (
+            SELECT sol.id, h.rank FROM stock_orders_fts h JOIN stock_order_lines sol ON sol.stock_order_id = h.rowid
+            WHERE stock_orders_fts MATCH ?
+            UNION ALL
+            SELECT sol.id, h.rank FROM part_types_fts h JOIN stock_order_lines sol ON sol.part_id = h.rowid
+            WHERE part_types_fts MATCH ?
+        ), ranked AS (SELECT id, MIN(rank) AS rank FROM line_hits GROUP BY id)""" + select_cols + """
+        FROM ranked r
+        JOIN stock_order_lines sol ON sol.id = r.id
+        JOIN stock_orders so ON sol.stock_order_id = so.id
+        JOIN part_types pt ON sol.part_id = pt.id
+        ORDER BY r.rank, so.order_date DESC, so.id DESC, sol.id ASC
+        """
+        params.extend([match_query, match_query])
+    else:
+        sql = select_cols + """
+        FROM stock_order_lines sol
+        JOIN stock_orders so ON sol.stock_order_id = so.id
+        JOIN part_types pt ON sol.part_id = pt.id
+        """
+        if search_term: sql += " WHERE 0" # Nothing searchable in the term
+        sql += " ORDER BY so.order_date DESC, so.id DESC, sol.id ASC"
+    return sql, params
+
 @app.route('/orders')
 def orders_overview():
     order_lines = []
     # Get the search term from the request and strip leading/trailing whitespace
     search_term = request.args.get('search_term', '').strip()
-    
-    print(f"--- Orders Overview Search ---", file=sys.stderr)
-    print(f"Received search_term: '{search_term}'", file=sys.stderr)
 
     try:
-        conn = get_db()
+        conn = get_read_db()
         cursor = conn.cursor()
-        
-        sql = """
-            SELECT so.id as order_id, so.order_number, so.order_date,
-                   sol.id as line_id, sol.quantity_received,
-                   pt.id as part_type_id, pt.part_name, pt.part_number, pt.artikelnummer,
-                   pt.brand, pt.model
-            FROM stock_order_lines sol
-            JOIN stock_orders so ON sol.stock_order_id = so.id
-            JOIN part_types pt ON sol.part_id = pt.id
-            WHERE 1=1 
-        """
-        params = []
-        
-        if search_term: # Only add search conditions if search_term is not empty
-            search_like = f"%{search_term}%"
-            # Using LOWER() for case-insensitive search on text fields
-            sql_addition = """ AND (
-                        LOWER(so.order_number) LIKE LOWER(?) OR
-                        LOWER(pt.artikelnummer) LIKE LOWER(?) OR
-                        LOWER(pt.part_number) LIKE LOWER(?)
-                       )"""
-            sql += sql_addition
-            params.extend([search_like, search_like, search_like])
-        
-        sql += " ORDER BY so.order_date DESC, so.id DESC, sol.id ASC"
-        
-        print(f"Executing SQL: {sql}", file=sys.stderr)
-        print(f"With params: {params}", file=sys.stderr)
-        
+        sql, params = orders_overview_query(search_term)
         cursor.execute(sql, params)
         order_lines = cursor.fetchall()
-        
-        print(f"Found {len(order_lines)} order lines.", file=sys.stderr)
-        print(f"------------------------------", file=sys.stderr)
 
     except sqlite3.Error as e:
         print(f"DB Error orders_overview: {e}", file=sys.stderr)
@@ -566,27 +1129,8 @@ def orders_overview():
 
 @app.route('/bookings/add', methods=['GET'])
 def add_booking_form():
-    available_items = []
-    try:
-        conn = get_db()
-        cursor = conn.cursor()
-        # This query fetches all items that are currently 'Available'
-        cursor.execute("""
-            SELECT i.id, i.serial_number, pt.part_name, pt.part_number, pt.brand, pt.model
-            FROM inventory_items i
-            JOIN part_types pt ON i.part_type_id = pt.id
-            WHERE i.status = 'Available' ORDER BY pt.brand, pt.model, pt.part_name, i.id
-        """)
-        available_items = cursor.fetchall()
-    except sqlite3.Error as e:
-        print(f"DB Error fetching available items for add_booking_form: {e}", file=sys.stderr)
-        flash("Error loading available inventory items.", "error")
-    except Exception as e:
-        print(f"Unexpected error in add_booking_form: {e}", file=sys.stderr)
-        flash("An unexpected error occurred.", "error")
-    
+    # Available parts are fetched by the form from /api/parts_for_device as the device model is typed
     return render_template('add_booking.html',
-                           available_items=available_items,
                            submitted_data={}) # Pass submitted_data for form repopulation on errors
 
 @app.route('/bookings/add', methods=['POST'])
@@ -601,31 +1145,37 @@ def add_booking():
     reported_issue = request.form.get('reported_issue')
     notes = request.form.get('notes') or None
     booking_date_str = request.form.get('booking_date')
-    selected_item_id_str = request.form.get('inventory_item_id')
+    selected_item_id_strs = [value for value in request.form.getlist('inventory_item_id') if value] # One or more units
+    part_type_id_str = request.form.get('part_type_id') # Claim units of this part type without picking one
+    quantity_str = request.form.get('quantity') or '1'
     errors = []
 
     if not customer_name: errors.append("Customer Name required.")
     if not device_model: errors.append("Device Model required.")
     if not reported_issue: errors.append("Reported Issue required.")
     booking_date_to_insert = booking_date_str if booking_date_str else None
-    selected_item_id = None
-    if selected_item_id_str:
-        try: selected_item_id = int(selected_item_id_str)
-        except ValueError: errors.append("Invalid Inventory Item selected.")
+    selected_item_ids = []
+    for selected_item_id_str in selected_item_id_strs:
+        try: selected_item_ids.append(int(selected_item_id_str))
+        except ValueError: errors.append(f"Invalid Inventory Item selected ('{selected_item_id_str}').")
+    claim_part_type_id = None
+    if part_type_id_str:
+        try: claim_part_type_id = int(part_type_id_str)
+        except ValueError: errors.append("Invalid Part Type selected.")
+    try:
+        quantity = int(quantity_str)
+        if quantity < 1: raise ValueError
+    except ValueError: quantity = 1; errors.append("Quantity must be a positive whole number.")
+    if quantity > 1 and not (selected_item_ids or claim_part_type_id): errors.append("Select a part to reserve more than one unit.")
+    if quantity > 1 and len(selected_item_ids) > 1: errors.append("Select several items or enter a number of units, not both.")
 
     if errors:
-        flash_errors(errors); available_items = []
-        try:
-            cursor.execute("""SELECT i.id, i.serial_number, pt.part_name FROM inventory_items i
-                              JOIN part_types pt ON i.part_type_id = pt.id
-                              WHERE i.status = 'Available' ORDER BY pt.part_name, i.id""")
-            available_items = cursor.fetchall()
-        except sqlite3.Error as e_fetch: print(f"Error re-fetching available items for form: {e_fetch}", file=sys.stderr)
-        return render_template('add_booking.html', submitted_data=request.form, available_items=available_items), 400
+        flash_errors(errors)
+        return render_template('add_booking.html', submitted_data=request.form), 400
 
     new_booking_id = None
     try:
-        cursor.execute("BEGIN TRANSACTION")
+        begin_immediate(conn)
         if booking_date_to_insert:
             sql_booking = """INSERT INTO bookings (customer_name, customer_phone, device_model, device_serial, gpc_number, zir_reference, reported_issue, notes, booking_date, last_updated)
                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)"""
@@ -638,70 +1188,206 @@ def add_booking():
         new_booking_id = cursor.lastrowid
         if not new_booking_id: raise sqlite3.Error("Failed to create booking record.")
 
-        if selected_item_id:
-            cursor.execute("SELECT status FROM inventory_items WHERE id = ?", (selected_item_id,))
-            item_row = cursor.fetchone()
-            if not item_row: raise ValueError(f"Selected Inventory Item ID {selected_item_id} not found.")
-            if item_row['status'] != 'Available': raise ValueError(f"Item (ID: {selected_item_id}) not Available (Status: {item_row['status']}).")
-            cursor.execute("INSERT INTO booking_parts_used (booking_id, inventory_item_id) VALUES (?, ?)", (new_booking_id, selected_item_id))
-            cursor.execute("UPDATE inventory_items SET status = 'Reserved', last_updated = CURRENT_TIMESTAMP WHERE id = ?", (selected_item_id,))
-            if cursor.rowcount == 0: raise sqlite3.Error(f"Failed to update status for Item ID {selected_item_id}.")
+        # Claims are guarded UPDATEs (see inventory_ops.claim_items), so a unit cannot be double-booked
+        item_ids = []
+        if selected_item_ids:
+            item_ids += claim_items(cursor, selected_item_ids)
+            if quantity > 1 and not claim_part_type_id: # Further units of the same part, oldest stock first
+                cursor.execute("SELECT part_type_id FROM inventory_items WHERE id = ?", (selected_item_ids[0],))
+                claim_part_type_id = cursor.fetchone()['part_type_id']
+        if claim_part_type_id and quantity > len(item_ids):
+            item_ids += claim_available_units(cursor, claim_part_type_id, quantity - len(item_ids))
+        if item_ids:
+            assign_items_to_booking(cursor, new_booking_id, item_ids)
         conn.commit()
-        flash(f"Booking added (ID: {new_booking_id}). {'Item assigned and Reserved.' if selected_item_id else ''}", 'success')
+        flash(f"Booking added (ID: {new_booking_id}). {f'{len(item_ids)} item(s) assigned and Reserved.' if item_ids else ''}", 'success')
         return redirect(url_for('bookings_overview'))
     except ValueError as e: conn.rollback(); errors.append(str(e)); flash_errors(errors)
     except sqlite3.Error as e: conn.rollback(); print(e, file=sys.stderr); flash(f"Database error adding booking: {e}", 'error')
     except Exception as e: conn.rollback(); print(e, file=sys.stderr); flash(f"Unexpected error adding booking: {e}", 'error')
 
-    available_items = []
-    try:
-        cursor.execute("""SELECT i.id, i.serial_number, pt.part_name FROM inventory_items i
-                          JOIN part_types pt ON i.part_type_id = pt.id
-                          WHERE i.status = 'Available' ORDER BY pt.part_name, i.id""")
-        available_items = cursor.fetchall()
-    except sqlite3.Error as e_fetch: print(f"Error re-fetching available items for form after exception: {e_fetch}", file=sys.stderr)
     status_code = 400 if errors else 500
-    return render_template('add_booking.html', submitted_data=request.form, available_items=available_items), status_code
+    return render_template('add_booking.html', submitted_data=request.form), status_code
+
+@app.route('/metrics/db_pool')
+def db_pool_metrics():
+    return jsonify({'writer': get_db_pool().stats(), 'reader': get_db_pool(read_only=True).stats()})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request, query and template aggregates plus pool occupancy in Prometheus text format."""
+    pool_samples = []
+    for pool_name, read_only in (('writer', False), ('reader', True)):
+        pool_stats = get_db_pool(read_only).stats()
+        for state in ('size', 'idle', 'in_use', 'max_size'):
+            pool_samples.append(((('pool', pool_name), ('state', state)), pool_stats[state]))
+    gauges = [('repair_db_pool_connections', "SQLite pool connections by state.", pool_samples)]
+    return Response(metrics_registry.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/stock_levels')
+def api_stock_levels():
+    """Stock counts per part type, e.g. ?model=IPHONE 12&type=Screen&status=Available."""
+    filters = {key: request.args.get(key, '') for key in ('brand', 'model', 'type', 'status')}
+    if filters['status'] and filters['status'] not in ALLOWED_ITEM_STATUSES:
+        return jsonify({'error_message': f"Invalid status '{filters['status']}'."}), 400
+    try:
+        stock_levels = fetch_stock_levels(get_read_db().cursor(), filters,
+                                          in_stock_only=request.args.get('in_stock_only', '1') == '1')
+    except sqlite3.Error as e:
+        print(f"DB Error api_stock_levels: {e}", file=sys.stderr)
+        return jsonify({'error_message': 'Database error retrieving stock levels.'}), 500
+    return json_response(stock_levels)
+
+@app.route('/export/<dataset>')
+def export_dataset(dataset):
+    """Streams inventory, bookings or orders as CSV/JSON, e.g. /export/inventory?format=csv&gzip=1&brand=Apple.
+
+    Takes the overview page filters (brand/model/type/status/min_days, search_booking
+    or search_term, min_months) plus date_from/date_to. Rows are fetched in batches
+    on a dedicated read connection that is held only while the response streams.
+    """
+    fmt = request.args.get('format', 'csv')
+    gzip = request.args.get('gzip') == '1'
+    if dataset not in EXPORTS or fmt not in EXPORT_FORMATS:
+        return jsonify({'error_message': f"Unknown export '{dataset}' or format '{fmt}'."}), 404
+    allowed_statuses = EXPORT_STATUSES.get(dataset, ())
+    if request.args.get('status') and request.args['status'] not in allowed_statuses:
+        return jsonify({'error_message': f"Invalid status '{request.args['status']}' for {dataset}; "
+                                         f"expected one of: {', '.join(allowed_statuses) or 'none'}."}), 400
+    filters = {key: request.args.get(key, '') for key in ('brand', 'model', 'type', 'status', 'date_from', 'date_to')}
+    filters['search'] = request.args.get('search') or request.args.get('search_booking') or request.args.get('search_term', '')
+    filters['min_days'] = parse_min_age(request.args.get('min_days'))
+    filters['min_months'] = parse_min_age(request.args.get('min_months'))
+
+    pool = get_db_pool(read_only=True)
+    conn = pool.acquire()
+    held = [conn] # Emptied by the first release, so the connection goes back to the pool exactly once
+
+    def release():
+        if held:
+            pool.release(held.pop())
+
+    response = None
+    try:
+        chunks = stream_export(conn, dataset, filters, fmt=fmt, gzip=gzip)
+        first_chunk = next(chunks) # Runs the query now, so SQL errors still get a proper error response
+
+        def generate():
+            try:
+                yield first_chunk
+                yield from chunks
+            finally:
+                release()
+
+        mimetype = 'application/gzip' if gzip else ('text/csv' if fmt == 'csv' else 'application/json')
+        filename = export_filename(dataset, fmt, gzip)
+        response = Response(stream_with_context(generate()), mimetype=mimetype,
+                            headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+        response.call_on_close(release) # Also covers a response closed before streaming started
+        return response
+    except sqlite3.Error as e:
+        print(f"DB Error export_dataset: {e}", file=sys.stderr)
+        return jsonify({'error_message': 'Database error running export.'}), 500
+    finally:
+        if response is None: # Not handed over to a response: any error above, including non-sqlite3 ones
+            release()
+
+@app.route('/api/parts_for_device')
+def api_parts_for_device():
+    """Available inventory items whose part type matches a typed device model.
+
+    Prefix matches on model or brand are tried first (served by the NOCASE indexes
+    from schema v10); if none hit, every word of the query must appear in the brand
+    or model. Results are capped and ranked exact model, model prefix, then the rest.
+    """
+    model_query = ' '.join(request.args.get('model', '').split())
+    limit = parse_page_size(request.args.get('limit'), PARTS_LOOKUP_LIMIT_DEFAULT, PARTS_LOOKUP_LIMIT_MAX)
+    if not model_query:
+        return json_response([], max_age=PARTS_LOOKUP_MAX_AGE)
+
+    prefix = like_escape(model_query) + '%'
+    select_sql = """
+        SELECT i.id, i.serial_number, pt.id AS part_type_id, pt.part_name, pt.part_number,
+               pt.artikelnummer, pt.brand, pt.model
+        FROM part_types pt
+        JOIN inventory_items i ON i.part_type_id = pt.id AND i.status = 'Available'
+        WHERE {where}
+        ORDER BY CASE WHEN pt.model = ? COLLATE NOCASE THEN 0
+                      WHEN pt.model LIKE ? ESCAPE '\\' THEN 1 ELSE 2 END,
+                 pt.brand, pt.model, pt.part_name, i.id
+        LIMIT ?
+    """
+    order_params = [model_query, prefix, limit]
+    try:
+        cursor = get_read_db().cursor()
+        cursor.execute(select_sql.format(where="(pt.model LIKE ? ESCAPE '\\' OR pt.brand LIKE ? ESCAPE '\\')"),
+                       [prefix, prefix] + order_params)
+        rows = cursor.fetchall()
+        if not rows:
+            token_clauses, token_params = [], []
+            for token in model_query.split():
+                token_clauses.append("(pt.model LIKE ? ESCAPE '\\' OR pt.brand LIKE ? ESCAPE '\\')")
+                token_params.extend(['%' + like_escape(token) + '%'] * 2)
+            cursor.execute(select_sql.format(where=" AND ".join(token_clauses)), token_params + order_params)
+            rows = cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"DB Error api_parts_for_device: {e}", file=sys.stderr)
+        return jsonify({'error_message': 'Database error looking up parts.'}), 500
+
+    return json_response([dict(row) for row in rows], max_age=PARTS_LOOKUP_MAX_AGE)
+
+BOOKING_SORTS = {'newest': " ORDER BY b.booking_date DESC, b.id DESC",
+                 'oldest': " ORDER BY b.booking_date ASC, b.id ASC",
+                 'relevance': " ORDER BY h.rank, b.booking_date DESC, b.id DESC"}
+
+def bookings_overview_query(search_term, min_months=None, sort='newest'):
+    """SQL and params for the bookings list, plus the sort actually applied.
+
+    'relevance' needs searchable words in the term and falls back to 'newest' otherwise.
+    """
+    sql = f"""SELECT b.id, b.booking_date, b.customer_name, b.device_model, b.status, b.gpc_number, b.zir_reference, b.notes,
+                    {BOOKING_MONTHS_IN_SYSTEM_SQL} AS months_in_system
+             FROM bookings b"""
+    params = []
+
+    if search_term:
+        # Matches come from bookings_fts (schema v16); a numeric term also finds that booking ID
+        hit_queries = []
+        match_query = fts_match_query(search_term)
+        if match_query:
+            hit_queries.append("SELECT rowid AS id, rank FROM bookings_fts WHERE bookings_fts MATCH ?"); params.append(match_query)
+        if search_term.strip().isdigit():
+            hit_queries.append("SELECT id, -1e9 AS rank FROM bookings WHERE id = ?"); params.append(int(search_term))
+        if hit_queries:
+            sql = (f"WITH hits AS ({' UNION ALL '.join(hit_queries)}) " + sql +
+                   " JOIN (SELECT id, MIN(rank) AS rank FROM hits GROUP BY id) h ON h.id = b.id WHERE 1=1")
+        else:
+            sql += " WHERE 0" # Nothing searchable in the term
+            sort = 'newest' if sort == 'relevance' else sort
+    else:
+        sql += " WHERE 1=1"
+    if min_months is not None:
+        sql += " AND b.booking_date <= ?"; params.append(age_threshold(months=min_months))
+    return sql + BOOKING_SORTS[sort], params, sort
 
 @app.route('/bookings')
 def bookings_overview():
     bookings_processed = []
     search_term = request.args.get('search_booking', '')
+    min_months = parse_min_age(request.args.get('min_months'))
+    sort = request.args.get('sort') or ('relevance' if search_term else 'newest')
+    if sort not in BOOKING_SORTS or (sort == 'relevance' and not search_term): sort = 'newest'
     try:
-        conn = get_db()
+        conn = get_read_db()
         cursor = conn.cursor()
-        sql = "SELECT id, booking_date, customer_name, device_model, status, gpc_number, zir_reference, notes FROM bookings WHERE 1=1"
-        params = []
-
-        if search_term:
-            search_pattern = f"%{search_term}%"
-            sql += """ AND (
-                        LOWER(customer_name) LIKE LOWER(?) OR
-                        LOWER(device_model) LIKE LOWER(?) OR
-                        CAST(id AS TEXT) LIKE ? OR
-                        LOWER(gpc_number) LIKE LOWER(?) OR
-                        LOWER(zir_reference) LIKE LOWER(?)
-                       )"""
-            params.extend([search_pattern] * 5)
-
-        sql += " ORDER BY booking_date DESC"
+        sql, params, sort = bookings_overview_query(search_term, min_months, sort)
+        cursor.row_factory = dict_row_factory
         cursor.execute(sql, params)
-        bookings_raw = cursor.fetchall()
-
-        now = datetime.datetime.now()
-        for booking_row in bookings_raw:
-            booking_dict = dict(booking_row)
-            months_in_system = 0
-            booking_date_str = booking_dict.get('booking_date')
-            if booking_date_str:
-                try:
-                    booking_date_dt = datetime.datetime.strptime(booking_date_str.split('.')[0], '%Y-%m-%d %H:%M:%S')
-                    delta = relativedelta(now, booking_date_dt)
-                    months_in_system = delta.years * 12 + delta.months
-                except (ValueError, TypeError) as e:
-                    print(f"Warning: Could not parse booking_date '{booking_date_str}' for booking ID {booking_dict.get('id')}: {e}", file=sys.stderr)
-            booking_dict['months_in_system'] = months_in_system
-            bookings_processed.append(booking_dict)
+        bookings_processed = cursor.fetchall()
+        # Parts of every listed booking in one query instead of one per row
+        parts_by_booking = fetch_booking_parts(conn.cursor(), [booking['id'] for booking in bookings_processed])
+        for booking in bookings_processed:
+            booking['parts'] = parts_by_booking.get(booking['id'], [])
 
     except sqlite3.Error as e:
         print(f"DB Error bookings_overview: {e}", file=sys.stderr)
@@ -712,15 +1398,187 @@ def bookings_overview():
 
     return render_template('bookings_overview.html',
                            bookings=bookings_processed,
-                           search_term=search_term,
+                           search_term=search_term, min_months=min_months, sort=sort,
                            allowed_booking_statuses=ALLOWED_BOOKING_STATUSES)
 
 
+# --- JSON API (v1) ---
+# Read-only JSON mirrors of the overview pages for scanners, label printers and
+# dashboards. Lists page through opaque 'after' / 'before' cursors, ?fields=a,b
+# picks columns, and responses carry a weak ETag built from the change counters
+# of the tables behind them (catalogue_version, change_counters; bumped by
+# triggers on every insert, update and delete), so an If-None-Match poll is
+# answered with 304 before the list query runs.
+_COUNTER_SQL = "(SELECT version FROM change_counters WHERE table_name = '{}')"
+API_FINGERPRINT_SQL = {
+    'inventory': "SELECT (SELECT version FROM catalogue_version WHERE id = 1), "
+                 + ", ".join(_COUNTER_SQL.format(table) for table in ('inventory_items', 'stock_order_lines', 'stock_orders')),
+    'orders': "SELECT (SELECT version FROM catalogue_version WHERE id = 1), "
+              + ", ".join(_COUNTER_SQL.format(table) for table in ('stock_order_lines', 'stock_orders')),
+    'bookings': "SELECT " + _COUNTER_SQL.format('bookings'),
+    'part_types': "SELECT version FROM catalogue_version WHERE id = 1",
+    'catalogue': "SELECT version, updated_at FROM catalogue_version WHERE id = 1",
+}
+_api_fingerprint_lock = threading.Lock()
+# connection -> {resource: (PRAGMA data_version, fingerprint)}; held weakly, so entries go away with their connection
+_api_fingerprints = weakref.WeakKeyDictionary()
+
+def api_fingerprint(conn, resource):
+    """Change marker for a resource: the change counters / catalogue_version of its tables.
+
+    PRAGMA data_version only moves when another connection commits, so while it
+    is unchanged the marker last computed on this connection is reused without a
+    query. A plain sqlite3.Connection cannot be weakly referenced, so only
+    connections of a subclass are cached; the others run the counter query each time.
+    """
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    with _api_fingerprint_lock:
+        try:
+            cache = _api_fingerprints.setdefault(conn, {})
+        except TypeError:
+            cache = {}
+        cached = cache.get(resource)
+    if cached is not None and cached[0] == data_version:
+        return cached[1]
+    fingerprint = tuple(conn.execute(API_FINGERPRINT_SQL[resource]).fetchone())
+    with _api_fingerprint_lock:
+        cache[resource] = (data_version, fingerprint)
+    return fingerprint
+
+def api_etag(conn, resource):
+    """ETag for this request: the resource fingerprint plus the query args (filters, page, fields)."""
+    raw = json.dumps([resource, api_fingerprint(conn, resource), sorted(request.args.items(multi=True))], default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def api_not_modified(etag):
+    """304 response if the client already has this ETag, else None."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+def api_error(message, status_code):
+    return jsonify({'error_message': message}), status_code
+
+def api_list_response(etag, rows, columns, next_cursor=None, prev_cursor=None):
+    """Wraps one page of rows as {data, count, next, prev}, keeping only ?fields= columns."""
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    unknown = [field for field in fields if field not in columns]
+    if unknown:
+        return api_error(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(columns)}.", 400)
+    fields = fields or columns
+    page_args = {k: v for k, v in request.args.items() if k not in ('after', 'before')}
+    response = jsonify({
+        'data': [{field: row[field] for field in fields} for row in rows],
+        'count': len(rows),
+        'next': url_for(request.endpoint, after=next_cursor, **page_args) if next_cursor else None,
+        'prev': url_for(request.endpoint, before=prev_cursor, **page_args) if prev_cursor else None,
+    })
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True # Always revalidate; a matching ETag costs a fingerprint check
+    return response
+
+def fetch_offset_page(cursor, sql, params, page_size):
+    """One page of an ORDER BY query by OFFSET, for lists without a seekable sort key.
+
+    The cursor tokens hold the row offset. Returns (rows, columns, next_cursor, prev_cursor).
+    Raises ValueError for a malformed token.
+    """
+    after = decode_cursor(request.args.get('after'), 1)
+    before = decode_cursor(request.args.get('before'), 1)
+    if (request.args.get('after') and after is None) or (request.args.get('before') and before is None):
+        raise ValueError("Malformed cursor.")
+    bound = (after or before or [0])[0]
+    if not isinstance(bound, int) or bound < 0:
+        raise ValueError("Malformed cursor.")
+    offset, limit = (bound, page_size) if before is None else (max(0, bound - page_size), min(page_size, bound))
+    cursor.execute(sql + " LIMIT ? OFFSET ?", params + [limit + 1, offset])
+    columns = [column[0] for column in cursor.description]
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit or before is not None
+    rows = rows[:limit]
+    next_cursor = encode_cursor([offset + len(rows)]) if rows and has_more else None
+    prev_cursor = encode_cursor([offset]) if offset > 0 else None
+    return rows, columns, next_cursor, prev_cursor
+
+@app.route('/api/v1/inventory')
+def api_v1_inventory():
+    """Inventory items as on the index page: brand, model, type, status, min_days, sort, page_size."""
+    filters = {key: request.args.get(key, '') for key in ('brand', 'model', 'type', 'status')}
+    if filters['status'] and filters['status'] not in ALLOWED_ITEM_STATUSES:
+        return api_error(f"Invalid status '{filters['status']}'.", 400)
+    filters['min_days'] = parse_min_age(request.args.get('min_days'))
+    sort = request.args.get('sort', 'part')
+    if sort not in INVENTORY_SORTS:
+        return api_error(f"Invalid sort '{sort}'. Choose from: {', '.join(INVENTORY_SORTS)}.", 400)
+    page_size = parse_page_size(request.args.get('page_size'), API_PAGE_SIZE_DEFAULT, API_PAGE_SIZE_MAX)
+    cursor_len = inventory_cursor_len(sort)
+    after = decode_cursor(request.args.get('after'), cursor_len)
+    before = decode_cursor(request.args.get('before'), cursor_len)
+    if (request.args.get('after') and after is None) or (request.args.get('before') and before is None):
+        return api_error("Malformed cursor.", 400)
+    try:
+        conn = get_read_db()
+        etag = api_etag(conn, 'inventory')
+        not_modified = api_not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        cursor = conn.cursor()
+        rows, next_cursor, prev_cursor = fetch_inventory_page(cursor, filters, page_size, after=after, before=before, sort=sort)
+        columns = [column[0] for column in cursor.description]
+    except sqlite3.Error as e:
+        print(f"DB Error api_v1_inventory: {e}", file=sys.stderr)
+        return api_error('Database error retrieving inventory items.', 500)
+    return api_list_response(etag, rows, columns, next_cursor, prev_cursor)
+
+def _api_v1_offset_list(resource, sql, params):
+    page_size = parse_page_size(request.args.get('page_size'), API_PAGE_SIZE_DEFAULT, API_PAGE_SIZE_MAX)
+    try:
+        conn = get_read_db()
+        etag = api_etag(conn, resource)
+        not_modified = api_not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        rows, columns, next_cursor, prev_cursor = fetch_offset_page(conn.cursor(), sql, params, page_size)
+    except ValueError as e:
+        return api_error(str(e), 400)
+    except sqlite3.Error as e:
+        print(f"DB Error api_v1 {resource}: {e}", file=sys.stderr)
+        return api_error(f"Database error retrieving {resource.replace('_', ' ')}.", 500)
+    return api_list_response(etag, rows, columns, next_cursor, prev_cursor)
+
+@app.route('/api/v1/orders')
+def api_v1_orders():
+    """Stock order lines as on the orders page: search (order number / part number / artikelnummer)."""
+    search_term = (request.args.get('search') or request.args.get('search_term', '')).strip()
+    sql, params = orders_overview_query(search_term)
+    return _api_v1_offset_list('orders', sql, params)
+
+@app.route('/api/v1/bookings')
+def api_v1_bookings():
+    """Bookings as on the bookings page: search, min_months, sort (newest / oldest / relevance)."""
+    search_term = request.args.get('search') or request.args.get('search_booking', '')
+    sort = request.args.get('sort') or ('relevance' if search_term else 'newest')
+    if sort not in BOOKING_SORTS:
+        return api_error(f"Invalid sort '{sort}'. Choose from: {', '.join(BOOKING_SORTS)}.", 400)
+    if sort == 'relevance' and not search_term: sort = 'newest'
+    sql, params, sort = bookings_overview_query(search_term, parse_min_age(request.args.get('min_months')), sort)
+    return _api_v1_offset_list('bookings', sql, params)
+
+@app.route('/api/v1/part_types')
+def api_v1_part_types():
+    """The part type catalogue as on the part types page, optionally filtered by brand, model, type."""
+    sql, params = part_types_query({key: request.args.get(key, '') for key in ('brand', 'model', 'type')})
+    return _api_v1_offset_list('part_types', sql, params)
+
+
 @app.route('/booking/<int:booking_id>/edit', methods=['GET'])
 def edit_booking_form(booking_id):
-    booking = None
+    booking, parts, history = None, [], []
     try:
-        conn = get_db()
+        conn = get_read_db()
         cursor = conn.cursor()
         cursor.execute("""SELECT id, booking_date, customer_name, customer_phone,
                                  device_model, device_serial, gpc_number, zir_reference,
@@ -730,13 +1588,61 @@ def edit_booking_form(booking_id):
         if not booking:
             flash(f"Booking ID {booking_id} not found.", "error")
             return redirect(url_for('bookings_overview'))
+        parts = fetch_booking_parts(cursor, [booking_id]).get(booking_id, [])
+        history = status_history(cursor, 'booking', booking_id)
     except sqlite3.Error as e:
         flash(f"Error loading booking details: {e}", "error")
         return redirect(url_for('bookings_overview'))
     return render_template('edit_booking.html',
-                           booking=booking,
+                           booking=booking, parts=parts, history=history,
                            allowed_booking_statuses=ALLOWED_BOOKING_STATUSES)
 
+@app.route('/booking/<int:booking_id>/parts', methods=['POST'])
+def update_booking_parts(booking_id):
+    """Assigns and releases many parts of a booking in one transaction.
+
+    'assign_item_ids' holds item IDs separated by spaces or commas; they are
+    claimed all-or-nothing (Installed if the booking is Completed, else Reserved).
+    Checked 'release_item_id' boxes put those Reserved parts back to Available.
+    """
+    errors, assign_ids, release_ids = [], [], []
+    for token in request.form.get('assign_item_ids', '').replace(',', ' ').split():
+        try: assign_ids.append(int(token))
+        except ValueError: errors.append(f"Invalid item ID '{token}'.")
+    for value in request.form.getlist('release_item_id'):
+        try: release_ids.append(int(value))
+        except ValueError: errors.append(f"Invalid item ID '{value}'.")
+    if not errors and not assign_ids and not release_ids:
+        errors.append("Enter item IDs to assign or select parts to release.")
+    if len(assign_ids) > BULK_STATUS_MAX_ITEMS:
+        errors.append(f"At most {BULK_STATUS_MAX_ITEMS} items can be assigned at once.")
+    if errors:
+        flash_errors(errors)
+        return redirect(url_for('edit_booking_form', booking_id=booking_id))
+
+    conn = get_db(); cursor = conn.cursor()
+    try:
+        begin_immediate(conn)
+        cursor.execute("SELECT status FROM bookings WHERE id = ?", (booking_id,))
+        booking = cursor.fetchone()
+        if not booking: raise ValueError(f"Booking ID {booking_id} not found.")
+        released = release_booking_items(cursor, booking_id, release_ids) if release_ids else []
+        assigned = []
+        if assign_ids:
+            if booking['status'] == 'Cancelled': raise ValueError("Parts cannot be assigned to a Cancelled booking.")
+            assigned = claim_items(cursor, assign_ids, status=booking_item_status(booking['status']))
+            assign_items_to_booking(cursor, booking_id, assigned)
+        conn.commit()
+        invalidate_aged_stock()
+        message = f"{len(assigned)} part(s) assigned, {len(released)} released."
+        if len(released) < len(set(release_ids)): message += " Only Reserved parts can be released."
+        flash(message, 'success')
+    except ValueError as e: conn.rollback(); flash(str(e), 'error')
+    except sqlite3.Error as e:
+        conn.rollback(); print(f"DB Error update_booking_parts: {e}", file=sys.stderr)
+        flash(f"Database error updating booking parts: {e}", 'error')
+    return redirect(url_for('edit_booking_form', booking_id=booking_id))
+
 @app.route('/receive_fast', methods=['GET'])
 def receive_stock_fast_form():
     # For GET, just render the form.
@@ -747,7 +1653,6 @@ def receive_stock_fast_form():
 def receive_stock_fast():
     conn = get_db()
     cursor = conn.cursor()
-    items_created_count = 0
     errors = []
     line_item_errors = [] # To store errors for specific lines
 
@@ -775,10 +1680,11 @@ def receive_stock_fast():
 
     lines_to_process = []
     submitted_items_for_repopulation = []
+    parsed_rows = [] # (row number, identifier, quantity) for rows that passed basic validation
 
     for i, identifier in enumerate(part_identifiers):
         identifier = identifier.strip()
-        quantity_str = quantities_str[i].strip()
+        quantity_str = quantities_str[i].strip() if i < len(quantities_str) else ''
         submitted_items_for_repopulation.append({'part_identifier': identifier, 'quantity': quantity_str})
 
         if not identifier:
@@ -793,24 +1699,40 @@ def receive_stock_fast():
         except ValueError:
             line_item_errors.append(f"Row {i+1}: Invalid quantity for '{identifier}'.")
             continue
+        parsed_rows.append((i + 1, identifier, quantity))
 
-        # Look up part_type_id
-        cursor.execute("""
-            SELECT id, part_name FROM part_types 
-            WHERE part_number = ? OR artikelnummer = ?
-        """, (identifier, identifier))
-        part_type_row = cursor.fetchone()
+    # Resolve every identifier in one round-trip, then merge rows for the same part type
+    merged_rows = 0
+    try:
+        resolved = resolve_part_identifiers(cursor, [identifier for _, identifier, _ in parsed_rows])
+    except sqlite3.Error as e:
+        print(f"DB Error resolving identifiers in receive_stock_fast: {e}", file=sys.stderr)
+        errors.append(f"Database error looking up parts: {e}")
+        resolved, parsed_rows = {}, [] # Report the lookup failure instead of per-row "not found"
+    lines_by_part_type = {}
+    for row_number, identifier, quantity in parsed_rows:
+        matches = resolved[identifier]
+        part_type_ids = {match['id'] for match in matches}
+        if not part_type_ids:
+            line_item_errors.append(f"Row {row_number}: Part with identifier '{identifier}' not found.")
+            continue
+        if len(part_type_ids) > 1:
+            described = ", ".join(f"ID {m['id']} '{m['part_name']}' via {m['matched_on']}" for m in matches)
+            line_item_errors.append(f"Row {row_number}: Identifier '{identifier}' is ambiguous ({described}).")
+            continue
 
-        if not part_type_row:
-            line_item_errors.append(f"Row {i+1}: Part with identifier '{identifier}' not found.")
+        part_type_id = matches[0]['id']
+        if part_type_id in lines_by_part_type:
+            lines_by_part_type[part_type_id]['qty'] += quantity
+            merged_rows += 1
             continue
-        
-        lines_to_process.append({
-            'part_type_id': part_type_row['id'],
-            'part_name': part_type_row['part_name'], # For potential confirmation or logging
+        lines_by_part_type[part_type_id] = {
+            'part_type_id': part_type_id,
+            'part_name': matches[0]['part_name'], # For potential confirmation or logging
             'identifier_used': identifier,
             'qty': quantity
-        })
+        }
+    lines_to_process = list(lines_by_part_type.values())
 
     if errors or line_item_errors:
         for err in errors: flash(err, 'error')
@@ -830,34 +1752,15 @@ def receive_stock_fast():
         return redirect(url_for('receive_stock_fast_form'))
 
     try:
-        cursor.execute("BEGIN TRANSACTION")
-        if order_date_to_insert:
-            cursor.execute("INSERT INTO stock_orders (order_number, notes, order_date) VALUES (?, ?, ?)",
-                           (order_number_ref, order_notes, order_date_to_insert))
-        else:
-            cursor.execute("INSERT INTO stock_orders (order_number, notes, order_date) VALUES (?, ?, CURRENT_TIMESTAMP)",
-                           (order_number_ref, order_notes))
-        
-        stock_order_id = cursor.lastrowid
-        if not stock_order_id: raise sqlite3.Error("Failed to create stock order record.")
-
-        for line in lines_to_process:
-            part_type_id, qty_received = line['part_type_id'], line['qty']
-            # Here, you could potentially add 'cost_price_per_unit' if you fetch default from part_types
-            cursor.execute("INSERT INTO stock_order_lines (stock_order_id, part_id, quantity_received) VALUES (?, ?, ?)",
-                           (stock_order_id, part_type_id, qty_received))
-            line_id = cursor.lastrowid
-            if not line_id: raise sqlite3.Error(f"Failed to create stock order line for part ID {part_type_id}.")
-            
-            for _ in range(qty_received):
-                cursor.execute("""INSERT INTO inventory_items (part_type_id, status, stock_order_line_id, date_received, last_updated)
-                                  VALUES (?, 'Available', ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)""",
-                               (part_type_id, line_id))
-                items_created_count += 1
-        
+        begin_immediate(conn)
+        result = receive_stock_order(cursor, lines_to_process, order_number=order_number_ref,
+                                     notes=order_notes, order_date=order_date_to_insert)
         conn.commit()
-        flash(f"Stock received successfully for order '{order_number_ref or '(No Ref)'}'. {items_created_count} item(s) added as 'Available'.", 'success')
-        return redirect(url_for('orders_overview', search_order=order_number_ref or ''))
+        invalidate_aged_stock() # A back-dated order can be aged on arrival
+        merged_note = f" {merged_rows} duplicate row(s) merged." if merged_rows else ""
+        flash(f"Stock received successfully for order '{order_number_ref or '(No Ref)'}'. {result['items_created']} item(s) added as 'Available' "
+              f"in {result['elapsed_ms']:.0f} ms.{merged_note}", 'success')
+        return redirect(url_for('orders_overview', search_term=order_number_ref or ''))
 
     except sqlite3.Error as e:
         conn.rollback()
@@ -926,16 +1829,27 @@ def update_booking(booking_id):
             error_redirect_url = url_for('bookings_overview')
 
 
+        begin_immediate(conn)
+        cursor.execute("SELECT status FROM bookings WHERE id = ?", (booking_id,))
+        old_booking = cursor.fetchone()
         cursor.execute(sql, params)
 
         if cursor.rowcount == 0:
+            conn.rollback()
             flash(f"Booking ID {booking_id} not found or no changes made.", "warning")
         else:
+            # Completed installs the Reserved parts, Cancelled releases them (see cascade_booking_status)
+            items_changed = cascade_booking_status(cursor, booking_id, old_booking['status'], new_status)
             conn.commit()
-            flash(f"Booking ID {booking_id} updated successfully.", "success")
+            if items_changed: invalidate_aged_stock()
+            flash(f"Booking ID {booking_id} updated successfully." + (f" {items_changed} part(s) updated." if items_changed else ""), "success")
         
         return redirect(success_redirect_url)
 
+    except ValueError as e: # Refused by cascade_booking_status (e.g. cancelling with Installed parts)
+        if conn: conn.rollback()
+        flash(str(e), "error")
+        return redirect(error_redirect_url)
     except sqlite3.Error as e:
         if conn: conn.rollback()
         flash(f"Database error updating booking: {e}", "error")
@@ -969,8 +1883,6 @@ def get_schema_version(conn):
             return 0
 
 if __name__ == '__main__':
-    try: from dateutil.relativedelta import relativedelta
-    except ImportError: print("ERROR: 'python-dateutil' not found. pip install python-dateutil"); sys.exit(1)
     if not os.path.exists(DATABASE): print(f"WARNING: DB '{DATABASE}' not found. Run database_setup.py.", file=sys.stderr); sys.exit(1)
 
     try:
@@ -0,0 +1,186 @@
+# benchmark.py - p50/p95 latency, queries per request and peak RSS of the main routes via the Flask test client
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+DEFAULT_REQUESTS = 50
+DEFAULT_WARMUP = 5
+DEFAULT_MAX_REGRESSION = 0.25 # --compare fails when p95 grows by more than this fraction...
+MIN_REGRESSION_MS = 5.0 # ...and by at least this much, so jitter on millisecond routes is not reported
+SCENARIOS = ('index', 'orders_overview', 'bookings_overview', 'status_times', 'receive_stock_fast', 'add_booking')
+
+
+# --- Request builders: (method, path, form data) per call, drawn from values in the database ---
+def load_samples(db_path, rng):
+    conn = sqlite3.connect(db_path)
+    try:
+        def count(sql):
+            return conn.execute(sql).fetchone()[0]
+
+        def pick(sql, k):
+            return [row[0] for row in rng.sample(conn.execute(sql).fetchall(), k)] if k else []
+
+        return {
+            'brands': [row[0] for row in conn.execute("SELECT DISTINCT brand FROM part_types WHERE brand IS NOT NULL")],
+            'part_numbers': pick("SELECT part_number FROM part_types WHERE part_number IS NOT NULL",
+                                 min(200, count("SELECT COUNT(*) FROM part_types WHERE part_number IS NOT NULL"))),
+            'order_numbers': pick("SELECT order_number FROM stock_orders WHERE order_number IS NOT NULL",
+                                  min(200, count("SELECT COUNT(*) FROM stock_orders WHERE order_number IS NOT NULL"))),
+            'customers': pick("SELECT customer_name FROM bookings", min(200, count("SELECT COUNT(*) FROM bookings"))),
+            'device_models': [row[0] for row in conn.execute("SELECT DISTINCT model FROM part_types WHERE model IS NOT NULL")],
+            'available_items': [row[0] for row in conn.execute(
+                "SELECT id FROM inventory_items WHERE status = 'Available' ORDER BY id DESC LIMIT 5000")],
+        }
+    finally:
+        conn.close()
+
+def build_request(scenario, samples, rng, i):
+    if scenario == 'index':
+        return 'GET', rng.choice(['/', '/?status=Available', '/?sort=oldest', '/?min_days=180',
+                                  f"/?brand={rng.choice(samples['brands'] or [''])}"]), None
+    if scenario == 'orders_overview':
+        terms = samples['order_numbers'] + samples['part_numbers']
+        return 'GET', rng.choice(['/orders', f"/orders?search_term={rng.choice(terms or [''])}"]), None
+    if scenario == 'bookings_overview':
+        name = rng.choice(samples['customers'] or ['']).split(' ')[-1]
+        return 'GET', rng.choice(['/bookings', f"/bookings?search_booking={name}", '/bookings?min_months=6']), None
+    if scenario == 'status_times':
+        return 'GET', rng.choice(['/reports/status_times', '/reports/status_times?days=90']), None
+    if scenario == 'receive_stock_fast':
+        parts = rng.sample(samples['part_numbers'], min(3, len(samples['part_numbers'])))
+        return 'POST', '/receive_fast', {'order_number': f"BENCH-{i}", 'part_identifier[]': parts,
+                                         'quantity[]': [str(rng.randint(1, 5)) for _ in parts]}
+    if scenario == 'add_booking':
+        data = {'customer_name': f"Bench Customer {i}", 'device_model': rng.choice(samples['device_models'] or ['Phone']),
+                'reported_issue': "Benchmark booking", 'customer_phone': '0600000000'}
+        if samples['available_items'] and rng.random() < 0.5:
+            data['inventory_item_id'] = str(samples['available_items'].pop())
+        return 'POST', '/bookings/add', data
+    raise ValueError(f"Unknown scenario '{scenario}'.")
+
+
+# --- Measurement ---
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_benchmark(db_path, scenarios=SCENARIOS, requests=DEFAULT_REQUESTS, warmup=DEFAULT_WARMUP, seed=42):
+    """Runs each scenario against db_path (which is modified by the POST scenarios); returns {scenario: results}."""
+    import app as app_module
+    import jinja2
+    from flask import g
+
+    app_module.DATABASE = db_path
+    app_module.SLOW_QUERY_MS = float('inf') # Keep the slow query log out of the timings
+    app_module.app.testing = True
+    if not os.path.isdir(os.path.join(app_module.app.root_path, app_module.app.template_folder)):
+        # Templates are kept next to app.py in this tree rather than in templates/
+        app_module.app.jinja_loader = jinja2.FileSystemLoader(app_module.app.root_path)
+    query_counts = []
+
+    @app_module.app.after_request
+    def _count_queries(response):
+        stats = g.get('request_stats')
+        query_counts.append(len(stats.queries) if stats is not None else 0)
+        return response
+
+    rng = random.Random(seed)
+    samples = load_samples(db_path, rng)
+    client = app_module.app.test_client()
+    results = {}
+    for scenario in scenarios:
+        latencies, queries, errors = [], [], 0
+        for i in range(warmup + requests):
+            method, path, data = build_request(scenario, samples, rng, i)
+            del query_counts[:]
+            started = time.perf_counter()
+            response = client.open(path, method=method, data=data)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            response.close()
+            if i < warmup:
+                continue
+            latencies.append(elapsed * 1000)
+            queries.append(sum(query_counts))
+            if response.status_code >= 400:
+                errors += 1
+        results[scenario] = {
+            'requests': requests, 'errors': errors,
+            'p50_ms': round(percentile(latencies, 0.50), 2), 'p95_ms': round(percentile(latencies, 0.95), 2),
+            'max_ms': round(max(latencies), 2),
+            'queries_per_request': round(sum(queries) / len(queries), 1),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        }
+        print(f"{scenario:<20} p50 {results[scenario]['p50_ms']:>8.2f} ms  p95 {results[scenario]['p95_ms']:>8.2f} ms  "
+              f"{results[scenario]['queries_per_request']:>6.1f} queries/req  peak RSS {results[scenario]['peak_rss_mb']:>7.1f} MB"
+              + (f"  {errors} error(s)" if errors else ""), flush=True)
+    return results
+
+def compare_results(results, baseline, max_regression=DEFAULT_MAX_REGRESSION):
+    """Returns a list of regression messages: p95 beyond the allowed growth, or more queries per request."""
+    regressions = []
+    for scenario, current in results.items():
+        previous = baseline.get(scenario)
+        if not previous:
+            continue
+        if (current['p95_ms'] > previous['p95_ms'] * (1 + max_regression)
+                and current['p95_ms'] - previous['p95_ms'] >= MIN_REGRESSION_MS):
+            regressions.append(f"{scenario}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append(f"{scenario}: queries/request {previous['queries_per_request']} -> {current['queries_per_request']}")
+        if current['errors'] > previous.get('errors', 0):
+            regressions.append(f"{scenario}: errors {previous.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+
+# --- Main execution ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the main routes against a database (see generate_data.py).")
+    parser.add_argument('db', help="database to benchmark; copied first unless --in-place")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="measured requests per scenario")
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP, help="unmeasured requests per scenario")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--in-place', action='store_true', help="run against the database itself (POST scenarios write to it)")
+    parser.add_argument('--json', dest='json_path', help="write results to this file")
+    parser.add_argument('--compare', help="baseline results file; exit 1 on regressions")
+    parser.add_argument('--max-regression', type=float, default=DEFAULT_MAX_REGRESSION)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Database '{args.db}' not found.", file=sys.stderr); sys.exit(1)
+    workdir = None
+    db_path = args.db
+    if not args.in_place:
+        workdir = tempfile.mkdtemp(prefix='repair_bench_')
+        db_path = os.path.join(workdir, os.path.basename(args.db))
+        for suffix in ('', '-wal'):
+            if os.path.exists(args.db + suffix): shutil.copy(args.db + suffix, db_path + suffix)
+    try:
+        results = run_benchmark(db_path, args.scenarios, args.requests, args.warmup, args.seed)
+    finally:
+        if workdir: shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare_results(results, json.load(f), args.max_regression)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions: sys.exit(1)
\ No newline at end of file
@@ -1,10 +1,15 @@
-# database_setup.py - Applying Schema v8 (Artikelnummer, ZIR Reference)
+# database_setup.py - Applying Schema v19 (Bulk import trigger gate)
 import sqlite3
 import os
 import sys
+import argparse
+
+import db_backup
+import db_migrate
+from inventory_ops import NOW_EPOCH_SQL
 
 DATABASE = 'inventory.db'
-DB_SCHEMA_VERSION = 8 # Target schema version
+DB_SCHEMA_VERSION = 19 # Target schema version
 
 # --- Database Connection Function ---
 def get_db_connection():
@@ -25,12 +30,11 @@ def get_schema_version(conn):
         return 0
 
 def set_schema_version(conn, version):
-    """Sets the schema version."""
+    """Sets the schema version within the caller's transaction (the migration engine commits)."""
     cursor = conn.cursor()
-    cursor.execute("DROP TABLE IF EXISTS schema_version")
-    cursor.execute("CREATE TABLE schema_version (version INTEGER)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER)")
+    cursor.execute("DELETE FROM schema_version")
     cursor.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
-    conn.commit()
 
 # --- Helper to check if column exists ---
 def column_exists(cursor, table_name, column_name):
@@ -53,36 +57,14 @@ def apply_schema_v6(cursor, conn, current_version):
     try:
         print("Processing 'part_types' table (v6)...")
         old_table_name_to_migrate = None
-        if current_version >= 2:
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='parts'")
-            if cursor.fetchone(): old_table_name_to_migrate = 'parts'
-
-        temp_table_name = None
-        if old_table_name_to_migrate:
-            temp_table_name = f"part_types_old_v{current_version}"
-            print(f"Renaming '{old_table_name_to_migrate}' to '{temp_table_name}'...")
-            cursor.execute(f"DROP TABLE IF EXISTS {temp_table_name}")
-            cursor.execute(f"ALTER TABLE {old_table_name_to_migrate} RENAME TO {temp_table_name}")
-
-        cursor.execute("DROP TABLE IF EXISTS part_types")
-        cursor.execute('''
-        CREATE TABLE part_types (
+        if current_version >= 2 and db_migrate.table_exists(cursor, 'parts'):
+            old_table_name_to_migrate = 'parts'
+            print(f"Migrating '{old_table_name_to_migrate}' into new 'part_types' table...")
+        db_migrate.rebuild_table(cursor, 'part_types', '''
             id INTEGER PRIMARY KEY AUTOINCREMENT, part_name TEXT NOT NULL, part_number TEXT UNIQUE,
             part_type TEXT, brand TEXT, model TEXT, cost_price REAL, storage_location TEXT,
             description TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
-        )''')
-
-        if temp_table_name:
-            print(f"Copying data from {temp_table_name} to new 'part_types' table...")
-            v_old_columns = "id, part_name, part_number, part_type, brand, model, cost_price, storage_location"
-            v_new_columns = "id, part_name, part_number, part_type, brand, model, cost_price, storage_location"
-            try:
-                 cursor.execute(f'INSERT INTO part_types ({v_new_columns}) SELECT {v_old_columns} FROM {temp_table_name}')
-                 conn.commit()
-                 cursor.execute(f"DROP TABLE {temp_table_name}")
-                 print(f"Dropped temporary table {temp_table_name}.")
-            except sqlite3.Error as copy_error:
-                 print(f"!!! WARNING: Error copying data from {temp_table_name}: {copy_error}. Manual migration might be needed. {temp_table_name} kept.")
+        ''', source=old_table_name_to_migrate)
 
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_pt_name ON part_types (part_name);")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_pt_number ON part_types (part_number);")
@@ -94,8 +76,7 @@ def apply_schema_v6(cursor, conn, current_version):
     # --- 2. Create stock_orders table ---
     try:
         print("Creating 'stock_orders' table (v6)...")
-        cursor.execute("DROP TABLE IF EXISTS stock_orders")
-        cursor.execute('''CREATE TABLE stock_orders (id INTEGER PRIMARY KEY AUTOINCREMENT, order_number TEXT, order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL, notes TEXT )''')
+        db_migrate.rebuild_table(cursor, 'stock_orders', '''id INTEGER PRIMARY KEY AUTOINCREMENT, order_number TEXT, order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL, notes TEXT ''')
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_order_number ON stock_orders (order_number);")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_order_date ON stock_orders (order_date);")
         print("'stock_orders' table created.")
@@ -104,14 +85,12 @@ def apply_schema_v6(cursor, conn, current_version):
     # --- 3. Create inventory_items table ---
     try:
         print("Creating 'inventory_items' table (v6)...")
-        cursor.execute("DROP TABLE IF EXISTS inventory_items")
-        cursor.execute('''
-        CREATE TABLE inventory_items (
+        db_migrate.rebuild_table(cursor, 'inventory_items', '''
             id INTEGER PRIMARY KEY AUTOINCREMENT, part_type_id INTEGER NOT NULL, serial_number TEXT UNIQUE,
             status TEXT NOT NULL DEFAULT 'Available', stock_order_line_id INTEGER, current_location TEXT,
             date_received TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL, last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL, notes TEXT,
             FOREIGN KEY (part_type_id) REFERENCES part_types (id) ON DELETE RESTRICT,
-            FOREIGN KEY (stock_order_line_id) REFERENCES stock_order_lines (id) ON DELETE SET NULL )
+            FOREIGN KEY (stock_order_line_id) REFERENCES stock_order_lines (id) ON DELETE SET NULL
         ''')
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_invitem_parttype_status ON inventory_items (part_type_id, status);")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_invitem_serial ON inventory_items (serial_number);")
@@ -121,13 +100,11 @@ def apply_schema_v6(cursor, conn, current_version):
     # --- 4. Create stock_order_lines table ---
     try:
         print("Creating 'stock_order_lines' table (v6)...")
-        cursor.execute("DROP TABLE IF EXISTS stock_order_lines")
-        cursor.execute('''
-        CREATE TABLE stock_order_lines (
+        db_migrate.rebuild_table(cursor, 'stock_order_lines', '''
             id INTEGER PRIMARY KEY AUTOINCREMENT, stock_order_id INTEGER NOT NULL, part_id INTEGER NOT NULL,
             quantity_received INTEGER NOT NULL, cost_price_per_unit REAL,
             FOREIGN KEY (stock_order_id) REFERENCES stock_orders (id) ON DELETE CASCADE,
-            FOREIGN KEY (part_id) REFERENCES part_types (id) ON DELETE RESTRICT )
+            FOREIGN KEY (part_id) REFERENCES part_types (id) ON DELETE RESTRICT
         ''')
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_line_order_part ON stock_order_lines (stock_order_id, part_id);")
         print("'stock_order_lines' table created.")
@@ -136,13 +113,11 @@ def apply_schema_v6(cursor, conn, current_version):
     # --- 5. Create booking_parts_used table ---
     try:
         print("Creating 'booking_parts_used' table (v6)...")
-        cursor.execute("DROP TABLE IF EXISTS booking_parts_used")
-        cursor.execute('''
-        CREATE TABLE booking_parts_used (
+        db_migrate.rebuild_table(cursor, 'booking_parts_used', '''
             id INTEGER PRIMARY KEY AUTOINCREMENT, booking_id INTEGER NOT NULL, inventory_item_id INTEGER NOT NULL,
             date_assigned TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
             FOREIGN KEY (booking_id) REFERENCES bookings (id) ON DELETE CASCADE,
-            FOREIGN KEY (inventory_item_id) REFERENCES inventory_items (id) ON DELETE RESTRICT )
+            FOREIGN KEY (inventory_item_id) REFERENCES inventory_items (id) ON DELETE RESTRICT
         ''')
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_bpu_booking_item ON booking_parts_used (booking_id, inventory_item_id);")
         print("'booking_parts_used' table created.")
@@ -165,28 +140,13 @@ def apply_schema_v6(cursor, conn, current_version):
             print("'bookings' table not found. Creating for v6...")
 
         if needs_bookings_update:
-            if bookings_existed:
-                 cursor.execute("DROP TABLE IF EXISTS bookings_old_v6_temp")
-                 cursor.execute("ALTER TABLE bookings RENAME TO bookings_old_v6_temp")
-
-            cursor.execute("DROP TABLE IF EXISTS bookings") # Drop just in case
-            cursor.execute('''
-            CREATE TABLE bookings (
+            if bookings_existed: print("Copying data to new 'bookings' table (v6)...")
+            db_migrate.rebuild_table(cursor, 'bookings', '''
                 id INTEGER PRIMARY KEY AUTOINCREMENT, booking_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
                 customer_name TEXT NOT NULL, customer_phone TEXT, device_model TEXT NOT NULL,
                 device_serial TEXT, gpc_number TEXT, reported_issue TEXT NOT NULL,
-                status TEXT DEFAULT 'Booked In' NOT NULL, notes TEXT, last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL )
+                status TEXT DEFAULT 'Booked In' NOT NULL, notes TEXT, last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
             ''')
-            if bookings_existed:
-                 print("Copying data to new 'bookings' table (v6)...")
-                 cols_to_copy = "id, booking_date, customer_name, customer_phone, device_model, device_serial, reported_issue, status, notes, last_updated"
-                 try:
-                     cursor.execute(f'INSERT INTO bookings ({cols_to_copy}) SELECT {cols_to_copy} FROM bookings_old_v6_temp')
-                     cursor.execute("DROP TABLE bookings_old_v6_temp")
-                     print("Data copied, old v6 table dropped.")
-                 except sqlite3.Error as e_copy_book:
-                     print(f"!!! Warning: Failed to copy bookings data during v6 upgrade: {e_copy_book}. Old table kept.")
-
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_booking_date ON bookings (booking_date);")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_booking_customer_name ON bookings (customer_name);")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_booking_status ON bookings (status);")
@@ -237,9 +197,398 @@ def apply_schema_v8(cursor, conn, current_version):
     return 8
 
 
+def apply_schema_v9(cursor, conn, current_version):
+    """Adds composite indexes for keyset pagination of the inventory list (Schema v9)."""
+    print("Applying schema version 9 (Inventory pagination indexes)...")
+    try:
+        # Matches the seek key used by app.index(): brand, model, part_name, then item id.
+        cursor.execute("""CREATE INDEX IF NOT EXISTS idx_pt_sort_key ON part_types
+                          (COALESCE(brand, ''), COALESCE(model, ''), part_name, id);""")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_invitem_parttype_id ON inventory_items (part_type_id, id);")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_invitem_status_parttype ON inventory_items (status, part_type_id, id);")
+        print("Pagination indexes created.")
+    except sqlite3.Error as e:
+        print(f"Error creating pagination indexes: {e}")
+        raise e
+    set_schema_version(conn, 9)
+    print("Schema version set to 9.")
+    return 9
+
+
+def apply_schema_v10(cursor, conn, current_version):
+    """Adds NOCASE indexes so LIKE 'prefix%' lookups on model/brand can use an index (Schema v10)."""
+    print("Applying schema version 10 (Case-insensitive model/brand lookup indexes)...")
+    try:
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pt_model_nocase ON part_types (model COLLATE NOCASE);")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pt_brand_nocase ON part_types (brand COLLATE NOCASE);")
+        print("Model/brand lookup indexes created.")
+    except sqlite3.Error as e:
+        print(f"Error creating model/brand lookup indexes: {e}")
+        raise e
+    set_schema_version(conn, 10)
+    print("Schema version set to 10.")
+    return 10
+
+
+def apply_schema_v11(cursor, conn, current_version):
+    """Ensures idx_pt_artikelnummer exists (Schema v11).
+
+    apply_schema_v7 only created it when it added the column, so databases that
+    already had 'artikelnummer' never got the index that bulk identifier lookups need.
+    """
+    print("Applying schema version 11 (Ensure artikelnummer index)...")
+    try:
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pt_artikelnummer ON part_types (artikelnummer);")
+        print("'idx_pt_artikelnummer' index ensured.")
+    except sqlite3.Error as e:
+        print(f"Error creating 'idx_pt_artikelnummer': {e}")
+        raise e
+    set_schema_version(conn, 11)
+    print("Schema version set to 11.")
+    return 11
+
+
+def apply_schema_v12(cursor, conn, current_version):
+    """Adds part_stock_levels, kept in sync with inventory_items by triggers (Schema v12)."""
+    print("Applying schema version 12 (Materialized part stock levels)...")
+    try:
+        print("Creating 'part_stock_levels' table...")
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS part_stock_levels (
+            part_type_id INTEGER NOT NULL, status TEXT NOT NULL,
+            item_count INTEGER NOT NULL DEFAULT 0, oldest_date_received TIMESTAMP,
+            PRIMARY KEY (part_type_id, status),
+            FOREIGN KEY (part_type_id) REFERENCES part_types (id) ON DELETE CASCADE
+        ) WITHOUT ROWID""")
+        # Lets the triggers recompute oldest_date_received with a single index probe
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_invitem_parttype_status_received ON inventory_items (part_type_id, status, date_received);")
+
+        # --- Triggers: +1 for the new (part_type_id, status), -1 for the old one ---
+        add_item_sql = """
+            INSERT INTO part_stock_levels (part_type_id, status, item_count, oldest_date_received)
+            VALUES (NEW.part_type_id, NEW.status, 1, NEW.date_received)
+            ON CONFLICT (part_type_id, status) DO UPDATE SET
+                item_count = item_count + 1,
+                oldest_date_received = MIN(COALESCE(oldest_date_received, excluded.oldest_date_received), excluded.oldest_date_received);
+        """
+        remove_item_sql = """
+            UPDATE part_stock_levels SET
+                item_count = item_count - 1,
+                oldest_date_received = CASE WHEN OLD.date_received > oldest_date_received THEN oldest_date_received
+                    ELSE (SELECT MIN(date_received) FROM inventory_items
+                          WHERE part_type_id = OLD.part_type_id AND status = OLD.status) END
+            WHERE part_type_id = OLD.part_type_id AND status = OLD.status;
+            DELETE FROM part_stock_levels
+            WHERE part_type_id = OLD.part_type_id AND status = OLD.status AND item_count <= 0;
+        """
+        cursor.execute("DROP TRIGGER IF EXISTS trg_stock_levels_insert")
+        cursor.execute(f"CREATE TRIGGER trg_stock_levels_insert AFTER INSERT ON inventory_items BEGIN {add_item_sql} END;")
+        cursor.execute("DROP TRIGGER IF EXISTS trg_stock_levels_delete")
+        cursor.execute(f"CREATE TRIGGER trg_stock_levels_delete AFTER DELETE ON inventory_items BEGIN {remove_item_sql} END;")
+        cursor.execute("DROP TRIGGER IF EXISTS trg_stock_levels_update")
+        cursor.execute(f"""CREATE TRIGGER trg_stock_levels_update AFTER UPDATE OF part_type_id, status, date_received ON inventory_items
+            WHEN OLD.part_type_id IS NOT NEW.part_type_id OR OLD.status IS NOT NEW.status
+                 OR OLD.date_received IS NOT NEW.date_received
+            BEGIN {remove_item_sql} {add_item_sql} END;""")
+
+        print("Backfilling 'part_stock_levels' from 'inventory_items'...")
+        cursor.execute("DELETE FROM part_stock_levels")
+        cursor.execute("""
+            INSERT INTO part_stock_levels (part_type_id, status, item_count, oldest_date_received)
+            SELECT part_type_id, status, COUNT(*), MIN(date_received)
+            FROM inventory_items GROUP BY part_type_id, status
+        """)
+        print(f"'part_stock_levels' created with {cursor.rowcount} row(s).")
+    except sqlite3.Error as e:
+        print(f"Error creating 'part_stock_levels': {e}")
+        raise e
+    set_schema_version(conn, 12)
+    print("Schema version set to 12.")
+    return 12
+
+
+def apply_schema_v13(cursor, conn, current_version):
+    """Adds a single-row catalogue_version counter bumped by part_types triggers (Schema v13).
+
+    Lets app-side caches of catalogue data (filter facets) notice part type
+    changes made by other processes, e.g. the CSV importer.
+    """
+    print("Applying schema version 13 (Catalogue version counter)...")
+    try:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS catalogue_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+        )""")
+        cursor.execute("INSERT OR IGNORE INTO catalogue_version (id, version, updated_at) VALUES (1, 0, CURRENT_TIMESTAMP)")
+        bump_sql = "UPDATE catalogue_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;"
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            trigger_name = f"trg_catalogue_version_{event.lower()}"
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+            cursor.execute(f"CREATE TRIGGER {trigger_name} AFTER {event} ON part_types BEGIN {bump_sql} END;")
+        print("'catalogue_version' table and triggers created.")
+    except sqlite3.Error as e:
+        print(f"Error creating 'catalogue_version': {e}")
+        raise e
+    set_schema_version(conn, 13)
+    print("Schema version set to 13.")
+    return 13
+
+
+def apply_schema_v14(cursor, conn, current_version):
+    """Adds indexes for the aged stock report: orders by date -> lines -> open items (Schema v14)."""
+    print("Applying schema version 14 (Stock aging indexes)...")
+    try:
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_order_date ON stock_orders (order_date);")
+        # Covering index: open items per order line are counted without touching the table
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_invitem_line_status ON inventory_items (stock_order_line_id, status);")
+        print("Stock aging indexes created.")
+    except sqlite3.Error as e:
+        print(f"Error creating stock aging indexes: {e}")
+        raise e
+    set_schema_version(conn, 14)
+    print("Schema version set to 14.")
+    return 14
+
+
+def apply_schema_v15(cursor, conn, current_version):
+    """Adds an index on inventory_items.date_received for age filtering and sorting (Schema v15)."""
+    print("Applying schema version 15 (Item age index)...")
+    try:
+        # rowid is implicitly the last column, so this also serves ORDER BY date_received, id
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_invitem_date_received ON inventory_items (date_received);")
+        print("Item age index created.")
+    except sqlite3.Error as e:
+        print(f"Error creating item age index: {e}")
+        raise e
+    set_schema_version(conn, 15)
+    print("Schema version set to 15.")
+    return 15
+
+
+# External-content FTS5 indexes: (fts table, content table, indexed columns)
+FTS_INDEXES = (
+    ("bookings_fts", "bookings", ("customer_name", "device_model", "gpc_number", "zir_reference")),
+    ("stock_orders_fts", "stock_orders", ("order_number",)),
+    ("part_types_fts", "part_types", ("part_number", "artikelnummer")),
+)
+
+def apply_schema_v16(cursor, conn, current_version):
+    """Adds FTS5 search indexes for bookings, stock orders and part types (Schema v16).
+
+    The FTS tables store only the index (content= the base table) and are kept
+    in sync by AFTER INSERT/UPDATE/DELETE triggers. The tokenizer folds case and
+    diacritics; prefix='2 3' makes short prefix queries ("sam*") index lookups.
+    """
+    print("Applying schema version 16 (Full-text search)...")
+    try:
+        for fts_table, content_table, columns in FTS_INDEXES:
+            column_list = ", ".join(columns)
+            new_values = ", ".join(f"NEW.{col}" for col in columns)
+            old_values = ", ".join(f"OLD.{col}" for col in columns)
+            cursor.execute(f"DROP TABLE IF EXISTS {fts_table}")
+            cursor.execute(f"""CREATE VIRTUAL TABLE {fts_table} USING fts5(
+                {column_list}, content='{content_table}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3')""")
+            delete_sql = f"INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});"
+            insert_sql = f"INSERT INTO {fts_table} (rowid, {column_list}) VALUES (NEW.id, {new_values});"
+            for suffix, body in (('insert', f"AFTER INSERT ON {content_table} BEGIN {insert_sql} END;"),
+                                 ('delete', f"AFTER DELETE ON {content_table} BEGIN {delete_sql} END;"),
+                                 ('update', f"AFTER UPDATE OF {column_list} ON {content_table} BEGIN {delete_sql} {insert_sql} END;")):
+                trigger_name = f"trg_{fts_table}_{suffix}"
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+                cursor.execute(f"CREATE TRIGGER {trigger_name} {body}")
+            cursor.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+            print(f"'{fts_table}' created and populated from '{content_table}'.")
+        # Order lines matched through their part type are found via this index
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_line_part ON stock_order_lines (part_id);")
+    except sqlite3.Error as e:
+        print(f"Error creating full-text search indexes: {e}")
+        raise e
+    set_schema_version(conn, 16)
+    print("Schema version set to 16.")
+    return 16
+
+
+# Tables whose inserts, updates and deletes bump their row in change_counters (schema v17)
+CHANGE_COUNTER_TABLES = ("inventory_items", "stock_orders", "stock_order_lines", "bookings")
+
+def apply_schema_v17(cursor, conn, current_version):
+    """Adds change_counters, one monotonic version per table bumped by triggers (Schema v17).
+
+    Like catalogue_version, but for the tables behind the /api/v1 lists: every
+    committed insert, update or delete moves the counter, so ETags built from it
+    change even when several writes land within the same second.
+    """
+    print("Applying schema version 17 (Change counters)...")
+    try:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_counters (
+            table_name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID""")
+        for table in CHANGE_COUNTER_TABLES:
+            cursor.execute("INSERT OR IGNORE INTO change_counters (table_name, version) VALUES (?, 0)", (table,))
+            bump_sql = f"UPDATE change_counters SET version = version + 1 WHERE table_name = '{table}';"
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                trigger_name = f"trg_change_counter_{table}_{event.lower()}"
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+                cursor.execute(f"CREATE TRIGGER {trigger_name} AFTER {event} ON {table} BEGIN {bump_sql} END;")
+        print("'change_counters' table and triggers created.")
+    except sqlite3.Error as e:
+        print(f"Error creating 'change_counters': {e}")
+        raise e
+    set_schema_version(conn, 17)
+    print("Schema version set to 17.")
+    return 17
+
+
+# Integer codes of the logged statuses, in the order of ALLOWED_*_STATUSES in app.py.
+# Statuses not listed here get the next free code the first time a trigger logs them.
+ITEM_STATUS_CODES = ('Available', 'Reserved', 'Installed', 'Broken', 'Returned')
+BOOKING_STATUS_CODES = ('Booked In', 'In Progress', 'Awaiting Part', 'Ready for Collection', 'Completed', 'Cancelled')
+STATUS_EVENT_TRIGGERS = ('insert', 'update', 'delete') # trg_<events table>_<event>
+# Event logs: (events table, entity table, entity id column, status code table, status codes, backfill timestamp)
+EVENT_LOGS = (
+    ("item_events", "inventory_items", "item_id", "item_status_codes", ITEM_STATUS_CODES, "COALESCE(last_updated, date_received)"),
+    ("booking_events", "bookings", "booking_id", "booking_status_codes", BOOKING_STATUS_CODES, "COALESCE(last_updated, booking_date)"),
+)
+
+def create_status_event_triggers(cursor, events_table, entity_table, id_column, codes_table, events=STATUS_EVENT_TRIGGERS):
+    """(Re)creates the triggers that append entity_table's inserts, status changes and deletes to events_table.
+
+    Events are stamped with the current time. generate_data.py drops the insert
+    and update triggers while it writes back-dated history, then calls this again.
+    """
+    old_code = f"(SELECT code FROM {codes_table} WHERE status = OLD.status)"
+    new_code = f"(SELECT code FROM {codes_table} WHERE status = NEW.status)"
+    ensure_code_sql = f"INSERT OR IGNORE INTO {codes_table} (status) VALUES (NEW.status);"
+    log_sql = f"INSERT INTO {events_table} ({id_column}, ts, old_status, new_status) VALUES"
+    triggers = {
+        'insert': f"AFTER INSERT ON {entity_table} BEGIN {ensure_code_sql} {log_sql} (NEW.id, {NOW_EPOCH_SQL}, NULL, {new_code}); END;",
+        'update': f"""AFTER UPDATE OF status ON {entity_table} WHEN OLD.status IS NOT NEW.status
+            BEGIN {ensure_code_sql} {log_sql} (NEW.id, {NOW_EPOCH_SQL}, {old_code}, {new_code}); END;""",
+        'delete': f"AFTER DELETE ON {entity_table} BEGIN {log_sql} (OLD.id, {NOW_EPOCH_SQL}, {old_code}, NULL); END;",
+    }
+    for event in events:
+        trigger_name = f"trg_{events_table}_{event}"
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+        cursor.execute(f"CREATE TRIGGER {trigger_name} {triggers[event]}")
+
+def apply_schema_v18(cursor, conn, current_version):
+    """Adds append-only item_events and booking_events status logs written by triggers (Schema v18).
+
+    Each status change (and each insert/delete) of an item or booking appends
+    (entity id, unix time, old status code, new status code); a deleted entity
+    logs a NULL new status. Statuses are stored as small integers looked up in
+    item_status_codes/booking_status_codes. Existing rows are backfilled with
+    one event at their last_updated time, since earlier history is unknown.
+    """
+    print("Applying schema version 18 (Status event logs)...")
+    try:
+        for events_table, entity_table, id_column, codes_table, codes, backfill_ts in EVENT_LOGS:
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {codes_table} (
+                code INTEGER PRIMARY KEY, status TEXT NOT NULL UNIQUE
+            )""")
+            cursor.executemany(f"INSERT OR IGNORE INTO {codes_table} (code, status) VALUES (?, ?)",
+                               list(enumerate(codes, start=1)))
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {events_table} (
+                id INTEGER PRIMARY KEY, {id_column} INTEGER NOT NULL, ts INTEGER NOT NULL,
+                old_status INTEGER, new_status INTEGER
+            )""")
+            # (entity id, ts) with the rowid spelled out and new_status covered: per-entity history and
+            # the LEAD() over (PARTITION BY entity ORDER BY ts, id) analytics read only this index
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{events_table}_{id_column}_ts ON {events_table} ({id_column}, ts, id, new_status);")
+
+            create_status_event_triggers(cursor, events_table, entity_table, id_column, codes_table)
+            for event in ('UPDATE', 'DELETE'):
+                trigger_name = f"trg_{events_table}_no_{event.lower()}"
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+                cursor.execute(f"""CREATE TRIGGER {trigger_name} BEFORE {event} ON {events_table}
+                    BEGIN SELECT RAISE(ABORT, '{events_table} is append-only'); END;""")
+
+            cursor.execute(f"INSERT OR IGNORE INTO {codes_table} (status) SELECT DISTINCT status FROM {entity_table}")
+            cursor.execute(f"SELECT 1 FROM {events_table} LIMIT 1")
+            if cursor.fetchone() is None:
+                print(f"Backfilling '{events_table}' from '{entity_table}'...")
+                cursor.execute(f"""
+                    INSERT INTO {events_table} ({id_column}, ts, old_status, new_status)
+                    SELECT e.id, COALESCE(CAST(strftime('%s', {backfill_ts}) AS INTEGER), {NOW_EPOCH_SQL}), NULL, c.code
+                    FROM {entity_table} e JOIN {codes_table} c ON c.status = e.status
+                    ORDER BY e.id
+                """)
+                print(f"'{events_table}' backfilled with {cursor.rowcount} event(s).")
+            print(f"'{events_table}' log and triggers created.")
+    except sqlite3.Error as e:
+        print(f"Error creating status event logs: {e}")
+        raise e
+    set_schema_version(conn, 18)
+    print("Schema version set to 18.")
+    return 18
+
+
+def apply_schema_v19(cursor, conn, current_version):
+    """Gates the per-row part_types FTS insert and catalogue_version triggers (Schema v19).
+
+    part_types_bulk_sync holds a row only inside the CSV importer's write
+    transaction. While it does, those triggers are skipped and the importer
+    indexes the chunk in part_types_fts and bumps catalogue_version with one
+    statement each; every other connection sees the table empty.
+    """
+    print("Applying schema version 19 (Bulk import trigger gate)...")
+    try:
+        cursor.execute("CREATE TABLE IF NOT EXISTS part_types_bulk_sync (id INTEGER PRIMARY KEY CHECK (id = 1))")
+        cursor.execute("DELETE FROM part_types_bulk_sync")
+        gate = "WHEN NOT EXISTS (SELECT 1 FROM part_types_bulk_sync)"
+        bump_sql = "UPDATE catalogue_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;"
+        fts_insert_sql = "INSERT INTO part_types_fts (rowid, part_number, artikelnummer) VALUES (NEW.id, NEW.part_number, NEW.artikelnummer);"
+        triggers = (
+            ("trg_part_types_fts_insert", f"AFTER INSERT ON part_types {gate} BEGIN {fts_insert_sql} END;"),
+            ("trg_catalogue_version_insert", f"AFTER INSERT ON part_types {gate} BEGIN {bump_sql} END;"),
+            ("trg_catalogue_version_update", f"AFTER UPDATE ON part_types {gate} BEGIN {bump_sql} END;"),
+        )
+        for trigger_name, body in triggers:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+            cursor.execute(f"CREATE TRIGGER {trigger_name} {body}")
+        print("'part_types_bulk_sync' gate and triggers created.")
+    except sqlite3.Error as e:
+        print(f"Error creating bulk import trigger gate: {e}")
+        raise e
+    set_schema_version(conn, 19)
+    print("Schema version set to 19.")
+    return 19
+
+
+# --- Migration registry: (version, title, step), applied in order by db_migrate ---
+MIGRATIONS = (
+    (6, "Serialized Inventory", apply_schema_v6),
+    (7, "Adding artikelnummer to part_types", apply_schema_v7),
+    (8, "Adding ZIR Reference to Bookings", apply_schema_v8),
+    (9, "Inventory pagination indexes", apply_schema_v9),
+    (10, "Case-insensitive model/brand lookup indexes", apply_schema_v10),
+    (11, "Ensure artikelnummer index", apply_schema_v11),
+    (12, "Materialized part stock levels", apply_schema_v12),
+    (13, "Catalogue version counter", apply_schema_v13),
+    (14, "Stock aging indexes", apply_schema_v14),
+    (15, "Item age index", apply_schema_v15),
+    (16, "Full-text search", apply_schema_v16),
+    (17, "Change counters", apply_schema_v17),
+    (18, "Status event logs", apply_schema_v18),
+    (19, "Bulk import trigger gate", apply_schema_v19),
+    # Add future migrations here
+)
+
+
 # --- Main Initialization Function ---
-def init_db():
-    """Initializes or updates the database schema sequentially."""
+def init_db(dry_run=False, plan_only=False, backup=True):
+    """Initializes or updates the database schema by applying the pending MIGRATIONS.
+
+    plan_only lists the pending steps without touching the database; dry_run
+    applies them and rolls back. A failed step leaves the database at the last
+    completed version, and the next run resumes from there. Unless backup=False,
+    an existing database is snapshotted (db_backup) before any step runs.
+    """
     print(f"--- Database Setup Start (DB: {DATABASE}) ---")
     if not os.path.exists(DATABASE):
         print(f"Database file '{DATABASE}' not found, will be created.")
@@ -254,47 +603,28 @@ def init_db():
             print("Database schema is already up to date or newer.")
             return
 
+        steps = db_migrate.pending_steps(MIGRATIONS, current_version, DB_SCHEMA_VERSION)
+        if plan_only:
+            db_migrate.print_plan(steps, current_version)
+            return
+        if backup and not dry_run and conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+            db_backup.backup_database(DATABASE, reason=f"pre-migrate-v{current_version}")
+
         cursor = conn.cursor()
         original_fk_setting = cursor.execute("PRAGMA foreign_keys").fetchone()[0]
-        if original_fk_setting == 1 : cursor.execute("PRAGMA foreign_keys = OFF")
+        if original_fk_setting == 1 : cursor.execute("PRAGMA foreign_keys = OFF") # Table rebuilds need FKs off
 
-        cursor.execute("BEGIN TRANSACTION")
-        print("BEGIN schema migration transaction.")
         try:
-            # --- Apply Necessary Schema Updates Sequentially ---
-            if current_version < 6:
-                print(f"Attempting upgrade from version {current_version} to 6...")
-                current_version = apply_schema_v6(cursor, conn, current_version)
-
-            if current_version == 6 and DB_SCHEMA_VERSION >= 7:
-                 print(f"Attempting upgrade from version {current_version} to 7...")
-                 current_version = apply_schema_v7(cursor, conn, current_version)
-
-            if current_version == 7 and DB_SCHEMA_VERSION >= 8:
-                 print(f"Attempting upgrade from version {current_version} to 8...")
-                 current_version = apply_schema_v8(cursor, conn, current_version)
-
-            # Add future 'if current_version < 9:' blocks here
-
-            # --- Commit or Rollback ---
-            if current_version == DB_SCHEMA_VERSION:
-                cursor.execute("COMMIT")
-                print("Schema migration transaction COMMITTED.")
-            else:
-                print(f"Migration did not reach target version ({DB_SCHEMA_VERSION}). Actual: {current_version}. Rolling back.")
-                cursor.execute("ROLLBACK")
-
+            db_migrate.run_migrations(conn, steps, current_version, dry_run=dry_run)
         except Exception as e:
             print(f"!!! Schema migration FAILED: {e}")
-            print("!!! Rolling back schema changes.")
-            cursor.execute("ROLLBACK")
             raise # Re-raise exception to signal failure
-
         finally:
              if original_fk_setting == 1 : cursor.execute("PRAGMA foreign_keys = ON") # Restore FK setting
 
         final_version = get_schema_version(conn) # Re-check version after operations
-        if final_version == DB_SCHEMA_VERSION: print("Database schema successfully updated.")
+        if dry_run: print(f"Dry run finished. Schema version unchanged: {final_version}")
+        elif final_version == DB_SCHEMA_VERSION: print("Database schema successfully updated.")
         else: print(f"Error/Warning: Update process ended. Required: {DB_SCHEMA_VERSION}, Actual: {final_version}")
 
     except sqlite3.Error as e: print(f"Database connection or setup error: {e}")
@@ -305,5 +635,10 @@ def init_db():
 
 # --- Main execution ---
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Create or upgrade the inventory database schema.")
+    parser.add_argument('--plan', action='store_true', help="list pending migration steps and exit")
+    parser.add_argument('--dry-run', action='store_true', help="apply pending steps, report timings, then roll back")
+    parser.add_argument('--no-backup', action='store_true', help="skip the snapshot taken before migrating")
+    args = parser.parse_args()
     print("Running database setup...")
-    init_db()
\ No newline at end of file
+    init_db(dry_run=args.dry_run, plan_only=args.plan, backup=not args.no_backup)
\ No newline at end of file
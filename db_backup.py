@@ -0,0 +1,222 @@
+# db_backup.py - Online snapshots via the SQLite backup API, rotation and verified restore
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+BACKUP_DIR = os.environ.get('BACKUP_DIR') # Default: 'backups' next to the database file
+BACKUP_PAGES_PER_STEP = 1024 # Pages copied per backup step (4 MB at the default page size)
+BACKUP_STEP_PAUSE = 0.005 # Seconds between steps, so writers can take the lock in between
+BACKUP_MAX_RESTARTS = 3 # Rollback-journal databases: restarts caused by writers before copying in one step
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 10)) # Newest snapshots always kept by rotation
+BACKUP_MAX_AGE_DAYS = int(os.environ.get('BACKUP_MAX_AGE_DAYS', 30)) # Older snapshots beyond BACKUP_KEEP are removed
+
+SNAPSHOT_SUFFIX = '.db'
+TIMESTAMP_FORMAT = '%Y%m%d-%H%M%S-%f'
+TIMESTAMP_LENGTH = 22
+
+
+# --- Paths ---
+def backup_dir_for(db_path, backup_dir=None):
+    return backup_dir or BACKUP_DIR or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups')
+
+def _snapshot_prefix(db_path):
+    return os.path.splitext(os.path.basename(db_path))[0] + '-'
+
+def list_snapshots(db_path, backup_dir=None):
+    """Snapshots of db_path as (path, created datetime, size in bytes), newest first."""
+    directory = backup_dir_for(db_path, backup_dir)
+    prefix = _snapshot_prefix(db_path)
+    snapshots = []
+    if not os.path.isdir(directory):
+        return snapshots
+    for name in os.listdir(directory):
+        if not (name.startswith(prefix) and name.endswith(SNAPSHOT_SUFFIX)):
+            continue
+        try:
+            created = datetime.strptime(name[len(prefix):len(prefix) + TIMESTAMP_LENGTH], TIMESTAMP_FORMAT)
+        except ValueError:
+            continue # Not one of ours (e.g. 'inventory-old.db')
+        path = os.path.join(directory, name)
+        snapshots.append((path, created, os.path.getsize(path)))
+    snapshots.sort(key=lambda snapshot: (snapshot[1], snapshot[0]), reverse=True)
+    return snapshots
+
+
+# --- Backup ---
+def check_database(path, full=True):
+    """Runs PRAGMA integrity_check (or quick_check); returns the list of problems, empty when ok."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("PRAGMA integrity_check" if full else "PRAGMA quick_check").fetchall()
+    except sqlite3.DatabaseError as e: # Damage bad enough that the check itself cannot run
+        return [str(e)]
+    finally:
+        conn.close()
+    problems = [row[0] for row in rows]
+    return [] if problems == ['ok'] else problems
+
+class _CopyRestarting(Exception):
+    pass
+
+def _copy(source, target, pages, pause, label, max_restarts=None):
+    """source.backup(target) in steps of 'pages', pausing between steps.
+
+    A write to the source from another connection makes SQLite restart the copy;
+    after max_restarts of those _CopyRestarting is raised (None: never).
+    """
+    started = time.perf_counter()
+    state = {'reported': started, 'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if max_restarts is not None and state['restarts'] > max_restarts:
+                raise _CopyRestarting()
+        state['remaining'] = remaining
+        now = time.perf_counter()
+        if total and now - state['reported'] >= 1.0:
+            print(f"  {label}: {total - remaining}/{total} pages ({(total - remaining) * 100 // total}%)")
+            state['reported'] = now
+        if remaining and pause:
+            time.sleep(pause)
+
+    source.backup(target, pages=pages, progress=progress)
+    return time.perf_counter() - started
+
+def backup_database(db_path, reason='manual', backup_dir=None, pages=BACKUP_PAGES_PER_STEP, pause=BACKUP_STEP_PAUSE,
+                    rotate=True):
+    """Writes a consistent snapshot of db_path into the backup directory; returns its path.
+
+    Uses the SQLite online backup API, copying 'pages' pages per step with a short
+    pause in between. In WAL mode the copy reads from one pinned snapshot, which
+    does not block writers. A rollback-journal database is only read-locked per
+    step, so writers get in between; a write restarts the copy, and after
+    BACKUP_MAX_RESTARTS restarts it is done in one step (writers wait for that
+    step). The copy is written to a '.partial' file, checked with
+    PRAGMA quick_check and only then renamed into place. Returns None if db_path
+    does not exist yet. Old snapshots are rotated afterwards (see rotate_snapshots).
+    """
+    if not os.path.exists(db_path):
+        return None
+    directory = backup_dir_for(db_path, backup_dir)
+    os.makedirs(directory, exist_ok=True)
+    tag = re.sub(r'[^A-Za-z0-9_.-]+', '_', reason).strip('_') or 'manual'
+    path = os.path.join(directory, f"{_snapshot_prefix(db_path)}{datetime.now().strftime(TIMESTAMP_FORMAT)}-{tag}{SNAPSHOT_SUFFIX}")
+    partial_path = path + '.partial'
+    source = target = None
+    try:
+        source = sqlite3.connect(db_path, isolation_level=None)
+        target = sqlite3.connect(partial_path)
+        label = f"backup of '{db_path}'"
+        if source.execute("PRAGMA journal_mode").fetchone()[0].lower() == 'wal':
+            source.execute("BEGIN")
+            source.execute("SELECT 1 FROM sqlite_master LIMIT 1") # Starts the read transaction the copy uses
+            seconds = _copy(source, target, pages, pause, label)
+            source.execute("COMMIT")
+        else:
+            try:
+                seconds = _copy(source, target, pages, pause, label, max_restarts=BACKUP_MAX_RESTARTS)
+            except _CopyRestarting:
+                print(f"  {label}: restarted {BACKUP_MAX_RESTARTS} times by concurrent writes, copying in one step.")
+                seconds = _copy(source, target, -1, 0, label)
+        target.execute("PRAGMA journal_mode = DELETE") # Snapshot is a single self-contained file
+        target.close(); target = None
+        problems = check_database(partial_path, full=False)
+        if problems:
+            raise RuntimeError(f"Snapshot failed verification: {problems[:5]}")
+        os.replace(partial_path, path)
+    finally:
+        if target: target.close()
+        if source: source.close()
+        if os.path.exists(partial_path): os.remove(partial_path)
+    print(f"Backup of '{db_path}' written to '{path}' ({os.path.getsize(path) // 1024} KB, {seconds:.2f} s).")
+    if rotate:
+        rotate_snapshots(db_path, backup_dir)
+    return path
+
+def rotate_snapshots(db_path, backup_dir=None, keep=BACKUP_KEEP, max_age_days=BACKUP_MAX_AGE_DAYS):
+    """Deletes snapshots beyond the newest 'keep' that are older than max_age_days; returns deleted paths."""
+    cutoff = datetime.now() - timedelta(days=max_age_days)
+    deleted = []
+    for index, (path, created, _) in enumerate(list_snapshots(db_path, backup_dir)):
+        if index >= max(keep, 1) and created < cutoff:
+            os.remove(path)
+            deleted.append(path)
+    if deleted:
+        print(f"Rotated {len(deleted)} old snapshot(s) of '{db_path}'.")
+    return deleted
+
+
+# --- Restore ---
+def restore_database(snapshot_path, db_path, backup_dir=None, pages=BACKUP_PAGES_PER_STEP):
+    """Replaces the contents of db_path with a snapshot, verifying both before and after.
+
+    The snapshot must pass PRAGMA integrity_check first. The current database is
+    snapshotted ('pre-restore') and then overwritten through the backup API, so
+    the restore goes through SQLite's locking and journal rather than a file copy.
+    Raises RuntimeError if either check fails.
+    """
+    if not os.path.exists(snapshot_path):
+        raise RuntimeError(f"Snapshot '{snapshot_path}' not found.")
+    problems = check_database(snapshot_path)
+    if problems:
+        raise RuntimeError(f"Snapshot '{snapshot_path}' failed integrity_check: {problems[:5]}")
+    backup_database(db_path, reason='pre-restore', backup_dir=backup_dir, rotate=False)
+    source = target = None
+    try:
+        source = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True)
+        target = sqlite3.connect(db_path)
+        target.execute("PRAGMA busy_timeout = 5000")
+        seconds = _copy(source, target, pages, 0, f"restore of '{db_path}'")
+    finally:
+        if target: target.close()
+        if source: source.close()
+    problems = check_database(db_path)
+    if problems:
+        raise RuntimeError(f"Restored database '{db_path}' failed integrity_check: {problems[:5]}")
+    print(f"Restored '{db_path}' from '{snapshot_path}' ({seconds:.2f} s); integrity_check ok.")
+
+
+# --- Main execution ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Snapshot, list, rotate and restore the inventory database.")
+    parser.add_argument('--db', default='inventory.db')
+    parser.add_argument('--dir', help="backup directory (default: $BACKUP_DIR or 'backups' next to the database)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    backup_cmd = commands.add_parser('backup', help="write a snapshot now")
+    backup_cmd.add_argument('--reason', default='manual')
+    commands.add_parser('list', help="list snapshots, newest first")
+    rotate_cmd = commands.add_parser('rotate', help="delete old snapshots")
+    rotate_cmd.add_argument('--keep', type=int, default=BACKUP_KEEP)
+    rotate_cmd.add_argument('--max-age-days', type=int, default=BACKUP_MAX_AGE_DAYS)
+    verify_cmd = commands.add_parser('verify', help="run integrity_check on a snapshot")
+    verify_cmd.add_argument('snapshot')
+    restore_cmd = commands.add_parser('restore', help="verify a snapshot and restore it over the database")
+    restore_cmd.add_argument('snapshot')
+    restore_cmd.add_argument('--yes', action='store_true', help="do not ask for confirmation")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'backup':
+            if not backup_database(args.db, reason=args.reason, backup_dir=args.dir):
+                print(f"Database '{args.db}' not found.", file=sys.stderr); sys.exit(1)
+        elif args.command == 'list':
+            for path, created, size in list_snapshots(args.db, args.dir):
+                print(f"{created:%Y-%m-%d %H:%M:%S}  {size // 1024:>10} KB  {path}")
+        elif args.command == 'rotate':
+            rotate_snapshots(args.db, args.dir, keep=args.keep, max_age_days=args.max_age_days)
+        elif args.command == 'verify':
+            problems = check_database(args.snapshot)
+            print("ok" if not problems else "\n".join(problems))
+            sys.exit(1 if problems else 0)
+        elif args.command == 'restore':
+            if not args.yes and input(f"Overwrite '{args.db}' with '{args.snapshot}'? [y/N] ").strip().lower() != 'y':
+                print("Restore cancelled."); sys.exit(1)
+            restore_database(args.snapshot, args.db, backup_dir=args.dir)
+    except (sqlite3.Error, RuntimeError, OSError) as e:
+        print(f"{args.command} failed: {e}", file=sys.stderr)
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,242 @@
+# db_metrics.py - Per-request query instrumentation, slow query log and Prometheus text metrics
+import sqlite3
+import sys
+import threading
+import time
+import contextvars
+
+# Request latency histogram buckets, in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_request = contextvars.ContextVar('db_metrics_request', default=None)
+
+
+class QueryRecord:
+    """One executed statement: SQL, parameters, the connection it ran on, time spent and rows seen."""
+    __slots__ = ('sql', 'params', 'conn', 'seconds', 'rows')
+
+    def __init__(self, sql, params, conn, seconds):
+        self.sql, self.params, self.conn, self.seconds, self.rows = sql, params, conn, seconds, 0
+
+
+class RequestStats:
+    """Queries and template renders recorded while one request is active."""
+
+    def __init__(self):
+        self.queries = []
+        self.template_seconds = 0.0
+        self.templates = []
+
+    @property
+    def query_seconds(self):
+        return sum(query.seconds for query in self.queries)
+
+    @property
+    def rows(self):
+        return sum(query.rows for query in self.queries)
+
+    def add_template(self, name, seconds):
+        self.template_seconds += seconds
+        self.templates.append((name, seconds))
+
+
+def start_request():
+    """Starts collecting for the current request (or thread); returns the RequestStats and a reset token."""
+    stats = RequestStats()
+    return stats, _current_request.set(stats)
+
+def finish_request(token):
+    _current_request.reset(token)
+
+def current_stats():
+    return _current_request.get()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times execute/fetch calls and counts rows into the active RequestStats.
+
+    Outside a request (scripts, background threads) it behaves like a plain cursor.
+    Fetch time is added to the statement that produced the rows, so a record's
+    'seconds' covers stepping the whole result set, not just the first row.
+    """
+    _record = None
+
+    def _timed_execute(self, method, sql, parameters):
+        stats = _current_request.get()
+        if stats is None:
+            self._record = None
+            return method(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return method(sql, parameters)
+        finally:
+            self._record = QueryRecord(sql, parameters, self.connection, time.perf_counter() - started)
+            if self.rowcount > 0: # INSERT / UPDATE / DELETE
+                self._record.rows = self.rowcount
+            stats.queries.append(self._record)
+
+    def execute(self, sql, parameters=()):
+        return self._timed_execute(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed_execute(super().executemany, sql, seq_of_parameters)
+
+    def _timed_fetch(self, method, *args):
+        record = self._record
+        if record is None:
+            return method(*args)
+        started = time.perf_counter()
+        rows = method(*args)
+        record.seconds += time.perf_counter() - started
+        record.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchone(self):
+        record = self._record
+        if record is None:
+            return super().fetchone()
+        started = time.perf_counter()
+        row = super().fetchone()
+        record.seconds += time.perf_counter() - started
+        if row is not None:
+            record.rows += 1
+        return row
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute shortcuts) are InstrumentedCursors."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def explain_query_plan(record):
+    """EXPLAIN QUERY PLAN lines for a recorded statement, run untraced on its own connection."""
+    params = record.params
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], (list, tuple, dict)):
+        params = params[0] # executemany: explain with the first parameter set
+    try:
+        cursor = record.conn.cursor(sqlite3.Cursor)
+        cursor.execute("EXPLAIN QUERY PLAN " + record.sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+    except (sqlite3.Error, TypeError, ValueError) as e:
+        return [f"(no plan: {e})"]
+
+def describe_params(params):
+    """Count and types of a statement's parameters, never their values (names, phone numbers)."""
+    if isinstance(params, dict):
+        return ", ".join(f":{name} {type(value).__name__}" for name, value in params.items()) or "none"
+    if not isinstance(params, (list, tuple)):
+        return type(params).__name__ # e.g. an executemany generator, already consumed
+    if not params:
+        return "none"
+    if isinstance(params[0], (list, tuple, dict)):
+        return f"{len(params)} set(s) of {describe_params(params[0])}" # executemany
+    return f"{len(params)} ({', '.join(type(value).__name__ for value in params)})"
+
+def log_slow_queries(stats, threshold_seconds, context=''):
+    """Prints every query at or above the threshold with its plan; returns how many were slow.
+
+    Parameters are logged as count and types only (describe_params).
+    """
+    slow = [query for query in stats.queries if query.seconds >= threshold_seconds]
+    for query in slow:
+        sql = " ".join(query.sql.split())
+        print(f"SLOW QUERY {query.seconds * 1000:.1f} ms, {query.rows} row(s) {context}: {sql}"
+              f" -- params: {describe_params(query.params)}", file=sys.stderr)
+        for line in explain_query_plan(query):
+            print(f"    PLAN {line}", file=sys.stderr)
+    return len(slow)
+
+
+# --- Aggregates (Prometheus text exposition format) ---
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels) + '}'
+
+
+class MetricsRegistry:
+    """Process-wide counters and request latency histograms, rendered as Prometheus text."""
+
+    COUNTERS = (
+        ('repair_http_requests_total', "HTTP requests handled."),
+        ('repair_db_queries_total', "SQL statements executed while handling requests."),
+        ('repair_db_query_seconds_total', "Time spent executing and fetching SQL statements."),
+        ('repair_db_rows_total', "Rows returned (or changed) by SQL statements."),
+        ('repair_db_slow_queries_total', "SQL statements at or above the slow query threshold."),
+        ('repair_template_renders_total', "Jinja template renders."),
+        ('repair_template_render_seconds_total', "Time spent rendering Jinja templates."),
+    )
+    HISTOGRAM = ('repair_http_request_duration_seconds', "HTTP request latency.")
+
+    def __init__(self, buckets=REQUEST_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {name: {} for name, _ in self.COUNTERS}
+        self._histograms = {} # labels -> [bucket counts..., sum, count]
+
+    def _inc(self, name, labels, amount=1):
+        series = self._counters[name]
+        series[labels] = series.get(labels, 0) + amount
+
+    def observe_request(self, endpoint, method, status, seconds, stats, slow_queries=0):
+        endpoint_labels = (('endpoint', endpoint or 'unknown'),)
+        with self._lock:
+            self._inc('repair_http_requests_total', endpoint_labels + (('method', method), ('status', str(status))))
+            self._inc('repair_db_queries_total', endpoint_labels, len(stats.queries))
+            self._inc('repair_db_query_seconds_total', endpoint_labels, stats.query_seconds)
+            self._inc('repair_db_rows_total', endpoint_labels, stats.rows)
+            if slow_queries:
+                self._inc('repair_db_slow_queries_total', endpoint_labels, slow_queries)
+            for template, template_seconds in stats.templates:
+                template_labels = (('template', template),)
+                self._inc('repair_template_renders_total', template_labels)
+                self._inc('repair_template_render_seconds_total', template_labels, template_seconds)
+            histogram = self._histograms.setdefault(endpoint_labels, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def render(self, gauges=()):
+        """Prometheus text; 'gauges' is an iterable of (name, help, [(labels, value), ...])."""
+        lines = []
+        with self._lock:
+            for name, help_text in self.COUNTERS:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(labels)} {value}" for labels, value in sorted(self._counters[name].items())]
+            name, help_text = self.HISTOGRAM
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for labels, histogram in sorted(self._histograms.items()):
+                for bound, count in zip(self.buckets, histogram):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', repr(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram[-2]}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram[-1]}")
+        for name, help_text, samples in gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            lines += [f"{name}{_labels(labels)} {value}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
\ No newline at end of file
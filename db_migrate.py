@@ -0,0 +1,161 @@
+# db_migrate.py - Schema migration engine: ordered steps in savepoints, chunked create-copy-swap table rebuilds
+import sqlite3
+import time
+
+COPY_CHUNK_ROWS = 50000 # Rows per INSERT ... SELECT when copying a table
+
+
+# --- Planning ---
+def pending_steps(steps, current_version, target_version):
+    """Steps (version, title, function) still to apply to go from current_version to target_version."""
+    return [step for step in steps if current_version < step[0] <= target_version]
+
+def print_plan(steps, current_version):
+    if not steps:
+        print(f"Nothing to apply at version {current_version}.")
+        return
+    print(f"Migration plan from version {current_version} ({len(steps)} step(s)):")
+    for version, title, apply_step in steps:
+        print(f"  v{version}: {title} [{apply_step.__name__}]")
+
+
+# --- Running ---
+def run_migrations(conn, steps, current_version, dry_run=False):
+    """Applies steps in order inside one write transaction, each in its own savepoint.
+
+    Each step is called as apply_step(cursor, conn, current_version) and must
+    return its version (steps record it with set_schema_version, which does not
+    commit). When a step fails it is rolled back to its savepoint and the steps
+    before it are committed, so the database is left at the last completed
+    version and the next run resumes with the failing step. dry_run applies
+    everything and then rolls back. Returns [(version, title, seconds)].
+    """
+    previous_isolation = conn.isolation_level
+    conn.isolation_level = None # BEGIN/SAVEPOINT/COMMIT are issued explicitly below
+    cursor = conn.cursor()
+    timings = []
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        print("BEGIN schema migration transaction.")
+        try:
+            for version, title, apply_step in steps:
+                print(f"Attempting upgrade from version {current_version} to {version} ({title})...")
+                started = time.perf_counter()
+                savepoint = f"migrate_v{version}"
+                cursor.execute(f"SAVEPOINT {savepoint}")
+                try:
+                    reached = apply_step(cursor, conn, current_version)
+                    if reached != version:
+                        raise RuntimeError(f"Step for version {version} reported version {reached}.")
+                except Exception:
+                    if conn.in_transaction: # Some errors (e.g. disk full) already rolled back everything
+                        cursor.execute(f"ROLLBACK TO {savepoint}")
+                        cursor.execute(f"RELEASE {savepoint}")
+                    raise
+                cursor.execute(f"RELEASE {savepoint}")
+                current_version = version
+                timings.append((version, title, time.perf_counter() - started))
+                print(f"Version {version} applied in {timings[-1][2]:.2f} s.")
+        except Exception:
+            if not conn.in_transaction:
+                print("!!! Transaction was aborted by SQLite; no steps of this run were kept.")
+            elif dry_run or not timings:
+                cursor.execute("ROLLBACK")
+                print("Schema migration transaction ROLLED BACK.")
+            else:
+                cursor.execute("COMMIT")
+                print(f"Committed completed steps up to version {current_version}; re-run to resume from the failed step.")
+            raise
+        if dry_run:
+            cursor.execute("ROLLBACK")
+            print("Dry run: all steps applied successfully, transaction ROLLED BACK.")
+        else:
+            cursor.execute("COMMIT")
+            print("Schema migration transaction COMMITTED.")
+    finally:
+        conn.isolation_level = previous_isolation
+        total = sum(seconds for _, _, seconds in timings)
+        print(f"{len(timings)} step(s) in {total:.2f} s" + "".join(f"; v{v} {s:.2f} s" for v, _, s in timings))
+    return timings
+
+
+# --- Table helpers ---
+def table_exists(cursor, table_name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+    return cursor.fetchone() is not None
+
+def table_columns(cursor, table_name):
+    cursor.execute(f'PRAGMA table_info("{table_name}")')
+    return [row[1] for row in cursor.fetchall()]
+
+def copy_rows(cursor, source, target, columns, chunk_size=COPY_CHUNK_ROWS):
+    """Copies columns from source into target in rowid ranges of chunk_size rows; returns rows copied.
+
+    Each chunk is one INSERT ... SELECT, so rows never pass through Python and
+    progress is reported as the copy goes.
+    """
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    insert_sql = f'INSERT INTO "{target}" ({column_list}) SELECT {column_list} FROM "{source}"'
+    try:
+        cursor.execute(f'SELECT MIN(rowid) - 1, COUNT(*) FROM "{source}"')
+    except sqlite3.OperationalError: # WITHOUT ROWID table: no range to walk, copy in one statement
+        cursor.execute(insert_sql)
+        return cursor.rowcount
+    last_rowid, total = cursor.fetchone()
+    copied = 0
+    while copied < total:
+        cursor.execute(f'SELECT MAX(rowid), COUNT(*) FROM (SELECT rowid FROM "{source}" WHERE rowid > ? ORDER BY rowid LIMIT ?)',
+                       (last_rowid, chunk_size))
+        upper_rowid, count = cursor.fetchone()
+        if not count:
+            break
+        cursor.execute(insert_sql + " WHERE rowid > ? AND rowid <= ?", (last_rowid, upper_rowid))
+        copied += count
+        last_rowid = upper_rowid
+        if total > chunk_size:
+            print(f"  {source} -> {target}: {copied}/{total} rows ({copied * 100 // total}%)")
+    return copied
+
+def rebuild_table(cursor, table, column_defs, source=None, chunk_size=COPY_CHUNK_ROWS):
+    """Gives 'table' the definition column_defs using create-copy-swap instead of dropping it first.
+
+    Creates '<table>__new', copies the columns it shares with 'source' (default:
+    the table itself) in chunks, drops the source and renames the new table into
+    place. When rebuilding a table from itself, its indexes and triggers are
+    recreated after the swap; ones that no longer apply are reported and skipped.
+    If the source does not exist the table is simply created (existing 'table'
+    is replaced when a different source is given). Run with foreign keys off
+    and inside the migration transaction. Returns rows copied.
+    """
+    source = source or table
+    new_table = f"{table}__new"
+    cursor.execute(f'DROP TABLE IF EXISTS "{new_table}"')
+    cursor.execute(f'CREATE TABLE "{new_table}" ({column_defs})')
+    copied, dependents = 0, []
+    if table_exists(cursor, source):
+        source_columns = set(table_columns(cursor, source))
+        columns = [col for col in table_columns(cursor, new_table) if col in source_columns]
+        if source == table:
+            cursor.execute("""SELECT type, name, sql FROM sqlite_master
+                              WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL""", (table,))
+            dependents = cursor.fetchall()
+        copied = copy_rows(cursor, source, new_table, columns, chunk_size)
+        cursor.execute(f'DROP TABLE "{source}"')
+    cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
+    # Legacy rename only renames the table, without re-parsing triggers of other tables mid-swap
+    legacy_alter = cursor.execute("PRAGMA legacy_alter_table").fetchone()[0]
+    cursor.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        cursor.execute(f'ALTER TABLE "{new_table}" RENAME TO "{table}"')
+    finally:
+        cursor.execute(f"PRAGMA legacy_alter_table = {int(legacy_alter)}")
+    for kind, name, sql in dependents:
+        try:
+            cursor.execute(sql)
+        except sqlite3.Error as e:
+            print(f"Skipped {kind} '{name}' after rebuilding '{table}': {e}")
+    violations = cursor.execute(f'PRAGMA foreign_key_check("{table}")').fetchall()
+    if violations:
+        print(f"!!! WARNING: '{table}' has {len(violations)} row(s) violating foreign keys after rebuild.")
+    print(f"'{table}' rebuilt ({copied} row(s) copied from '{source}').")
+    return copied
\ No newline at end of file
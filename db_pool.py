@@ -0,0 +1,197 @@
+# db_pool.py - Thread-safe SQLite connection pool with tuned PRAGMAs
+import sqlite3
+import threading
+import time
+import pathlib
+
+# Applied to every new connection. journal_mode=WAL is persistent in the database
+# file; the rest are per-connection settings.
+DEFAULT_PRAGMAS = (
+    ("journal_mode", "WAL"),        # Readers no longer block the writer (and vice versa)
+    ("synchronous", "NORMAL"),      # Safe with WAL; fsync at checkpoints instead of every commit
+    ("cache_size", -20000),         # Negative = KiB, so ~20 MB page cache per connection
+    ("mmap_size", 268435456),       # 256 MB memory-mapped I/O
+    ("busy_timeout", 5000),         # ms to wait on a lock before raising "database is locked"
+    ("temp_store", "MEMORY"),
+    ("foreign_keys", "ON"),
+)
+
+# Read-only connections cannot change the journal mode; query_only makes any
+# accidental write fail loudly instead of taking the write lock.
+READ_ONLY_PRAGMAS = tuple(p for p in DEFAULT_PRAGMAS if p[0] != "journal_mode") + (("query_only", "ON"),)
+
+BUSY_RETRIES = 5
+BUSY_BACKOFF_SECONDS = 0.05 # Doubled after every failed attempt
+
+
+def is_busy_error(error):
+    message = str(error).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def begin_immediate(conn, retries=BUSY_RETRIES, backoff=BUSY_BACKOFF_SECONDS):
+    """Starts a write transaction, taking the write lock up front.
+
+    A deferred BEGIN only takes the lock at the first write, so two writers can
+    both read, then one fails with SQLITE_BUSY mid-transaction. BEGIN IMMEDIATE
+    fails (after busy_timeout) before anything has been read, so it is safe to
+    retry with exponential backoff.
+    """
+    for attempt in range(retries + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e) or attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt))
+
+
+def apply_pragmas(conn, pragmas=DEFAULT_PRAGMAS):
+    """Applies (name, value) PRAGMAs to a connection opened outside a pool (e.g. by a script)."""
+    for name, value in pragmas:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def dict_row_factory(cursor, row):
+    """Row factory returning plain dicts, ready to hand to templates or jsonify.
+
+    Set it on a cursor (cursor.row_factory = dict_row_factory) for list queries
+    whose rows are rendered as-is, instead of copying every sqlite3.Row with dict().
+    """
+    return dict(zip([column[0] for column in cursor.description], row))
+
+
+class ConnectionPool:
+    """Hands out long-lived, pre-configured connections to one SQLite database.
+
+    With read_only=True connections are opened with a mode=ro URI and
+    query_only, and 'factory' is the sqlite3.Connection subclass to open (e.g. an
+    instrumented one). Connections are created lazily up to 'max_size'. acquire() blocks up to
+    'timeout' seconds when all of them are in use. Idle connections are reused
+    most-recently-used first so their page cache stays warm, and one that has
+    been idle longer than 'health_check_interval' seconds is checked with
+    SELECT 1 before being handed out.
+    """
+
+    def __init__(self, database, max_size=8, timeout=10.0, health_check_interval=30.0,
+                 pragmas=None, row_factory=sqlite3.Row, read_only=False, factory=sqlite3.Connection):
+        self.database = database
+        self.factory = factory
+        self.read_only = read_only
+        if pragmas is None:
+            pragmas = READ_ONLY_PRAGMAS if read_only else DEFAULT_PRAGMAS
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.pragmas = pragmas
+        self.row_factory = row_factory
+        self._idle = [] # (connection, time released)
+        self._size = 0  # Open connections, idle or in use
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {'created': 0, 'acquired': 0, 'reused': 0, 'discarded': 0,
+                       'health_check_failures': 0, 'waits': 0, 'wait_seconds': 0.0, 'timeouts': 0}
+
+    def _connect(self):
+        if self.read_only:
+            uri = pathlib.Path(self.database).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=self.timeout, check_same_thread=False, factory=self.factory)
+        else:
+            conn = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False, factory=self.factory)
+        conn.row_factory = self.row_factory
+        return apply_pragmas(conn, self.pragmas)
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+
+    def acquire(self):
+        """Returns a connection from the pool, opening a new one if there is room."""
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise sqlite3.OperationalError("Connection pool is closed.")
+                if not self._idle and self._size >= self.max_size:
+                    self._stats['waits'] += 1
+                    wait_started = time.monotonic()
+                    while not self._idle and self._size >= self.max_size:
+                        remaining = self.timeout - (time.monotonic() - wait_started)
+                        if remaining <= 0:
+                            self._stats['timeouts'] += 1
+                            raise sqlite3.OperationalError(
+                                f"Connection pool exhausted ({self.max_size} in use) after {self.timeout}s.")
+                        self._cond.wait(remaining)
+                    self._stats['wait_seconds'] += time.monotonic() - wait_started
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                else:
+                    conn, released_at = None, None
+                    self._size += 1 # Reserve the slot before connecting outside the lock
+                self._stats['acquired'] += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except sqlite3.Error:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+                return conn
+
+            if time.monotonic() - released_at > self.health_check_interval and not self._is_healthy(conn):
+                with self._cond:
+                    self._stats['health_check_failures'] += 1
+                self._discard(conn)
+                continue
+            with self._cond:
+                self._stats['reused'] += 1
+            return conn
+
+    def release(self, conn):
+        """Returns a connection to the pool, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            if not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    def close(self):
+        """Closes idle connections; connections still in use are closed on release."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """Snapshot of pool counters for the metrics endpoint."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot.update({'max_size': self.max_size, 'size': self._size,
+                             'idle': len(self._idle), 'in_use': self._size - len(self._idle)})
+        return snapshot
@@ -0,0 +1,210 @@
+# export_data.py - Streaming CSV/JSON export of inventory items, bookings and stock order lines
+import sqlite3
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+
+from inventory_ops import fts_match_query, age_threshold, ITEM_DAYS_IN_SYSTEM_SQL, BOOKING_MONTHS_IN_SYSTEM_SQL
+
+DATABASE = 'inventory.db'
+EXPORT_BATCH_SIZE = 1000 # Rows per fetchmany(); also the unit in which output is flushed
+EXPORT_FORMATS = ('csv', 'json')
+GZIP_LEVEL = 6
+
+
+# --- Queries (same filters as the overview pages) ---
+def inventory_query(filters):
+    """Inventory items; filters: brand, model, type, status, min_days, date_from, date_to (date_received)."""
+    sql = f"""
+        SELECT i.id AS item_id, pt.part_name, pt.part_number, pt.artikelnummer, pt.brand, pt.model, pt.part_type,
+               i.serial_number, i.status, i.current_location, pt.storage_location,
+               so.order_number, i.date_received, {ITEM_DAYS_IN_SYSTEM_SQL} AS days_in_system,
+               i.last_updated, i.notes
+        FROM part_types pt
+        JOIN inventory_items i ON i.part_type_id = pt.id
+        LEFT JOIN stock_order_lines sol ON i.stock_order_line_id = sol.id
+        LEFT JOIN stock_orders so ON sol.stock_order_id = so.id
+        WHERE 1=1
+    """
+    params = []
+    if filters.get('brand'): sql += " AND pt.brand = ?"; params.append(filters['brand'])
+    if filters.get('model'): sql += " AND pt.model = ?"; params.append(filters['model'])
+    if filters.get('type'): sql += " AND pt.part_type = ?"; params.append(filters['type'])
+    if filters.get('status'): sql += " AND i.status = ?"; params.append(filters['status'])
+    if filters.get('min_days') is not None:
+        sql += " AND i.date_received <= ?"; params.append(age_threshold(days=filters['min_days']))
+    sql, params = _date_range(sql, params, "i.date_received", filters)
+    sql += " ORDER BY COALESCE(pt.brand, ''), COALESCE(pt.model, ''), pt.part_name, pt.id, i.id"
+    return sql, params
+
+def bookings_query(filters):
+    """Bookings; filters: search (FTS, or a booking ID), min_months, status, date_from, date_to (booking_date)."""
+    sql = f"""
+        SELECT b.id AS booking_id, b.booking_date, {BOOKING_MONTHS_IN_SYSTEM_SQL} AS months_in_system,
+               b.customer_name, b.customer_phone, b.device_model, b.device_serial, b.reported_issue,
+               b.status, b.gpc_number, b.zir_reference, b.notes, b.last_updated
+        FROM bookings b
+        WHERE 1=1
+    """
+    params = []
+    search = (filters.get('search') or '').strip()
+    if search:
+        match_query = fts_match_query(search)
+        clauses = []
+        if match_query:
+            clauses.append("b.id IN (SELECT rowid FROM bookings_fts WHERE bookings_fts MATCH ?)"); params.append(match_query)
+        if search.isdigit():
+            clauses.append("b.id = ?"); params.append(int(search))
+        sql += f" AND ({' OR '.join(clauses) or '0'})"
+    if filters.get('status'): sql += " AND b.status = ?"; params.append(filters['status'])
+    if filters.get('min_months') is not None:
+        sql += " AND b.booking_date <= ?"; params.append(age_threshold(months=filters['min_months']))
+    sql, params = _date_range(sql, params, "b.booking_date", filters)
+    sql += " ORDER BY b.booking_date DESC, b.id DESC"
+    return sql, params
+
+def orders_query(filters):
+    """Stock order lines; filters: search (order number / part number / artikelnummer), date_from, date_to (order_date)."""
+    sql = """
+        SELECT so.id AS order_id, so.order_number, so.order_date, sol.id AS line_id,
+               pt.id AS part_type_id, pt.part_name, pt.part_number, pt.artikelnummer, pt.brand, pt.model,
+               sol.quantity_received, sol.cost_price_per_unit, so.notes AS order_notes
+        FROM stock_order_lines sol
+        JOIN stock_orders so ON sol.stock_order_id = so.id
+        JOIN part_types pt ON sol.part_id = pt.id
+        WHERE 1=1
+    """
+    params = []
+    search = (filters.get('search') or '').strip()
+    if search:
+        match_query = fts_match_query(search)
+        if match_query:
+            sql += """ AND (so.id IN (SELECT rowid FROM stock_orders_fts WHERE stock_orders_fts MATCH ?)
+                            OR pt.id IN (SELECT rowid FROM part_types_fts WHERE part_types_fts MATCH ?))"""
+            params.extend([match_query, match_query])
+        else:
+            sql += " AND 0" # Nothing searchable in the term
+    sql, params = _date_range(sql, params, "so.order_date", filters)
+    sql += " ORDER BY so.order_date DESC, so.id DESC, sol.id ASC"
+    return sql, params
+
+def _date_range(sql, params, column, filters):
+    # date_from / date_to are inclusive 'YYYY-MM-DD' days
+    if filters.get('date_from'): sql += f" AND {column} >= ?"; params.append(filters['date_from'])
+    if filters.get('date_to'): sql += f" AND {column} < date(?, '+1 day')"; params.append(filters['date_to'])
+    return sql, params
+
+EXPORTS = {
+    'inventory': inventory_query,
+    'bookings': bookings_query,
+    'orders': orders_query,
+}
+
+
+# --- Streaming ---
+def iter_batches(conn, sql, params, batch_size=EXPORT_BATCH_SIZE):
+    """Yields (column_names, rows) once per fetchmany() batch; at most one batch is held in memory.
+
+    The first batch is always yielded, possibly empty, so writers can emit a header.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None # Plain tuples; column names come from cursor.description
+    cursor.execute(sql, params)
+    columns = [column[0] for column in cursor.description]
+    try:
+        rows = cursor.fetchmany(batch_size)
+        yield columns, rows
+        while rows:
+            rows = cursor.fetchmany(batch_size)
+            if rows:
+                yield columns, rows
+    finally:
+        cursor.close()
+
+def iter_csv(batches):
+    """Yields CSV text: the header, then one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for columns, rows in batches:
+        if not header_written:
+            writer.writerow(columns); header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0); buffer.truncate()
+
+def iter_json(batches):
+    """Yields a JSON array of objects, one chunk per batch."""
+    separator = "[" # Opening bracket goes out with the first batch, once the query has run
+    for columns, rows in batches:
+        yield separator + ",".join(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) for row in rows)
+        separator = ","
+    yield "]\n"
+
+def iter_gzip(chunks, level=GZIP_LEVEL):
+    """Compresses a stream of text chunks into a gzip stream (wbits=31 writes the gzip header/trailer)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(conn, dataset, filters, fmt='csv', gzip=False, batch_size=EXPORT_BATCH_SIZE):
+    """Returns a generator of output chunks (str, or bytes when gzip=True) for one dataset.
+
+    Raises ValueError for an unknown dataset or format. Rows are read lazily, so
+    the query runs (and the read snapshot is held) while the caller consumes it.
+    """
+    if dataset not in EXPORTS:
+        raise ValueError(f"Unknown export '{dataset}'. Choose from: {', '.join(EXPORTS)}.")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'. Choose from: {', '.join(EXPORT_FORMATS)}.")
+    sql, params = EXPORTS[dataset](filters)
+    batches = iter_batches(conn, sql, params, batch_size)
+    chunks = iter_csv(batches) if fmt == 'csv' else iter_json(batches)
+    return iter_gzip(chunks) if gzip else chunks
+
+def export_filename(dataset, fmt, gzip=False):
+    return f"{dataset}.{fmt}" + (".gz" if gzip else "")
+
+
+# --- Main execution ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export inventory items, bookings or stock order lines as CSV or JSON.")
+    parser.add_argument('dataset', choices=list(EXPORTS))
+    parser.add_argument('--format', dest='fmt', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--gzip', action='store_true', help="gzip the output")
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    parser.add_argument('--db', default=DATABASE)
+    parser.add_argument('--brand'); parser.add_argument('--model'); parser.add_argument('--type')
+    parser.add_argument('--status')
+    parser.add_argument('--search', help="bookings/orders search term")
+    parser.add_argument('--min-days', type=int, help="inventory: items at least this many days old")
+    parser.add_argument('--min-months', type=int, help="bookings: bookings at least this many months old")
+    parser.add_argument('--date-from', help="YYYY-MM-DD, inclusive")
+    parser.add_argument('--date-to', help="YYYY-MM-DD, inclusive")
+    args = parser.parse_args()
+
+    filters = {'brand': args.brand, 'model': args.model, 'type': args.type, 'status': args.status,
+               'search': args.search, 'min_days': args.min_days, 'min_months': args.min_months,
+               'date_from': args.date_from, 'date_to': args.date_to}
+    try:
+        conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        print(f"Error opening database '{args.db}': {e}", file=sys.stderr); sys.exit(1)
+    try:
+        chunks = stream_export(conn, args.dataset, filters, fmt=args.fmt, gzip=args.gzip)
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                out.write(chunk if args.gzip else chunk.encode('utf-8'))
+        finally:
+            if args.output: out.close()
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Export failed: {e}", file=sys.stderr); sys.exit(1)
+    finally:
+        conn.close()
\ No newline at end of file
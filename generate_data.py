@@ -0,0 +1,282 @@
+# generate_data.py - Reproducible synthetic part types, stock orders, inventory items, bookings and status history
+import sqlite3
+import argparse
+import calendar
+import datetime
+import os
+import random
+import sys
+import time
+
+import database_setup
+from db_pool import apply_pragmas
+
+SCALES = {
+    'small':  {'part_types': 200, 'items': 1_000, 'bookings': 500},
+    'medium': {'part_types': 2_000, 'items': 100_000, 'bookings': 10_000},
+    'large':  {'part_types': 5_000, 'items': 1_000_000, 'bookings': 50_000},
+}
+HISTORY_DAYS = 730 # Orders and bookings are spread over the last two years
+MAX_LINES_PER_ORDER = 8
+MAX_UNITS_PER_LINE = 20
+COMMIT_EVERY_ITEMS = 50_000 # Keeps the WAL bounded on large runs
+BOOKING_BATCH_SIZE = 5_000
+
+BRAND_MODELS = {
+    'Apple': ['Iphone 11', 'Iphone 12', 'Iphone 12 Pro', 'Iphone 13', 'Iphone 13 Mini', 'Iphone 14', 'Iphone 14 Pro',
+              'Iphone 15', 'Iphone Se 2020', 'Ipad 9'],
+    'Samsung': ['Galaxy S20', 'Galaxy S21', 'Galaxy S22', 'Galaxy S23', 'Galaxy A52', 'Galaxy A53', 'Galaxy A54',
+                'Galaxy A14', 'Galaxy Note 20'],
+    'Google': ['Pixel 6', 'Pixel 7', 'Pixel 7a', 'Pixel 8'],
+    'Xiaomi': ['Redmi Note 11', 'Redmi Note 12', 'Mi 11', 'Poco X5'],
+    'Oppo': ['Find X5', 'Reno 8', 'A77'],
+    'Huawei': ['P30', 'P40 Lite', 'Mate 20'],
+}
+PART_CATEGORIES = ["Screen", "Battery", "Back Cover", "Charging Port", "Camera", "Adhesive", "Small Parts"]
+QUALITIES = ["OEM", "Refurbished", "Incell", "Soft OLED", "Service Pack"]
+FIRST_NAMES = ["Jan", "Anna", "Pieter", "Sanne", "Mohamed", "Fatima", "Lars", "Eva", "Tom", "Noor", "Daan", "Lisa",
+               "Sem", "Emma", "Bram", "Julia", "Finn", "Sophie", "Luuk", "Tess"]
+LAST_NAMES = ["de Jong", "Jansen", "de Vries", "van den Berg", "Bakker", "Visser", "Smit", "Meijer", "de Boer",
+              "Mulder", "Bos", "Vos", "Peters", "Hendriks", "van Dijk", "Dekker", "Brouwer", "El Amrani"]
+ISSUES = ["Cracked screen", "Battery drains fast", "Does not charge", "Camera blurry", "Water damage",
+          "Back glass broken", "No sound", "Touch not responding", "Boot loop"]
+
+# Share of units (percent) per status; all units of a line are spread over these
+ITEM_STATUS_WEIGHTS = (('Available', 55), ('Reserved', 5), ('Installed', 30), ('Broken', 5), ('Returned', 5))
+BOOKING_STATUS_WEIGHTS = (('Booked In', 8), ('In Progress', 8), ('Awaiting Part', 4), ('Ready for Collection', 5),
+                          ('Completed', 65), ('Cancelled', 10))
+OPEN_BOOKING_STATUSES = ('In Progress', 'Awaiting Part', 'Ready for Collection')
+
+# Statuses a row went through to reach its final status, for the item_events / booking_events history
+ITEM_STATUS_PATHS = {
+    'Available': ('Available',), 'Reserved': ('Available', 'Reserved'), 'Installed': ('Available', 'Reserved', 'Installed'),
+    'Broken': ('Available', 'Broken'), 'Returned': ('Available', 'Returned'),
+}
+BOOKING_STATUS_PATHS = {
+    'Booked In': ('Booked In',), 'In Progress': ('Booked In', 'In Progress'),
+    'Awaiting Part': ('Booked In', 'In Progress', 'Awaiting Part'),
+    'Ready for Collection': ('Booked In', 'In Progress', 'Ready for Collection'),
+    'Completed': ('Booked In', 'In Progress', 'Ready for Collection', 'Completed'), 'Cancelled': ('Booked In', 'Cancelled'),
+}
+# Longest stay in a status before the next step of a path; the actual stay is hashed from the row id
+MAX_STAY_DAYS = {'Available': 180, 'Awaiting Part': 21}
+DEFAULT_MAX_STAY_DAYS = 5
+# (entity table, first status date column, status paths); events tables as in database_setup.EVENT_LOGS
+STATUS_HISTORY = (('inventory_items', 'date_received', ITEM_STATUS_PATHS), ('bookings', 'booking_date', BOOKING_STATUS_PATHS))
+HISTORY_TRIGGER_EVENTS = ('insert', 'update') # Would stamp every generated row's status with the generation time
+
+
+def _status_case_sql(weights, bucket_sql):
+    """CASE expression mapping a 0..99 bucket to a status by cumulative weight."""
+    clauses, upper = [], 0
+    for status, weight in weights[:-1]:
+        upper += weight
+        clauses.append(f"WHEN {bucket_sql} < {upper} THEN '{status}'")
+    return f"CASE {' '.join(clauses)} ELSE '{weights[-1][0]}' END"
+
+# Units get a status from a multiplicative hash of (line seed + unit number), so a
+# given seed always produces the same statuses without a Python round trip per unit.
+ITEM_STATUS_SQL = _status_case_sql(ITEM_STATUS_WEIGHTS, "bucket")
+
+
+def _timestamp(now, rng, max_days=HISTORY_DAYS):
+    moment = now - datetime.timedelta(seconds=rng.randrange(max_days * 86400))
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def generate_part_types(cursor, rng, count):
+    """Inserts 'count' part types across BRAND_MODELS x PART_CATEGORIES; returns (ids, device models)."""
+    combos = [(brand, model, category) for brand, models in BRAND_MODELS.items()
+              for model in models for category in PART_CATEGORIES]
+    records = []
+    for i in range(count):
+        brand, model, category = combos[i % len(combos)]
+        quality = QUALITIES[(i // len(combos)) % len(QUALITIES)]
+        variant = i // (len(combos) * len(QUALITIES))
+        name = f"{brand} {model} {category} - {quality}" + (f" v{variant + 1}" if variant else "")
+        records.append((name, f"GPC{100000 + i}", str(2000000 + i * 7 + rng.randrange(7)), category, brand, model,
+                        round(rng.uniform(2, 180), 2), f"{chr(65 + i % 6)}{1 + i % 40:02d}"))
+    cursor.executemany("""INSERT INTO part_types (part_name, part_number, artikelnummer, part_type, brand, model,
+                                                  cost_price, storage_location) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", records)
+    cursor.execute("SELECT id FROM part_types ORDER BY id")
+    ids = [row[0] for row in cursor.fetchall()]
+    return ids, sorted({model for models in BRAND_MODELS.values() for model in models})
+
+
+def generate_stock(conn, rng, part_type_ids, item_count, now):
+    """Receives stock orders until 'item_count' units exist; units get back-dated order dates and mixed statuses."""
+    cursor = conn.cursor()
+    created = orders = since_commit = 0
+    while created < item_count:
+        order_date = _timestamp(now, rng)
+        cursor.execute("INSERT INTO stock_orders (order_number, order_date, notes) VALUES (?, ?, NULL)",
+                       (f"PO-{100000 + orders}", order_date))
+        order_id = cursor.lastrowid
+        orders += 1
+        for part_type_id in rng.sample(part_type_ids, min(len(part_type_ids), rng.randint(1, MAX_LINES_PER_ORDER))):
+            qty = min(rng.randint(1, MAX_UNITS_PER_LINE), item_count - created)
+            if qty <= 0:
+                break
+            cursor.execute("INSERT INTO stock_order_lines (stock_order_id, part_id, quantity_received, cost_price_per_unit) "
+                           "VALUES (?, ?, ?, ?)", (order_id, part_type_id, qty, round(rng.uniform(2, 180), 2)))
+            cursor.execute(f"""
+                INSERT INTO inventory_items (part_type_id, status, stock_order_line_id, date_received, last_updated)
+                WITH RECURSIVE unit(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM unit WHERE n < ?)
+                SELECT ?, {ITEM_STATUS_SQL}, ?, ?, ? FROM (SELECT ((? + n) * 2654435761) % 100 AS bucket FROM unit)
+            """, (qty, part_type_id, cursor.lastrowid, order_date, order_date, rng.randrange(1 << 30)))
+            created += qty
+            since_commit += qty
+        if since_commit >= COMMIT_EVERY_ITEMS:
+            conn.commit(); since_commit = 0
+            print(f"  {created:,} / {item_count:,} items", flush=True)
+    conn.commit()
+    return orders, created
+
+
+def generate_bookings(conn, rng, count, device_models, now):
+    """Inserts 'count' bookings, then links Installed / Reserved units to completed / open bookings."""
+    cursor = conn.cursor()
+    statuses = [status for status, weight in BOOKING_STATUS_WEIGHTS for _ in range(weight)]
+    for start in range(0, count, BOOKING_BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + BOOKING_BATCH_SIZE, count)):
+            booking_date = _timestamp(now, rng)
+            batch.append((booking_date, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                          f"06{rng.randrange(10**8):08d}", rng.choice(device_models), f"SN{rng.randrange(10**10):010d}",
+                          f"GPC-R{200000 + i}" if rng.random() < 0.6 else None,
+                          f"ZIR{300000 + i}" if rng.random() < 0.3 else None,
+                          rng.choice(ISSUES), rng.choice(statuses), booking_date))
+        cursor.executemany("""INSERT INTO bookings (booking_date, customer_name, customer_phone, device_model, device_serial,
+                                                    gpc_number, zir_reference, reported_issue, status, last_updated)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", batch)
+        conn.commit()
+
+    # Pair the n-th completed booking with the n-th installed unit, and open bookings with reserved units
+    linked = 0
+    for booking_statuses, item_status in ((('Completed',), 'Installed'), (OPEN_BOOKING_STATUSES, 'Reserved')):
+        placeholders = ", ".join("?" * len(booking_statuses))
+        cursor.execute(f"SELECT id, booking_date FROM bookings WHERE status IN ({placeholders}) ORDER BY id", booking_statuses)
+        booking_rows = cursor.fetchall()
+        cursor.execute("SELECT id FROM inventory_items WHERE status = ? ORDER BY id", (item_status,))
+        links = [(booking_id, item_row[0], booking_date)
+                 for (booking_id, booking_date), item_row in zip(booking_rows, cursor.fetchall())]
+        cursor.executemany("INSERT INTO booking_parts_used (booking_id, inventory_item_id, date_assigned) VALUES (?, ?, ?)", links)
+        linked += len(links)
+    conn.commit()
+    return linked
+
+
+def _set_history_triggers(cursor, enabled):
+    """Drops or recreates the event log triggers that generate_history replaces."""
+    for events_table, entity_table, id_column, codes_table, _, _ in database_setup.EVENT_LOGS:
+        if enabled:
+            database_setup.create_status_event_triggers(cursor, events_table, entity_table, id_column, codes_table,
+                                                        HISTORY_TRIGGER_EVENTS)
+        else:
+            for event in HISTORY_TRIGGER_EVENTS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS trg_{events_table}_{event}")
+
+def generate_history(conn, now):
+    """Logs each item's and booking's status path in item_events / booking_events; returns the event count.
+
+    The first status starts at date_received / booking_date and each later step
+    follows a stay hashed from the row id (MAX_STAY_DAYS), capped at 'now', so
+    time_in_status and booking_turnaround report realistic durations. One
+    INSERT ... SELECT per (final status, step); last_updated is set to the last step.
+    """
+    cursor = conn.cursor()
+    now_epoch = calendar.timegm(now.timetuple())
+    events = 0
+    for (events_table, entity_table, id_column, codes_table, _, _), (_, start_column, paths) in zip(
+            database_setup.EVENT_LOGS, STATUS_HISTORY):
+        for final_status, path in paths.items():
+            ts_sql = f"CAST(strftime('%s', {start_column}) AS INTEGER)"
+            for step, status in enumerate(path):
+                cursor.execute(f"INSERT OR IGNORE INTO {codes_table} (status) VALUES (?)", (status,))
+                cursor.execute(f"""
+                    INSERT INTO {events_table} ({id_column}, ts, old_status, new_status)
+                    SELECT id, MIN(?, {ts_sql}), (SELECT code FROM {codes_table} WHERE status = ?),
+                           (SELECT code FROM {codes_table} WHERE status = ?)
+                    FROM {entity_table} WHERE status = ?
+                """, (now_epoch, path[step - 1] if step else None, status, final_status))
+                events += cursor.rowcount
+                max_stay_seconds = MAX_STAY_DAYS.get(status, DEFAULT_MAX_STAY_DAYS) * 86400
+                ts_sql += f" + 3600 + ((id + {step}) * 2654435761) % {max_stay_seconds}"
+        cursor.execute(f"""
+            UPDATE {entity_table} SET last_updated = datetime(latest.ts, 'unixepoch')
+            FROM (SELECT {id_column} AS entity_id, MAX(ts) AS ts FROM {events_table}
+                  GROUP BY {id_column} HAVING COUNT(*) > 1) latest
+            WHERE {entity_table}.id = latest.entity_id
+        """)
+        conn.commit()
+    return events
+
+
+def generate_database(db_path, part_types, items, bookings, seed=42, anchor_date=None):
+    """Creates db_path with the current schema (database_setup.init_db) and fills it.
+
+    Dates run back HISTORY_DAYS from 'anchor_date' (default: today), so ages look
+    realistic; the same seed and anchor date always produce the same data. The
+    status event triggers are off while rows are generated and generate_history
+    writes back-dated events instead; the file is new, so nothing else is writing.
+    """
+    database_setup.DATABASE = db_path
+    database_setup.init_db()
+    conn = apply_pragmas(database_setup.get_db_connection())
+    version = database_setup.get_schema_version(conn)
+    if version != database_setup.DB_SCHEMA_VERSION:
+        conn.close()
+        raise RuntimeError(f"Schema setup failed: version {version}, expected {database_setup.DB_SCHEMA_VERSION}.")
+
+    rng = random.Random(seed)
+    now = datetime.datetime.combine(anchor_date or datetime.date.today(), datetime.time())
+    started = time.perf_counter()
+    try:
+        conn.execute("BEGIN")
+        _set_history_triggers(conn.cursor(), enabled=False)
+        part_type_ids, device_models = generate_part_types(conn.cursor(), rng, part_types)
+        conn.commit()
+        print(f"{len(part_type_ids):,} part types.", flush=True)
+        orders, created = generate_stock(conn, rng, part_type_ids, items, now)
+        print(f"{orders:,} stock orders, {created:,} inventory items.", flush=True)
+        linked = generate_bookings(conn, rng, bookings, device_models, now)
+        print(f"{bookings:,} bookings, {linked:,} linked parts.", flush=True)
+        events = generate_history(conn, now)
+        print(f"{events:,} status events.", flush=True)
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        _set_history_triggers(conn.cursor(), enabled=True)
+        conn.commit()
+        conn.close()
+    print(f"Generated '{db_path}' in {time.perf_counter() - started:.1f}s (seed {seed}).")
+
+
+# --- Main execution ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Create a database filled with reproducible synthetic data.")
+    parser.add_argument('db', help="database file to create")
+    parser.add_argument('--scale', choices=list(SCALES), default='small')
+    parser.add_argument('--part-types', type=int, help="override the scale's part type count")
+    parser.add_argument('--items', type=int, help="override the scale's inventory item count")
+    parser.add_argument('--bookings', type=int, help="override the scale's booking count")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--anchor-date', type=datetime.date.fromisoformat, help="YYYY-MM-DD the history ends at (default: today)")
+    parser.add_argument('--force', action='store_true', help="overwrite an existing database file")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            print(f"'{args.db}' exists; use --force to overwrite it.", file=sys.stderr); sys.exit(1)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix): os.remove(args.db + suffix)
+    scale = SCALES[args.scale]
+    try:
+        generate_database(args.db,
+                          part_types=args.part_types if args.part_types is not None else scale['part_types'],
+                          items=args.items if args.items is not None else scale['items'],
+                          bookings=args.bookings if args.bookings is not None else scale['bookings'],
+                          seed=args.seed, anchor_date=args.anchor_date)
+    except (sqlite3.Error, RuntimeError) as e:
+        print(f"Generation failed: {e}", file=sys.stderr); sys.exit(1)
\ No newline at end of file
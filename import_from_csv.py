@@ -1,127 +1,572 @@
 import sqlite3
 import csv
+import argparse
+import codecs
+import datetime
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from db_backup import backup_database
+from db_pool import apply_pragmas, begin_immediate
+from inventory_ops import receive_stock_order, resolve_part_identifiers
 
 DATABASE_NAME = 'inventory.db'
 CSV_FILE_NAME = 'Voorraad lijst - Sheet1.csv' # Make sure this file is in the same directory as the script
+IMPORT_CHUNK_SIZE = 5000 # Valid rows written (and committed) per transaction
+PARSE_CHUNK_BYTES = 4 * 1024 * 1024 # Byte range parsed by one worker task
+SNIFF_SAMPLE_BYTES = 64 * 1024 # Sample used to detect the encoding and delimiter
+SNIFF_DELIMITERS = ',;\t|'
+BULK_SYNC_MIN_ROWS = 1000 # Chunks writing at least this many rows sync FTS / catalogue_version once, not per row
+ORDER_DATE_FORMAT = '%Y-%m-%d' # --order-date, as the receive stock forms take it
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S' # As stored in stock_orders.order_date
+DECODE_ERRORS = 'windows-1252-fallback' # Codec error handler used by every parse path (registered below)
 
-def import_part_types_from_csv(db_name, csv_file_path):
-    conn = None
-    inserted_count = 0
-    skipped_count = 0
-    failed_count = 0
+INSERT_SQL = """
+    INSERT INTO part_types (part_name, part_number, artikelnummer, part_type, brand, model)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+# Upsert for rows whose GPCID (part_number, UNIQUE) already exists. The WHERE keeps
+# unchanged rows from being rewritten (and from bumping catalogue_version / FTS).
+UPSERT_BY_PART_NUMBER_SQL = INSERT_SQL + """
+    ON CONFLICT (part_number) DO UPDATE SET
+        part_name = excluded.part_name, part_type = excluded.part_type,
+        brand = excluded.brand, model = excluded.model
+    WHERE part_name IS NOT excluded.part_name OR part_type IS NOT excluded.part_type
+       OR brand IS NOT excluded.brand OR model IS NOT excluded.model
+"""
+# While part_types_bulk_sync holds a row (schema v19; only ever inside the importer's
+# write transaction) the per-row FTS insert and catalogue_version triggers are skipped,
+# and a bulk chunk does their work with BULK_FTS_SYNC_SQL and one version bump instead.
+# The FTS update trigger is not gated: imports never change part_number or artikelnummer.
+BULK_SYNC_BEGIN_SQL = "INSERT INTO part_types_bulk_sync (id) VALUES (1)"
+BULK_SYNC_END_SQL = "DELETE FROM part_types_bulk_sync"
+BULK_FTS_SYNC_SQL = """
+    INSERT INTO part_types_fts (rowid, part_number, artikelnummer)
+    SELECT id, part_number, artikelnummer FROM part_types WHERE id > ?
+"""
+BUMP_CATALOGUE_VERSION_SQL = "UPDATE catalogue_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1"
+# Rows matched only on artikelnummer have no unique key to conflict on, so update by id
+UPDATE_BY_ID_SQL = """
+    UPDATE part_types SET part_name = ?, part_type = ?, brand = ?, model = ?
+    WHERE id = ? AND (part_name IS NOT ? OR part_type IS NOT ? OR brand IS NOT ? OR model IS NOT ?)
+"""
+
+
+def parse_part_type_row(row):
+    """Validates one CSV row. Returns (record, None) or (None, reason).
+
+    record is (part_name, part_number, artikelnummer, part_type, brand, model),
+    ready for INSERT_SQL; GPCID maps to part_number, Soort to part_type, Merk to
+    brand and Phone Type to model.
+    """
+    artikelnummer = (row.get('Artikelnummer') or '').strip()
+    gpcid = (row.get('GPCID') or '').strip()
+    phone_type = (row.get('Phone Type') or '').strip()
+    soort = (row.get('Soort') or '').strip()
+    merk = (row.get('Merk') or '').strip()
 
+    if not artikelnummer and not gpcid: # At least one unique ID should be present
+        return None, "missing Artikelnummer and GPCID"
+    if not phone_type or not soort or not merk:
+        return None, "missing Phone Type, Soort or Merk"
+    part_name = f"{merk} {phone_type} {soort}"
+    return (part_name, gpcid or None, artikelnummer or None, soort, merk, phone_type), None
+
+
+def parse_stock_row(row):
+    """Validates one stock receipt row. Returns ((part_number, artikelnummer, qty), None) or (None, reason).
+
+    A row with Aantal 0 or empty is valid with qty 0; the caller counts it but receives nothing.
+    """
+    artikelnummer = (row.get('Artikelnummer') or '').strip()
+    gpcid = (row.get('GPCID') or '').strip()
+    aantal = (row.get('Aantal') or '').strip()
+    if not artikelnummer and not gpcid:
+        return None, "missing Artikelnummer and GPCID"
     try:
-        conn = sqlite3.connect(db_name)
-        cursor = conn.cursor()
+        qty = int(aantal) if aantal else 0
+    except ValueError:
+        return None, f"invalid Aantal '{aantal}'"
+    if qty < 0:
+        return None, f"negative Aantal {qty}"
+    return (gpcid or None, artikelnummer or None, qty), None
+
+
+def parse_order_date(value):
+    """Validates an order date, 'YYYY-MM-DD' or a full timestamp; returns it as stored ('YYYY-MM-DD HH:MM:SS').
+
+    Raises ValueError for anything else, so a malformed date never reaches
+    stock_orders.order_date (where julianday() would turn it into NULL ages).
+    """
+    for fmt in (ORDER_DATE_FORMAT, TIMESTAMP_FORMAT):
+        try:
+            return datetime.datetime.strptime(value.strip(), fmt).strftime(TIMESTAMP_FORMAT)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid order date '{value}', expected YYYY-MM-DD.")
+
+
+def load_identifier_maps(cursor):
+    """Pre-loads {part_number: id} and {artikelnummer: id} for every existing part type."""
+    by_part_number, by_artikelnummer = {}, {}
+    for part_id, part_number, artikelnummer in cursor.execute("SELECT id, part_number, artikelnummer FROM part_types"):
+        if part_number: by_part_number[part_number] = part_id
+        if artikelnummer: by_artikelnummer.setdefault(artikelnummer, part_id)
+    return by_part_number, by_artikelnummer
+
+
+def has_bulk_sync(cursor):
+    """Whether the database has the part_types_bulk_sync trigger gate (schema v19 or later)."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'part_types_bulk_sync'")
+    return cursor.fetchone() is not None
+
+
+def write_chunk(conn, records, by_part_number, by_artikelnummer, seen, upsert):
+    """Classifies a chunk of valid records against the identifier maps and writes it in one transaction.
+
+    'seen' holds the identifiers already met in the current file. New part
+    types are added to the identifier maps with their ids after the insert, so
+    later chunks and files see them as existing.
+    Chunks writing BULK_SYNC_MIN_ROWS rows or more close the part_types_bulk_sync
+    gate for the transaction and instead index the new rows in part_types_fts
+    with one INSERT ... SELECT and bump catalogue_version once.
+    Returns (inserted, updated, skipped, duplicates), where duplicates are the
+    indexes into 'records' of rows repeating an identifier seen earlier in the file.
+    """
+    new_rows, upserts_by_part_number, updates_by_id, duplicates = [], [], [], []
+    skipped = 0
+    for index, record in enumerate(records):
+        part_name, part_number, artikelnummer, part_type, brand, model = record
+        keys = [key for key in (('part_number', part_number), ('artikelnummer', artikelnummer)) if key[1]]
+        if any(key in seen for key in keys):
+            duplicates.append(index)
+            continue
+        seen.update(keys)
+        existing_id = by_part_number.get(part_number) if part_number else None
+        if existing_id is None and artikelnummer:
+            existing_id = by_artikelnummer.get(artikelnummer)
+        if existing_id is None:
+            new_rows.append(record)
+        elif not upsert:
+            skipped += 1
+        elif part_number and part_number in by_part_number:
+            upserts_by_part_number.append(record)
+        else:
+            updates_by_id.append((part_name, part_type, brand, model, existing_id,
+                                  part_name, part_type, brand, model))
 
-        # Try opening with 'windows-1252' encoding
+    cursor = conn.cursor()
+    begin_immediate(conn) # Waits out (with backoff) a write in progress from the running app
+    try:
+        last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM part_types").fetchone()[0]
+        bulk = (len(new_rows) + len(upserts_by_part_number) + len(updates_by_id) >= BULK_SYNC_MIN_ROWS
+                and has_bulk_sync(cursor))
+        if bulk:
+            cursor.execute(BULK_SYNC_BEGIN_SQL)
+        cursor.executemany(INSERT_SQL, new_rows)
+        updated = 0
+        if upserts_by_part_number:
+            cursor.executemany(UPSERT_BY_PART_NUMBER_SQL, upserts_by_part_number)
+            updated += cursor.rowcount
+        if updates_by_id:
+            cursor.executemany(UPDATE_BY_ID_SQL, updates_by_id)
+            updated += cursor.rowcount
+        if bulk:
+            if new_rows:
+                cursor.execute(BULK_FTS_SYNC_SQL, (last_id,))
+            if new_rows or updated:
+                cursor.execute(BUMP_CATALOGUE_VERSION_SQL)
+            cursor.execute(BULK_SYNC_END_SQL)
+        new_ids = cursor.execute("SELECT id, part_number, artikelnummer FROM part_types WHERE id > ?", (last_id,)).fetchall()
+        cursor.execute("COMMIT")
+    except sqlite3.Error:
+        cursor.execute("ROLLBACK")
+        raise
+    for part_id, part_number, artikelnummer in new_ids:
+        if part_number: by_part_number[part_number] = part_id
+        if artikelnummer: by_artikelnummer.setdefault(artikelnummer, part_id)
+    skipped += len(upserts_by_part_number) + len(updates_by_id) - updated # Matched but already up to date
+    return len(new_rows), updated, skipped, duplicates
+
+
+class RejectedRows:
+    """CSV of rejected input rows (row number, reason, original values), created on the first reject."""
+
+    def __init__(self, path, fieldnames):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.count = 0
+        self._file = self._writer = None
+
+    def add(self, row_number, values, reason):
+        if self._writer is None:
+            self._file = open(self.path, mode='w', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(['row_number', 'reason'] + list(self.fieldnames))
+        self._writer.writerow([row_number, reason] + list(values))
+        self.count += 1
+
+    def close(self):
+        """Closes the file; returns its path, or None if nothing was rejected."""
+        if self._file is None:
+            return None
+        self._file.close()
+        return self.path
+
+
+# --- Format Detection ---
+def detect_encoding(sample):
+    """Guesses the encoding of a byte sample: a BOM, else UTF-8 if it decodes, else windows-1252, else latin-1."""
+    for bom, encoding in ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+        if sample.startswith(bom):
+            return encoding
+    for encoding in ('utf-8', 'windows-1252'):
         try:
-            csvfile = open(csv_file_path, mode='r', encoding='windows-1252')
-            print(f"Successfully opened '{csv_file_path}' with 'windows-1252' encoding.")
+            # Incremental decode so a multi-byte character cut off at the end of the sample is not an error
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
         except UnicodeDecodeError:
-            # Fallback to 'latin-1' if 'windows-1252' also fails
-            print(f"Opening with 'windows-1252' failed. Trying 'latin-1'.")
-            csvfile.close() # Close the previous attempt
-            csvfile = open(csv_file_path, mode='r', encoding='latin-1')
-            print(f"Successfully opened '{csv_file_path}' with 'latin-1' encoding.")
-        except Exception as e_open:
-            # If other error occurs during open (like FileNotFoundError before encoding is an issue)
-            print(f"Error opening file '{csv_file_path}': {e_open}")
-            return
-
-
-        with csvfile: # Ensures the file is closed automatically
-            reader = csv.DictReader(csvfile)
-            for row_number, row in enumerate(reader, 1):
-                try:
-                    artikelnummer = row.get('Artikelnummer', '').strip()
-                    gpcid = row.get('GPCID', '').strip()
-                    phone_type = row.get('Phone Type', '').strip()
-                    # Aantal = row.get('Aantal', '').strip() # Ignored for part_types
-                    soort = row.get('Soort', '').strip()
-                    merk = row.get('Merk', '').strip()
-
-                    # Validate essential fields
-                    if not artikelnummer and not gpcid: # At least one unique ID should be present
-                        print(f"Row {row_number}: Skipping row due to missing Artikelnummer and GPCID. Data: {row}")
-                        failed_count += 1
-                        continue
-                    if not phone_type or not soort or not merk:
-                        print(f"Row {row_number}: Skipping row due to missing Phone Type, Soort, or Merk. Data: {row}")
-                        failed_count += 1
-                        continue
-                    
-                    # Construct part_name
-                    part_name = f"{merk} {phone_type} {soort}"
-
-                    check_sql = "SELECT id FROM part_types WHERE "
-                    check_params = []
-                    conditions = []
-
-                    if artikelnummer:
-                        conditions.append("artikelnummer = ?")
-                        check_params.append(artikelnummer)
-                    if gpcid:
-                        conditions.append("part_number = ?")
-                        check_params.append(gpcid)
-                    
-                    if not conditions: 
-                         print(f"Row {row_number}: Skipping due to no valid identifiers. Data: {row}")
-                         failed_count += 1
-                         continue
-
-                    check_sql += " OR ".join(conditions)
-                    
-                    cursor.execute(check_sql, tuple(check_params))
-                    existing_part = cursor.fetchone()
-
-                    if existing_part:
-                        print(f"Row {row_number}: Skipping duplicate. Artikelnummer '{artikelnummer}' or GPCID '{gpcid}' likely already exists.")
-                        skipped_count += 1
-                        continue
-
-                    insert_sql = """
-                    INSERT INTO part_types 
-                    (part_name, part_number, artikelnummer, part_type, brand, model)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """
-                    cursor.execute(insert_sql, (
-                        part_name,
-                        gpcid if gpcid else None,
-                        artikelnummer if artikelnummer else None,
-                        soort,
-                        merk,
-                        phone_type
-                    ))
-                    inserted_count += 1
-
-                except Exception as e:
-                    print(f"Row {row_number}: Failed to process row. Error: {e}. Data: {row}")
-                    failed_count += 1
-        
-        conn.commit()
-        print(f"\nImport from CSV complete.")
-        print(f"Successfully inserted: {inserted_count} new part types.")
-        print(f"Skipped (duplicates or existing): {skipped_count} part types.")
-        print(f"Failed (errors or missing essential data): {failed_count} part types.")
+            continue
+    return 'latin-1' # Decodes any byte sequence
+
+
+def sniff_csv_format(csv_file_path, sample_size=SNIFF_SAMPLE_BYTES):
+    """Detects the encoding, dialect and header of a CSV file from a sample.
+
+    Returns a dict with 'encoding', 'fmtparams' (csv.reader keyword arguments,
+    picklable for worker processes), 'fieldnames', 'data_offset' (byte offset of
+    the first data row) and 'splittable' (whether the file can be cut into
+    byte ranges at newlines: not for UTF-16 or when quoted fields span lines).
+    """
+    with open(csv_file_path, 'rb') as f:
+        sample = f.read(sample_size)
+        encoding = detect_encoding(sample)
+        text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample, final=False)
+        try:
+            dialect = csv.Sniffer().sniff("\n".join(text.splitlines()[:20]), delimiters=SNIFF_DELIMITERS)
+        except csv.Error:
+            dialect = csv.excel # Single column or no clear delimiter
+        fmtparams = {'delimiter': dialect.delimiter, 'quotechar': dialect.quotechar or '"',
+                     'doublequote': dialect.doublequote, 'skipinitialspace': dialect.skipinitialspace}
+
+        sample_rows = list(csv.reader(io.StringIO(text.lstrip('\ufeff'), newline=''), **fmtparams))
+        fieldnames = [name.strip() for name in sample_rows[0]] if sample_rows else []
+        multiline_fields = any('\n' in field or '\r' in field for row in sample_rows[:-1] for field in row)
+        splittable = not encoding.startswith('utf-16') and not multiline_fields
+
+        data_offset = 0
+        if splittable:
+            f.seek(0)
+            data_offset = len(f.readline()) # Header is a single line when splittable
+    print(f"Detected encoding '{encoding}', delimiter {fmtparams['delimiter']!r} for '{csv_file_path}'.")
+    return {'encoding': encoding, 'fmtparams': fmtparams, 'fieldnames': fieldnames,
+            'data_offset': data_offset, 'splittable': splittable}
+
+
+# --- Parsing (runs in worker processes) ---
+def decode_as_windows_1252(error):
+    """Codec error handler: bytes the detected encoding rejects are read as windows-1252.
+
+    The encoding is sniffed from the start of the file only, so an ANSI export
+    whose first SNIFF_SAMPLE_BYTES happen to be ASCII is detected as UTF-8; its
+    later accented bytes decode as the old windows-1252 default assumed. The
+    five bytes windows-1252 leaves undefined become U+FFFD.
+    """
+    return error.object[error.start:error.end].decode('windows-1252', errors='replace'), error.end
+
+codecs.register_error(DECODE_ERRORS, decode_as_windows_1252)
+
+
+def plan_byte_ranges(csv_file_path, start, chunk_bytes=PARSE_CHUNK_BYTES):
+    """Cuts the file from 'start' into (start, end) ranges of about chunk_bytes, each ending after a newline."""
+    ranges = []
+    file_size = os.path.getsize(csv_file_path)
+    with open(csv_file_path, 'rb') as f:
+        while start < file_size:
+            f.seek(min(start + chunk_bytes, file_size))
+            f.readline() # Finish the line the cut point landed in
+            end = min(f.tell(), file_size)
+            ranges.append((start, end))
+            start = end
+    return ranges
 
+
+def parse_rows(rows, fieldnames, row_parser):
+    """Applies row_parser to (values) lists. Returns (row_count, records, rejects).
+
+    records are (local_index, record, values); rejects are (local_index, values,
+    reason), local_index being the row's position in this batch (0-based).
+    """
+    records, rejects = [], []
+    row_count = 0
+    for values in rows:
+        if not values: # Blank line, skipped like csv.DictReader does
+            continue
+        row = dict(zip(fieldnames, values))
+        record, reason = row_parser(row)
+        if record is None:
+            rejects.append((row_count, values, reason))
+        else:
+            records.append((row_count, record, values))
+        row_count += 1
+    return row_count, records, rejects
+
+
+def parse_byte_range(csv_file_path, start, end, encoding, fmtparams, fieldnames, row_parser=parse_part_type_row):
+    """Worker task: decodes and validates the rows in one byte range of the file."""
+    with open(csv_file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    text = data.decode(encoding, errors=DECODE_ERRORS)
+    return parse_rows(csv.reader(io.StringIO(text, newline=''), **fmtparams), fieldnames, row_parser)
+
+
+def iter_parsed_chunks(csv_file_path, csv_format, executor=None, max_in_flight=8, row_parser=parse_part_type_row):
+    """Yields (row_count, records, rejects) per chunk of the file, in file order.
+
+    Splittable files are parsed by 'executor' (a process pool) over byte ranges,
+    with at most max_in_flight chunks parsed ahead of the writer; otherwise (or without an
+    executor) the file is parsed sequentially in this process.
+    """
+    fieldnames, fmtparams, encoding = csv_format['fieldnames'], csv_format['fmtparams'], csv_format['encoding']
+    if executor is None or not csv_format['splittable']:
+        with open(csv_file_path, mode='r', encoding=encoding, errors=DECODE_ERRORS, newline='') as csvfile:
+            reader = csv.reader(csvfile, **fmtparams)
+            next(reader, None) # Header
+            while True:
+                batch = [values for _, values in zip(range(IMPORT_CHUNK_SIZE), reader)]
+                if not batch:
+                    return
+                yield parse_rows(batch, fieldnames, row_parser)
+
+    ranges = plan_byte_ranges(csv_file_path, csv_format['data_offset'])
+    pending = []
+    for start, end in ranges:
+        pending.append(executor.submit(parse_byte_range, csv_file_path, start, end, encoding, fmtparams, fieldnames, row_parser))
+        if len(pending) >= max_in_flight:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+
+# --- Import ---
+def import_catalogues(db_name, csv_file_paths, upsert=False, chunk_size=IMPORT_CHUNK_SIZE, workers=None,
+                      rejected_paths=None, backup=True):
+    """Imports one or more supplier catalogue CSVs into part_types.
+
+    Parsing and validation run in a pool of 'workers' processes (default: all
+    cores; 1 parses in this process) over byte ranges of each file. This process
+    is the single writer: it classifies rows against identifier maps loaded once
+    for the whole run and commits them in chunk_size batches (see write_chunk),
+    so a part type repeated across files is only inserted once. Rejected rows
+    go to rejected_paths[csv] (default '<csv>.rejected.csv'). Unless backup=False
+    the database is snapshotted first (db_backup); the import does not start if that fails.
+    Returns a list with one summary dict per file.
+    """
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    conn = None
+    summaries = []
+    try:
+        if backup:
+            backup_database(db_name, reason='pre-import')
+        conn = apply_pragmas(sqlite3.connect(db_name, isolation_level=None)) # Transactions are managed per chunk
+        by_part_number, by_artikelnummer = load_identifier_maps(conn.cursor())
+        for csv_file_path in csv_file_paths:
+            summaries.append(_import_file(conn, csv_file_path, by_part_number, by_artikelnummer, upsert, chunk_size,
+                                          executor, 2 * workers, (rejected_paths or {}).get(csv_file_path)))
     except sqlite3.Error as e:
-        print(f"SQLite error during import: {e}")
+        print(f"SQLite error opening '{db_name}': {e}")
+    except (RuntimeError, OSError) as e:
+        print(f"Backup of '{db_name}' failed, import not started: {e}")
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
         if conn:
-            conn.rollback()
+            conn.close()
+    return summaries
+
+
+def _import_file(conn, csv_file_path, by_part_number, by_artikelnummer, upsert, chunk_size, executor,
+                 max_in_flight, rejected_path=None):
+    summary = {'file': csv_file_path, 'rows': 0, 'inserted': 0, 'updated': 0, 'skipped': 0, 'rejected': 0,
+               'seconds': 0.0, 'rejected_file': None}
+    started = time.perf_counter()
+    rejected = None
+    try:
+        csv_format = sniff_csv_format(csv_file_path)
+        rejected = RejectedRows(rejected_path or f"{csv_file_path}.rejected.csv", csv_format['fieldnames'])
+        pending, pending_rows = [], [] # Valid records and their (row_number, values) for rejects
+        seen = set()
+
+        def flush():
+            inserted, updated, skipped, duplicates = write_chunk(conn, pending, by_part_number, by_artikelnummer, seen, upsert)
+            summary['inserted'] += inserted; summary['updated'] += updated; summary['skipped'] += skipped
+            for index in duplicates:
+                rejected.add(*pending_rows[index], "duplicate identifier within the file")
+            pending.clear(); pending_rows.clear()
+
+        for row_count, records, rejects in iter_parsed_chunks(csv_file_path, csv_format, executor, max_in_flight):
+            first_row_number = summary['rows'] + 1 # Data rows are numbered from 1, like before
+            for index, values, reason in rejects:
+                rejected.add(first_row_number + index, values, reason)
+            for index, record, values in records:
+                pending.append(record); pending_rows.append((first_row_number + index, values))
+                if len(pending) >= chunk_size:
+                    flush()
+            summary['rows'] += row_count
+        if pending:
+            flush()
+    except sqlite3.Error as e:
+        print(f"SQLite error during import of '{csv_file_path}' (rows committed in earlier chunks are kept): {e}")
     except FileNotFoundError:
         print(f"Error: The file '{csv_file_path}' was not found.")
-    except UnicodeDecodeError as ude:
-        print(f"UnicodeDecodeError: Could not decode the file with 'windows-1252' or 'latin-1'. The file might be saved with a different encoding. Error: {ude}")
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        if conn:
-            conn.rollback()
+        print(f"An unexpected error occurred importing '{csv_file_path}': {e}")
+    finally:
+        if rejected:
+            summary['rejected'] = rejected.count
+            summary['rejected_file'] = rejected.close()
+
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    print(f"\nImport of '{csv_file_path}' complete: {summary['rows']} rows in {summary['seconds']}s "
+          f"({summary['inserted']} inserted, {summary['updated']} updated, "
+          f"{summary['skipped']} skipped as existing, {summary['rejected']} rejected).")
+    if summary['rejected_file']:
+        print(f"Rejected rows written to '{summary['rejected_file']}'.")
+    return summary
+
+
+def import_part_types_from_csv(db_name, csv_file_path, upsert=False, chunk_size=IMPORT_CHUNK_SIZE, rejected_path=None,
+                               workers=None, backup=True):
+    """Imports a single catalogue CSV; see import_catalogues. Returns its summary dict."""
+    summaries = import_catalogues(db_name, [csv_file_path], upsert=upsert, chunk_size=chunk_size, workers=workers,
+                                  rejected_paths={csv_file_path: rejected_path} if rejected_path else None, backup=backup)
+    return summaries[0] if summaries else None
+
+# --- Stock Receipt Import ---
+def import_stock_receipt_from_csv(db_name, csv_file_path, order_number=None, order_date=None, dry_run=False,
+                                  rejected_path=None, workers=1, backup=True):
+    """Receives the quantities ('Aantal') of a CSV as one stock order.
+
+    Every row's GPCID / Artikelnummer is resolved to a part type in one set-based
+    pass (GPCID matches part_number, Artikelnummer matches artikelnummer; a row
+    whose identifiers point at different part types is rejected as ambiguous).
+    Quantities are summed per part type into stock_order_lines and the units are
+    created by receive_stock_order(), all in a single transaction. With
+    dry_run=True the same work is done and then rolled back. Otherwise, unless
+    backup=False, the database is snapshotted (db_backup) before it is written.
+    order_date is checked with parse_order_date before anything is read or
+    written (ValueError if malformed). Returns a summary dict including rows/s and items/s.
+    """
+    if order_date is not None:
+        order_date = parse_order_date(order_date)
+    summary = {'file': csv_file_path, 'rows': 0, 'zero_qty': 0, 'rejected': 0, 'lines': 0, 'items_created': 0,
+               'stock_order_id': None, 'dry_run': dry_run, 'seconds': 0.0, 'rejected_file': None}
+    started = time.perf_counter()
+    conn = rejected = None
+    executor = ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+    try:
+        csv_format = sniff_csv_format(csv_file_path)
+        rejected = RejectedRows(rejected_path or f"{csv_file_path}.rejected.csv", csv_format['fieldnames'])
+        receipts = [] # (row_number, (part_number, artikelnummer, qty), values)
+        for row_count, records, rejects in iter_parsed_chunks(csv_file_path, csv_format, executor,
+                                                              row_parser=parse_stock_row):
+            first_row_number = summary['rows'] + 1
+            for index, values, reason in rejects:
+                rejected.add(first_row_number + index, values, reason)
+            for index, record, values in records:
+                if record[2] == 0:
+                    summary['zero_qty'] += 1
+                else:
+                    receipts.append((first_row_number + index, record, values))
+            summary['rows'] += row_count
+
+        if backup and not dry_run and receipts:
+            backup_database(db_name, reason='pre-stock-import')
+        conn = apply_pragmas(sqlite3.connect(db_name, isolation_level=None))
+        cursor = conn.cursor()
+        begin_immediate(conn)
+        try:
+            identifiers = [identifier for _, record, _ in receipts for identifier in record[:2] if identifier]
+            resolved = resolve_part_identifiers(cursor, identifiers)
+            qty_by_part_type = {}
+            for row_number, (part_number, artikelnummer, qty), values in receipts:
+                part_ids = {match['id'] for match in resolved.get(part_number, []) if match['matched_on'] == 'part_number'}
+                part_ids |= {match['id'] for match in resolved.get(artikelnummer, []) if match['matched_on'] == 'artikelnummer'}
+                if len(part_ids) != 1:
+                    rejected.add(row_number, values, "unknown part type" if not part_ids else
+                                 f"ambiguous identifiers (part type IDs {', '.join(map(str, sorted(part_ids)))})")
+                    continue
+                part_type_id = part_ids.pop()
+                qty_by_part_type[part_type_id] = qty_by_part_type.get(part_type_id, 0) + qty
+
+            if qty_by_part_type:
+                result = receive_stock_order(
+                    cursor, [{'part_type_id': part_type_id, 'qty': qty} for part_type_id, qty in qty_by_part_type.items()],
+                    order_number=order_number or os.path.splitext(os.path.basename(csv_file_path))[0],
+                    notes=f"Imported from '{os.path.basename(csv_file_path)}'", order_date=order_date)
+                summary.update(stock_order_id=result['stock_order_id'], lines=len(result['lines']),
+                               items_created=result['items_created'])
+            cursor.execute("ROLLBACK" if dry_run else "COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as e:
+        print(f"SQLite error during stock import of '{csv_file_path}' (nothing was received): {e}")
+    except FileNotFoundError:
+        print(f"Error: The file '{csv_file_path}' was not found.")
+    except Exception as e:
+        print(f"An unexpected error occurred importing stock from '{csv_file_path}' (nothing was received): {e}")
     finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        if rejected:
+            summary['rejected'] = rejected.count
+            summary['rejected_file'] = rejected.close()
         if conn:
             conn.close()
 
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    elapsed = max(summary['seconds'], 0.001)
+    summary['rows_per_second'] = round(summary['rows'] / elapsed)
+    summary['items_per_second'] = round(summary['items_created'] / elapsed)
+    outcome = "DRY RUN, rolled back" if dry_run else f"stock order {summary['stock_order_id']}"
+    print(f"\nStock import of '{csv_file_path}' complete ({outcome}): {summary['rows']} rows in {summary['seconds']}s, "
+          f"{summary['lines']} order lines, {summary['items_created']} items "
+          f"({summary['rows_per_second']} rows/s, {summary['items_per_second']} items/s); "
+          f"{summary['zero_qty']} rows without quantity, {summary['rejected']} rejected.")
+    if summary['rejected_file']:
+        print(f"Rejected rows written to '{summary['rejected_file']}'.")
+    return summary
+
 if __name__ == '__main__':
-    print(f"Attempting to import part types from '{CSV_FILE_NAME}' into '{DATABASE_NAME}'...")
-    # IMPORTANT: Backup your database (inventory.db) before running this script!
-    import_part_types_from_csv(DATABASE_NAME, CSV_FILE_NAME)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Import part types from supplier catalogue CSVs, "
+                                                 "or with --stock receive their 'Aantal' quantities.")
+    parser.add_argument('csv_files', nargs='*', default=[CSV_FILE_NAME])
+    parser.add_argument('--db', default=DATABASE_NAME)
+    parser.add_argument('--upsert', action='store_true', help="update name/brand/model/type of existing part types")
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, help="parser processes (default: all cores)")
+    parser.add_argument('--stock', action='store_true', help="receive the Aantal column as one stock order per file")
+    parser.add_argument('--order-number', help="--stock: order number (default: the file name)")
+    parser.add_argument('--order-date', help="--stock: order date, YYYY-MM-DD (default: now)")
+    parser.add_argument('--dry-run', action='store_true', help="--stock: validate and receive, then roll back")
+    parser.add_argument('--no-backup', action='store_true', help="skip the database snapshot taken before importing")
+    args = parser.parse_args()
+
+    if args.stock:
+        try:
+            order_date = parse_order_date(args.order_date) if args.order_date else None
+        except ValueError as e:
+            parser.error(str(e))
+        for csv_file in args.csv_files:
+            print(f"Attempting to receive stock from '{csv_file}' into '{args.db}'...")
+            import_stock_receipt_from_csv(args.db, csv_file, order_number=args.order_number, order_date=order_date,
+                                          dry_run=args.dry_run, workers=args.workers or 1, backup=not args.no_backup)
+    else:
+        print(f"Attempting to import part types from {', '.join(repr(p) for p in args.csv_files)} into '{args.db}'...")
+        import_catalogues(args.db, args.csv_files, upsert=args.upsert, chunk_size=args.chunk_size, workers=args.workers,
+                          backup=not args.no_backup)
\ No newline at end of file
@@ -0,0 +1,343 @@
+# inventory_ops.py - Set-based stock operations shared by app.py and the import scripts
+import sqlite3
+import datetime
+import json
+import time
+from dateutil.relativedelta import relativedelta
+
+IDENTIFIER_CHUNK_SIZE = 500 # Identifiers per IN (...) list, well under SQLite's bound parameter limit
+
+
+# --- Stock Receiving ---
+def receive_stock_order(cursor, lines, order_number=None, notes=None, order_date=None):
+    """Creates a stock order, its lines and every physical unit in a handful of statements.
+
+    'lines' is a list of dicts with 'part_type_id' and 'qty' (and optionally
+    'cost_price_per_unit'). Units are generated with a recursive CTE, one
+    INSERT ... SELECT per line, instead of one INSERT per unit. 'order_date' is a
+    'YYYY-MM-DD HH:MM:SS' string or None for CURRENT_TIMESTAMP.
+
+    The caller owns the transaction (BEGIN before, commit/rollback after).
+    Returns a dict with the order id, per-line item id ranges, the number of
+    items created and the elapsed time in milliseconds.
+    """
+    started = time.perf_counter()
+    cursor.execute("INSERT INTO stock_orders (order_number, notes, order_date) VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+                   (order_number, notes, order_date))
+    stock_order_id = cursor.lastrowid
+    if not stock_order_id: raise sqlite3.Error("Failed to create stock order record.")
+
+    created_lines = []
+    items_created = 0
+    for line in lines:
+        part_type_id, qty = line['part_type_id'], line['qty']
+        if qty < 1: raise ValueError(f"Quantity for part ID {part_type_id} must be positive.")
+        cursor.execute("INSERT INTO stock_order_lines (stock_order_id, part_id, quantity_received, cost_price_per_unit) VALUES (?, ?, ?, ?)",
+                       (stock_order_id, part_type_id, qty, line.get('cost_price_per_unit')))
+        line_id = cursor.lastrowid
+        if not line_id: raise sqlite3.Error(f"Failed to create stock order line for part ID {part_type_id}.")
+
+        # The CTE sits inside the INSERT so sqlite3 still reports rowcount/lastrowid for it
+        cursor.execute("""
+            INSERT INTO inventory_items (part_type_id, status, stock_order_line_id, date_received, last_updated)
+            WITH RECURSIVE unit(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM unit WHERE n < ?)
+            SELECT ?, 'Available', ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP FROM unit
+        """, (qty, part_type_id, line_id))
+        if cursor.rowcount != qty:
+            raise sqlite3.Error(f"Expected {qty} item(s) for part ID {part_type_id}, created {cursor.rowcount}.")
+        # AUTOINCREMENT ids from a single INSERT ... SELECT under the write lock are contiguous
+        last_item_id = cursor.lastrowid
+        created_lines.append({
+            'line_id': line_id,
+            'part_type_id': part_type_id,
+            'qty': qty,
+            'first_item_id': last_item_id - qty + 1,
+            'last_item_id': last_item_id,
+        })
+        items_created += qty
+
+    return {
+        'stock_order_id': stock_order_id,
+        'lines': created_lines,
+        'items_created': items_created,
+        'elapsed_ms': (time.perf_counter() - started) * 1000,
+    }
+
+
+# --- Item Claims ---
+# Every claim is a single guarded UPDATE (... AND status = 'Available'), so a unit
+# can never be claimed twice, even by two deferred transactions: the loser's
+# UPDATE matches no row. Run inside begin_immediate() so the read of the
+# candidates and the write happen under the same lock.
+def claim_items(cursor, item_ids, status='Reserved'):
+    """Moves every listed Available item to 'status' in one UPDATE; returns the claimed ids.
+
+    All or nothing: if any item is missing or not Available a ValueError naming
+    them is raised and the caller must roll back.
+    """
+    item_ids = list(dict.fromkeys(item_ids))
+    cursor.execute("""
+        UPDATE inventory_items SET status = ?, last_updated = CURRENT_TIMESTAMP
+        WHERE id IN (SELECT value FROM json_each(?)) AND status = 'Available'
+        RETURNING id
+    """, (status, json.dumps(item_ids)))
+    claimed = {row[0] for row in cursor.fetchall()}
+    if len(claimed) < len(item_ids):
+        unclaimed = [item_id for item_id in item_ids if item_id not in claimed]
+        cursor.execute("SELECT id, status FROM inventory_items WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(unclaimed),))
+        statuses = {row[0]: row[1] for row in cursor.fetchall()}
+        raise ValueError(" ".join(f"Item (ID: {item_id}) not Available (Status: {statuses[item_id]})." if item_id in statuses
+                                  else f"Selected Inventory Item ID {item_id} not found." for item_id in unclaimed))
+    return sorted(claimed)
+
+def claim_available_units(cursor, part_type_id, qty, status='Reserved'):
+    """Moves the qty oldest Available units (by date_received) of a part type to 'status'.
+
+    One UPDATE ... RETURNING, walking idx_invitem_parttype_status_received in
+    FIFO order. All or nothing: if fewer than qty units are Available a
+    ValueError is raised and the caller must roll back. Returns the claimed ids.
+    """
+    if qty < 1: raise ValueError(f"Quantity for part ID {part_type_id} must be positive.")
+    cursor.execute("""
+        UPDATE inventory_items SET status = ?, last_updated = CURRENT_TIMESTAMP
+        WHERE id IN (SELECT id FROM inventory_items WHERE part_type_id = ? AND status = 'Available'
+                     ORDER BY date_received, id LIMIT ?)
+          AND status = 'Available'
+        RETURNING id
+    """, (status, part_type_id, qty))
+    item_ids = sorted(row[0] for row in cursor.fetchall())
+    if len(item_ids) < qty:
+        raise ValueError(f"Only {len(item_ids)} Available unit(s) of part type ID {part_type_id}, {qty} requested.")
+    return item_ids
+
+def assign_items_to_booking(cursor, booking_id, item_ids):
+    """Links claimed items to a booking in one INSERT; returns the number of links created."""
+    cursor.execute("INSERT INTO booking_parts_used (booking_id, inventory_item_id) SELECT ?, value FROM json_each(?)",
+                   (booking_id, json.dumps(list(item_ids))))
+    return cursor.rowcount
+
+
+# --- Booking Parts ---
+def booking_item_status(booking_status):
+    """Status a part takes when it is assigned to a booking in booking_status."""
+    return 'Installed' if booking_status == 'Completed' else 'Reserved'
+
+def release_booking_items(cursor, booking_id, item_ids=None):
+    """Puts a booking's Reserved parts (all, or only item_ids) back to Available and unlinks them.
+
+    Installed parts stay linked. Two set-based statements; returns the released ids.
+    """
+    scope_sql, params = "", [booking_id]
+    if item_ids is not None:
+        scope_sql = " AND inventory_item_id IN (SELECT value FROM json_each(?))"; params.append(json.dumps(list(item_ids)))
+    cursor.execute(f"""
+        UPDATE inventory_items SET status = 'Available', last_updated = CURRENT_TIMESTAMP
+        WHERE id IN (SELECT inventory_item_id FROM booking_parts_used WHERE booking_id = ?{scope_sql})
+          AND status = 'Reserved'
+        RETURNING id
+    """, params)
+    released = sorted(row[0] for row in cursor.fetchall())
+    if released:
+        cursor.execute("DELETE FROM booking_parts_used WHERE booking_id = ? AND inventory_item_id IN (SELECT value FROM json_each(?))",
+                       (booking_id, json.dumps(released)))
+    return released
+
+def cascade_booking_status(cursor, booking_id, old_status, new_status):
+    """Moves a booking's parts along with its status change; returns how many items changed.
+
+    Completed: Reserved -> Installed. Cancelled: Reserved parts are released
+    (release_booking_items); a booking with Installed parts cannot be cancelled
+    (ValueError) and has to be reopened first, so leaving Cancelled has nothing
+    to revert. Reopening a Completed booking: Installed -> Reserved.
+    Each is one UPDATE over booking_parts_used (idx_bpu_booking_item).
+    """
+    if old_status == new_status:
+        return 0
+    if new_status == 'Cancelled':
+        cursor.execute("""
+            SELECT COUNT(*) FROM booking_parts_used bpu JOIN inventory_items i ON i.id = bpu.inventory_item_id
+            WHERE bpu.booking_id = ? AND i.status = 'Installed'
+        """, (booking_id,))
+        installed = cursor.fetchone()[0]
+        if installed: raise ValueError(f"Booking ID {booking_id} has {installed} installed part(s); reopen it before cancelling.")
+        return len(release_booking_items(cursor, booking_id))
+    if new_status == 'Completed':
+        from_status, to_status = 'Reserved', 'Installed'
+    elif old_status == 'Completed':
+        from_status, to_status = 'Installed', 'Reserved'
+    else:
+        return 0
+    cursor.execute("""
+        UPDATE inventory_items SET status = ?, last_updated = CURRENT_TIMESTAMP
+        WHERE id IN (SELECT inventory_item_id FROM booking_parts_used WHERE booking_id = ?) AND status = ?
+    """, (to_status, booking_id, from_status))
+    return cursor.rowcount
+
+def fetch_booking_parts(cursor, booking_ids):
+    """Parts of many bookings in one query: {booking_id: [part dict, ...]} in assignment order."""
+    parts = {}
+    if not booking_ids:
+        return parts
+    cursor.execute("""
+        SELECT bpu.booking_id, i.id, i.status, i.serial_number, pt.part_name, pt.part_number, bpu.date_assigned
+        FROM booking_parts_used bpu
+        JOIN inventory_items i ON i.id = bpu.inventory_item_id
+        JOIN part_types pt ON pt.id = i.part_type_id
+        WHERE bpu.booking_id IN (SELECT value FROM json_each(?))
+        ORDER BY bpu.booking_id, bpu.id
+    """, (json.dumps(list(booking_ids)),))
+    for row in cursor.fetchall():
+        parts.setdefault(row[0], []).append({'id': row[1], 'status': row[2], 'serial_number': row[3],
+                                             'part_name': row[4], 'part_number': row[5], 'date_assigned': row[6]})
+    return parts
+
+
+# --- Status History (append-only item_events / booking_events, schema v18) ---
+# entity -> (events table, entity id column, status code table)
+EVENT_LOGS = {
+    'item': ('item_events', 'item_id', 'item_status_codes'),
+    'booking': ('booking_events', 'booking_id', 'booking_status_codes'),
+}
+SECONDS_PER_DAY = 86400.0
+NOW_EPOCH_SQL = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+def _days(seconds):
+    return round(seconds / SECONDS_PER_DAY, 2) if seconds is not None else None
+
+def status_history(cursor, entity, entity_id):
+    """Status changes of one item or booking, oldest first: [{'ts' (UTC text), 'old_status', 'new_status'}].
+
+    A new_status of None means the row was deleted. One range scan of the (entity id, ts) index.
+    """
+    events_table, id_column, codes_table = EVENT_LOGS[entity]
+    cursor.execute(f"""
+        SELECT datetime(e.ts, 'unixepoch'), old_code.status, new_code.status
+        FROM {events_table} e
+        LEFT JOIN {codes_table} old_code ON old_code.code = e.old_status
+        LEFT JOIN {codes_table} new_code ON new_code.code = e.new_status
+        WHERE e.{id_column} = ?
+        ORDER BY e.ts, e.id
+    """, (entity_id,))
+    return [{'ts': row[0], 'old_status': row[1], 'new_status': row[2]}
+            for row in cursor.fetchall()]
+
+def time_in_status(cursor, entity, since_days=None):
+    """Time spent in each status, from the event log: {status: stats dict}, in status code order.
+
+    A stay runs from the event entering a status to the next event of the same
+    item/booking. LEAD() walks the log in (entity id, ts) index order, so the
+    whole log is read once from the covering index without sorting. Stats per status:
+      stays / avg_days / max_days       - finished stays (left the status)
+      entities / avg_days_per_entity    - total finished time per item/booking that had any
+      current / current_avg_days        - items/bookings in the status now, and for how long
+    since_days limits this to stays that started within the last since_days days.
+    """
+    events_table, id_column, codes_table = EVENT_LOGS[entity]
+    since_sql, params = "", []
+    if since_days is not None:
+        since_sql = f"WHERE p.started >= {NOW_EPOCH_SQL} - ?"; params.append(int(since_days * SECONDS_PER_DAY))
+    cursor.execute(f"""
+        WITH stays AS (
+            SELECT {id_column} AS entity_id, new_status AS code, ts AS started,
+                   LEAD(ts) OVER (PARTITION BY {id_column} ORDER BY ts, id) AS ended
+            FROM {events_table}
+        )
+        SELECT c.status,
+               COUNT(p.ended), SUM(p.ended - p.started), MAX(p.ended - p.started),
+               COUNT(DISTINCT CASE WHEN p.ended IS NOT NULL THEN p.entity_id END),
+               COUNT(*) - COUNT(p.ended),
+               AVG(CASE WHEN p.ended IS NULL THEN {NOW_EPOCH_SQL} - p.started END)
+        FROM stays p JOIN {codes_table} c ON c.code = p.code
+        {since_sql}
+        GROUP BY c.code
+        ORDER BY c.code
+    """, params)
+    stats = {}
+    for status, stays, total_seconds, max_seconds, entities, current, current_avg_seconds in cursor.fetchall():
+        stats[status] = {
+            'stays': stays, 'avg_days': _days(total_seconds / stays) if stays else None, 'max_days': _days(max_seconds),
+            'entities': entities, 'avg_days_per_entity': _days(total_seconds / entities) if entities else None,
+            'current': current, 'current_avg_days': _days(current_avg_seconds),
+        }
+    return stats
+
+def booking_turnaround(cursor, since_days=None):
+    """Days from booking_date to first reaching 'Completed': {'bookings', 'avg_days', 'max_days'}.
+
+    The first Completed event per booking is found in (booking_id, ts) index
+    order. Bookings completed before the log existed count from their backfilled
+    event (their last_updated). since_days limits it to bookings completed within
+    the last since_days days.
+    """
+    completed_sql, params = "", []
+    if since_days is not None:
+        completed_sql = f"WHERE completed.ts >= {NOW_EPOCH_SQL} - ?"; params.append(int(since_days * SECONDS_PER_DAY))
+    cursor.execute(f"""
+        SELECT COUNT(*), AVG(completed.ts - strftime('%s', b.booking_date)), MAX(completed.ts - strftime('%s', b.booking_date))
+        FROM (SELECT booking_id, MIN(ts) AS ts FROM booking_events
+              WHERE new_status = (SELECT code FROM booking_status_codes WHERE status = 'Completed')
+              GROUP BY booking_id) completed
+        JOIN bookings b ON b.id = completed.booking_id
+        {completed_sql}
+    """, params)
+    count, avg_seconds, max_seconds = cursor.fetchone()
+    return {'bookings': count, 'avg_days': _days(avg_seconds), 'max_days': _days(max_seconds)}
+
+
+# --- Part Identifier Resolution ---
+def resolve_part_identifiers(cursor, identifiers):
+    """Resolves part identifiers (part_number / GPC or artikelnummer) to part types in bulk.
+
+    Each column gets its own IN (...) list so idx_pt_number and idx_pt_artikelnummer
+    are both used (an OR across the two columns usually defeats them), and the two
+    halves are combined with UNION ALL. Returns {identifier: [match, ...]} where each
+    match is a dict with 'id', 'part_name' and 'matched_on'; identifiers that match
+    nothing map to an empty list. More than one distinct 'id' means the identifier is
+    ambiguous.
+    """
+    unique_identifiers = list(dict.fromkeys(identifiers))
+    resolved = {identifier: [] for identifier in unique_identifiers}
+    for start in range(0, len(unique_identifiers), IDENTIFIER_CHUNK_SIZE):
+        chunk = unique_identifiers[start:start + IDENTIFIER_CHUNK_SIZE]
+        placeholders = ", ".join("?" * len(chunk))
+        cursor.execute(f"""
+            SELECT part_number AS identifier, id, part_name, 'part_number' AS matched_on
+            FROM part_types WHERE part_number IN ({placeholders})
+            UNION ALL
+            SELECT artikelnummer AS identifier, id, part_name, 'artikelnummer' AS matched_on
+            FROM part_types WHERE artikelnummer IN ({placeholders})
+        """, chunk + chunk)
+        for row in cursor.fetchall():
+            resolved[row[0]].append({'id': row[1], 'part_name': row[2], 'matched_on': row[3]})
+    return resolved
+
+
+# --- Age Columns (computed in SQL) ---
+# Ages are measured against local time, like the rest of the app. A NULL or
+# unparseable timestamp gives 0 rather than failing the whole row.
+ITEM_DAYS_IN_SYSTEM_SQL = "COALESCE(CAST(julianday('now', 'localtime') - julianday(i.date_received) AS INTEGER), 0)"
+# Whole calendar months elapsed (same result as relativedelta's years * 12 + months);
+# a booking dated in the future counts as 0
+BOOKING_MONTHS_IN_SYSTEM_SQL = """COALESCE(MAX(0,
+    (CAST(strftime('%Y', 'now', 'localtime') AS INTEGER) - CAST(strftime('%Y', b.booking_date) AS INTEGER)) * 12
+    + CAST(strftime('%m', 'now', 'localtime') AS INTEGER) - CAST(strftime('%m', b.booking_date) AS INTEGER)
+    - (strftime('%d%H%M%S', 'now', 'localtime') < strftime('%d%H%M%S', b.booking_date))), 0)"""
+
+def age_threshold(days=None, months=None):
+    """Timestamp string such that rows dated at or before it are at least that old."""
+    threshold = datetime.datetime.now() - relativedelta(days=days or 0, months=months or 0)
+    return threshold.strftime('%Y-%m-%d %H:%M:%S')
+
+
+# --- Full-Text Search ---
+def fts_match_query(term):
+    """Builds an FTS5 MATCH expression from free text, or None if it has no searchable words.
+
+    Every word must match as a token prefix ("sam gal" finds "Samsung Galaxy").
+    Words are quoted, so FTS5 operators and punctuation in user input are literal;
+    "SM-A515" becomes the phrase "sm a515*".
+    """
+    words = [w for w in term.split() if any(ch.isalnum() for ch in w)]
+    if not words:
+        return None
+    return " ".join('"' + w.replace('"', '""') + '"*' for w in words)
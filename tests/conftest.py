@@ -0,0 +1,52 @@
+# conftest.py - Shared fixtures: the repo root on sys.path and a small generated database
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+TEST_SCALE = {'part_types': 200, 'items': 5000, 'bookings': 300}
+
+
+@pytest.fixture(scope='session')
+def generated_db(tmp_path_factory):
+    """Path of a database filled by generate_data (same seed every run); treat it as read-only."""
+    import generate_data
+    db_path = str(tmp_path_factory.mktemp('generated') / 'inventory.db')
+    generate_data.generate_database(db_path, seed=42, **TEST_SCALE)
+    return db_path
+
+
+@pytest.fixture
+def app_client(generated_db, tmp_path):
+    """Flask test client of app.py running on a private copy of the generated database."""
+    pytest.importorskip('flask')
+    import shutil
+    import app as app_module
+    db_path = str(tmp_path / 'inventory.db')
+    shutil.copy(generated_db, db_path)
+    previous = app_module.DATABASE
+    app_module.DATABASE = db_path
+    app_module.app.testing = True
+    yield app_module.app.test_client()
+    app_module.DATABASE = previous
+    for pool in app_module._db_pools.values():
+        pool.close()
+    app_module._db_pools.clear()
+
+
+@pytest.fixture
+def empty_db(tmp_path):
+    """Path of a new database with the current schema and no rows."""
+    import database_setup
+    db_path = str(tmp_path / 'empty.db')
+    previous = database_setup.DATABASE
+    database_setup.DATABASE = db_path
+    try:
+        database_setup.init_db(backup=False)
+    finally:
+        database_setup.DATABASE = previous
+    return db_path
@@ -0,0 +1,46 @@
+# test_api_etag.py - /api/v1 ETags move with every committed change, however close together
+import gc
+import sqlite3
+
+import pytest
+
+pytest.importorskip('flask')
+import app  # noqa: E402
+import db_metrics  # noqa: E402
+
+
+def get_etag(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.headers['ETag']
+
+
+@pytest.mark.parametrize('url, table', [('/api/v1/bookings', 'bookings'), ('/api/v1/inventory', 'inventory_items')])
+def test_etag_changes_on_updates_within_one_second(app_client, url, table):
+    writer = sqlite3.connect(app.DATABASE, isolation_level=None)
+    row_id = writer.execute(f"SELECT MIN(id) FROM {table}").fetchone()[0]
+    etags = [get_etag(app_client, url)]
+    for note in ('first', 'second'):  # Same second, so MAX(last_updated) and COUNT(*) would not move
+        writer.execute(f"UPDATE {table} SET notes = ?, last_updated = '2024-01-01 00:00:00' WHERE id = ?", (note, row_id))
+        etags.append(get_etag(app_client, url))
+    writer.close()
+    assert len(set(etags)) == 3
+    assert app_client.get(url, headers={'If-None-Match': etags[0]}).status_code == 200
+    assert app_client.get(url, headers={'If-None-Match': etags[-1]}).status_code == 304
+
+
+def test_fingerprint_cache_is_dropped_with_its_connection(generated_db):
+    conn = sqlite3.connect(generated_db, factory=db_metrics.InstrumentedConnection)  # As handed out by the pools
+    app.api_fingerprint(conn, 'bookings')
+    assert conn in app._api_fingerprints
+    size = len(app._api_fingerprints)
+    conn.close()
+    del conn
+    gc.collect()
+    assert len(app._api_fingerprints) == size - 1
+
+
+def test_plain_connection_is_not_cached(generated_db):
+    conn = sqlite3.connect(generated_db)
+    assert app.api_fingerprint(conn, 'bookings') == app.api_fingerprint(conn, 'bookings')
+    conn.close()
@@ -0,0 +1,46 @@
+# test_benchmark.py - Smoke test of generate_data.py and benchmark.py --compare at a tiny scale
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SMOKE_SCALE = ['--part-types', '30', '--items', '300', '--bookings', '40']
+
+
+def run_script(*args):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, timeout=300)
+
+
+def test_generate_and_compare(tmp_path):
+    pytest.importorskip('flask')
+    db_path = str(tmp_path / 'smoke.db')
+    generated = run_script('generate_data.py', db_path, *SMOKE_SCALE, '--anchor-date', '2026-01-01')
+    assert generated.returncode == 0, generated.stderr
+    assert os.path.exists(db_path)
+
+    baseline_path = str(tmp_path / 'baseline.json')
+    baseline = run_script('benchmark.py', db_path, '--requests', '5', '--warmup', '1', '--json', baseline_path)
+    assert baseline.returncode == 0, baseline.stderr
+    with open(baseline_path, encoding='utf-8') as f:
+        results = json.load(f)
+    import benchmark
+    assert set(results) == set(benchmark.SCENARIOS)
+    assert all(result['errors'] == 0 for result in results.values())
+
+    # Same seed on a fresh copy: identical requests, so only p95 jitter can differ and that is allowed here
+    compared = run_script('benchmark.py', db_path, '--requests', '5', '--warmup', '1',
+                          '--compare', baseline_path, '--max-regression', '100')
+    assert compared.returncode == 0, compared.stderr
+    assert 'REGRESSION' not in compared.stderr
+
+
+def test_compare_results_flags_regressions():
+    import benchmark
+    baseline = {'index': {'p95_ms': 10.0, 'queries_per_request': 3.0, 'errors': 0}}
+    same = {'index': {'p95_ms': 11.0, 'queries_per_request': 3.0, 'errors': 0}}
+    worse = {'index': {'p95_ms': 40.0, 'queries_per_request': 4.0, 'errors': 1}}
+    assert benchmark.compare_results(same, baseline) == []
+    assert len(benchmark.compare_results(worse, baseline)) == 3
@@ -0,0 +1,105 @@
+# test_booking_parts.py - Booking status changes carry their parts along: install, reopen, release, refuse
+import sqlite3
+
+import pytest
+
+from inventory_ops import (assign_items_to_booking, booking_item_status, cascade_booking_status, claim_items,
+                           release_booking_items)
+
+
+def create_booking(conn, status='Booked In', items=2, item_status='Reserved'):
+    """A booking with 'items' new units of part type 1 linked to it; returns (booking_id, item_ids)."""
+    booking_id = conn.execute("INSERT INTO bookings (customer_name, device_model, reported_issue, status) "
+                              "VALUES ('Test Customer', 'Phone X', 'Cracked screen', ?)", (status,)).lastrowid
+    item_ids = [conn.execute("INSERT INTO inventory_items (part_type_id, status) VALUES (1, ?)", (item_status,)).lastrowid
+                for _ in range(items)]
+    assign_items_to_booking(conn.cursor(), booking_id, item_ids)
+    return booking_id, item_ids
+
+
+def linked_statuses(conn, booking_id):
+    return sorted(row[0] for row in conn.execute("""
+        SELECT i.status FROM booking_parts_used bpu JOIN inventory_items i ON i.id = bpu.inventory_item_id
+        WHERE bpu.booking_id = ?""", (booking_id,)))
+
+
+@pytest.fixture
+def conn(empty_db):
+    conn = sqlite3.connect(empty_db, isolation_level=None)
+    conn.execute("INSERT INTO part_types (id, part_name, part_number) VALUES (1, 'Screen A', 'GPC1')")
+    yield conn
+    conn.close()
+
+
+def test_completing_installs_and_reopening_reverts(conn):
+    booking_id, _ = create_booking(conn)
+    assert cascade_booking_status(conn.cursor(), booking_id, 'In Progress', 'Completed') == 2
+    assert linked_statuses(conn, booking_id) == ['Installed', 'Installed']
+    assert booking_item_status('Completed') == 'Installed'
+    assert cascade_booking_status(conn.cursor(), booking_id, 'Completed', 'Completed') == 0
+    assert cascade_booking_status(conn.cursor(), booking_id, 'Completed', 'In Progress') == 2
+    assert linked_statuses(conn, booking_id) == ['Reserved', 'Reserved']
+
+
+def test_cancelling_releases_reserved_parts(conn):
+    booking_id, item_ids = create_booking(conn)
+    assert cascade_booking_status(conn.cursor(), booking_id, 'In Progress', 'Cancelled') == 2
+    assert linked_statuses(conn, booking_id) == []
+    assert claim_items(conn.cursor(), item_ids) == item_ids  # Back in stock
+    assert cascade_booking_status(conn.cursor(), booking_id, 'Cancelled', 'Booked In') == 0  # Nothing to revert
+
+
+def test_release_only_touches_the_selected_reserved_parts(conn):
+    booking_id, (kept, released, installed) = create_booking(conn, items=3)
+    conn.execute("UPDATE inventory_items SET status = 'Installed' WHERE id = ?", (installed,))
+    assert release_booking_items(conn.cursor(), booking_id, [released, installed]) == [released]
+    assert linked_statuses(conn, booking_id) == ['Installed', 'Reserved']
+    assert conn.execute("SELECT status FROM inventory_items WHERE id = ?", (released,)).fetchone()[0] == 'Available'
+    assert release_booking_items(conn.cursor(), booking_id) == [kept]
+
+
+def test_cancelling_a_booking_with_installed_parts_is_refused(conn):
+    booking_id, _ = create_booking(conn, status='Completed', item_status='Installed')
+    with pytest.raises(ValueError, match="2 installed part"):
+        cascade_booking_status(conn.cursor(), booking_id, 'Completed', 'Cancelled')
+    assert linked_statuses(conn, booking_id) == ['Installed', 'Installed']
+
+
+@pytest.fixture
+def app_db(app_client):
+    import app
+    conn = sqlite3.connect(app.DATABASE, isolation_level=None)
+    yield conn
+    conn.close()
+
+
+def flashed(client):
+    """(category, message) pairs flashed by the last request, read from the session and cleared."""
+    with client.session_transaction() as session:
+        return session.pop('_flashes', [])
+
+
+def booking_status(conn, booking_id):
+    return conn.execute("SELECT status FROM bookings WHERE id = ?", (booking_id,)).fetchone()[0]
+
+
+def test_route_refuses_cancelling_a_completed_booking(app_client, app_db):
+    booking_id, _ = create_booking(app_db, status='Completed', item_status='Installed')
+    app_client.post(f'/booking/{booking_id}/edit', data={'status': 'Cancelled', 'notes': ''})
+    assert flashed(app_client) == [('error', f"Booking ID {booking_id} has 2 installed part(s); reopen it before cancelling.")]
+    assert booking_status(app_db, booking_id) == 'Completed'
+    assert linked_statuses(app_db, booking_id) == ['Installed', 'Installed']
+
+    app_client.post(f'/booking/{booking_id}/edit', data={'status': 'In Progress', 'notes': ''})
+    app_client.post(f'/booking/{booking_id}/edit', data={'status': 'Cancelled', 'notes': ''})
+    assert booking_status(app_db, booking_id) == 'Cancelled'
+    assert linked_statuses(app_db, booking_id) == []
+
+
+def test_route_blocks_assigning_parts_to_a_cancelled_booking(app_client, app_db):
+    booking_id, _ = create_booking(app_db, status='Cancelled', items=0)
+    item_id = app_db.execute("SELECT id FROM inventory_items WHERE status = 'Available' LIMIT 1").fetchone()[0]
+    app_client.post(f'/booking/{booking_id}/parts', data={'assign_item_ids': str(item_id)})
+    assert flashed(app_client) == [('error', "Parts cannot be assigned to a Cancelled booking.")]
+    assert linked_statuses(app_db, booking_id) == []
+    assert app_db.execute("SELECT status FROM inventory_items WHERE id = ?", (item_id,)).fetchone()[0] == 'Available'
@@ -0,0 +1,42 @@
+# test_bulk_status.py - Input validation of POST /api/inventory/items/status
+import sqlite3
+
+import pytest
+
+pytest.importorskip('flask')
+import app  # noqa: E402
+
+URL = '/api/inventory/items/status'
+
+
+@pytest.mark.parametrize('body', [[1, 2], "Available", 5, None, True])
+def test_body_that_is_not_an_object_is_rejected(app_client, body):
+    response = app_client.post(URL, json=body)
+    assert response.status_code == 400
+    assert 'error_message' in response.get_json()
+
+
+@pytest.mark.parametrize('item_ids', [[True], [1.5], [[1]], [{'id': 1}], [None], ['1x'], [2 ** 70], [0], [-3], "1,2"])
+def test_malformed_item_ids_are_rejected(app_client, item_ids):
+    response = app_client.post(URL, json={'new_status': 'Broken', 'item_ids': item_ids})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('field, value', [('part_type_id', 1.5), ('part_type_id', [1]), ('stock_order_id', True),
+                                          ('stock_order_id', 2 ** 64)])
+def test_malformed_filter_ids_are_rejected(app_client, field, value):
+    response = app_client.post(URL, json={'new_status': 'Broken', field: value})
+    assert response.status_code == 400
+
+
+def test_valid_ids_from_json_and_form(app_client):
+    conn = sqlite3.connect(app.DATABASE)
+    first, second = [row[0] for row in conn.execute("SELECT id FROM inventory_items WHERE status = 'Available' LIMIT 2")]
+    conn.close()
+    response = app_client.post(URL, json={'new_status': 'Broken', 'item_ids': [first, str(second), 999999999]})
+    assert response.status_code == 200
+    results = {row['id']: row['result'] for row in response.get_json()['results']}
+    assert results == {first: 'updated', second: 'updated', 999999999: 'not_found'}
+    response = app_client.post(URL, data={'new_status': 'Available', 'item_ids': [str(first), str(second)]})
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == 2
@@ -0,0 +1,87 @@
+# test_db_backup.py - Snapshots: .partial cleanup, rotation and restore verification
+import os
+import shutil
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import db_backup
+
+
+@pytest.fixture
+def source_db(tmp_path):
+    path = str(tmp_path / 'shop.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO items (name) VALUES (?)", [(f"item {i} " + 'x' * 200,) for i in range(500)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def item_count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_failed_verification_leaves_no_partial_or_snapshot(source_db, tmp_path, monkeypatch):
+    backup_dir = str(tmp_path / 'backups')
+    monkeypatch.setattr(db_backup, 'check_database', lambda path, full=True: ['page 2 is never used'])
+    with pytest.raises(RuntimeError):
+        db_backup.backup_database(source_db, backup_dir=backup_dir)
+    assert os.listdir(backup_dir) == []
+
+
+def test_rotation_keeps_newest_and_recent_snapshots(source_db, tmp_path):
+    backup_dir = str(tmp_path / 'backups')
+    snapshot = db_backup.backup_database(source_db, backup_dir=backup_dir, rotate=False)
+    prefix = os.path.join(backup_dir, 'shop-')
+    for days_old in (40, 41, 42, 43, 44):  # Five old snapshots next to the fresh one
+        created = datetime.now() - timedelta(days=days_old)
+        shutil.copy(snapshot, f"{prefix}{created.strftime(db_backup.TIMESTAMP_FORMAT)}-manual.db")
+    shutil.copy(snapshot, f"{prefix}{(datetime.now() - timedelta(days=1)).strftime(db_backup.TIMESTAMP_FORMAT)}-manual.db")
+    assert len(db_backup.list_snapshots(source_db, backup_dir)) == 7
+
+    deleted = db_backup.rotate_snapshots(source_db, backup_dir, keep=3, max_age_days=30)
+    remaining = db_backup.list_snapshots(source_db, backup_dir)
+    assert len(deleted) == 4
+    assert remaining[0][0] == snapshot
+    assert [(datetime.now() - created).days for _, created, _ in remaining] == [0, 1, 40]
+
+    # Snapshots within max_age_days are kept even beyond 'keep'
+    assert db_backup.rotate_snapshots(source_db, backup_dir, keep=1, max_age_days=30) == [remaining[2][0]]
+    assert len(db_backup.list_snapshots(source_db, backup_dir)) == 2
+
+
+def test_restore_refuses_a_corrupt_snapshot(source_db, tmp_path):
+    backup_dir = str(tmp_path / 'backups')
+    snapshot = db_backup.backup_database(source_db, backup_dir=backup_dir, rotate=False)
+    with open(snapshot, 'r+b') as f:  # Overwrite b-tree pages of the items table
+        f.seek(4096 * 2)
+        f.write(b'\xa5' * 4096 * 3)
+    assert db_backup.check_database(snapshot)
+
+    conn = sqlite3.connect(source_db)
+    conn.execute("DELETE FROM items WHERE id > 100")
+    conn.commit()
+    conn.close()
+    with pytest.raises(RuntimeError):
+        db_backup.restore_database(snapshot, source_db, backup_dir=backup_dir)
+    assert item_count(source_db) == 100
+    assert [path for path, _, _ in db_backup.list_snapshots(source_db, backup_dir)] == [snapshot]  # No pre-restore snapshot
+
+
+def test_restore_round_trip(source_db, tmp_path):
+    backup_dir = str(tmp_path / 'backups')
+    snapshot = db_backup.backup_database(source_db, backup_dir=backup_dir, rotate=False)
+    conn = sqlite3.connect(source_db)
+    conn.execute("DELETE FROM items")
+    conn.commit()
+    conn.close()
+    db_backup.restore_database(snapshot, source_db, backup_dir=backup_dir)
+    assert item_count(source_db) == 500
+    assert len(db_backup.list_snapshots(source_db, backup_dir)) == 2  # The snapshot and the pre-restore one
@@ -0,0 +1,31 @@
+# test_db_metrics.py - Slow query log: statements and plans, but never parameter values
+import sqlite3
+
+import db_metrics
+
+
+def test_slow_query_log_omits_parameter_values(capsys):
+    conn = sqlite3.connect(':memory:', factory=db_metrics.InstrumentedConnection)
+    conn.execute("CREATE TABLE bookings (id INTEGER PRIMARY KEY, customer_name TEXT, customer_phone TEXT)")
+    stats, token = db_metrics.start_request()
+    try:
+        conn.execute("SELECT id FROM bookings WHERE customer_name = ? AND customer_phone = ?",
+                     ('Jan de Vries', '0612345678')).fetchall()
+        conn.executemany("INSERT INTO bookings (customer_name, customer_phone) VALUES (?, ?)",
+                         [('Jan de Vries', '0612345678'), ('Piet Jansen', None)])
+    finally:
+        db_metrics.finish_request(token)
+
+    assert db_metrics.log_slow_queries(stats, 0.0, context='GET /bookings') == 2
+    logged = capsys.readouterr().err
+    assert 'Jan de Vries' not in logged and '0612345678' not in logged and 'Piet' not in logged
+    assert '-- params: 2 (str, str)' in logged
+    assert '-- params: 2 set(s) of 2 (str, str)' in logged
+    assert 'PLAN ' in logged
+    conn.close()
+
+
+def test_describe_params_shapes():
+    assert db_metrics.describe_params(()) == "none"
+    assert db_metrics.describe_params({'name': 'Jan', 'id': 3}) == ":name str, :id int"
+    assert db_metrics.describe_params(iter([(1,)])) == "list_iterator"
@@ -0,0 +1,96 @@
+# test_db_migrate.py - Savepointed migration runs that resume after a failed step, and create-copy-swap rebuilds
+import sqlite3
+
+import pytest
+
+import database_setup
+import db_migrate
+
+
+def schema_version(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return database_setup.get_schema_version(conn)
+    finally:
+        conn.close()
+
+
+def table_names(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def make_step(version, table, fail=False):
+    def apply_step(cursor, conn, current_version):
+        cursor.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY)")
+        if fail:
+            raise sqlite3.OperationalError(f"step {version} failed")
+        database_setup.set_schema_version(conn, version)
+        return version
+    apply_step.__name__ = f"apply_schema_v{version}"
+    return apply_step
+
+
+def test_failed_step_rolls_back_alone_and_rerun_resumes(empty_db):
+    base = schema_version(empty_db)
+    failing = [(base + 1, "First", make_step(base + 1, 'mig_first')),
+               (base + 2, "Second", make_step(base + 2, 'mig_second', fail=True)),
+               (base + 3, "Third", make_step(base + 3, 'mig_third'))]
+    conn = sqlite3.connect(empty_db)
+    with pytest.raises(sqlite3.OperationalError):
+        db_migrate.run_migrations(conn, failing, base)
+    conn.close()
+
+    # Step 1 was committed, step 2's table went with its savepoint, step 3 never ran
+    assert schema_version(empty_db) == base + 1
+    conn = sqlite3.connect(empty_db)
+    assert {'mig_first', 'mig_second', 'mig_third'} & table_names(conn) == {'mig_first'}
+    assert conn.in_transaction is False
+
+    fixed = failing[:1] + [(base + 2, "Second", make_step(base + 2, 'mig_second')), failing[2]]
+    pending = db_migrate.pending_steps(fixed, schema_version(empty_db), base + 3)
+    assert [version for version, _, _ in pending] == [base + 2, base + 3]
+    timings = db_migrate.run_migrations(conn, pending, base + 1)
+    assert [version for version, _, _ in timings] == [base + 2, base + 3]
+    assert {'mig_first', 'mig_second', 'mig_third'} <= table_names(conn)
+    conn.close()
+    assert schema_version(empty_db) == base + 3
+
+
+def test_dry_run_keeps_nothing(empty_db):
+    base = schema_version(empty_db)
+    conn = sqlite3.connect(empty_db)
+    db_migrate.run_migrations(conn, [(base + 1, "First", make_step(base + 1, 'mig_first'))], base, dry_run=True)
+    assert 'mig_first' not in table_names(conn)
+    conn.close()
+    assert schema_version(empty_db) == base
+
+
+def test_rebuild_table_keeps_rows_indexes_and_triggers():
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    conn.executescript("""
+        CREATE TABLE parts (id INTEGER PRIMARY KEY, name TEXT, legacy TEXT);
+        CREATE INDEX idx_parts_name ON parts (name);
+        CREATE INDEX idx_parts_legacy ON parts (legacy);
+        CREATE TABLE parts_log (part_id INTEGER);
+        CREATE TRIGGER trg_parts_insert AFTER INSERT ON parts BEGIN INSERT INTO parts_log VALUES (NEW.id); END;
+    """)
+    conn.executemany("INSERT INTO parts (name, legacy) VALUES (?, ?)", [(f"part {i}", 'x') for i in range(7)])
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    copied = db_migrate.rebuild_table(cursor, 'parts', "id INTEGER PRIMARY KEY, name TEXT, brand TEXT DEFAULT 'none'",
+                                      chunk_size=3)
+    cursor.execute("COMMIT")
+
+    assert copied == 7
+    assert db_migrate.table_columns(cursor, 'parts') == ['id', 'name', 'brand']
+    assert conn.execute("SELECT COUNT(*), MIN(brand) FROM parts").fetchone() == (7, 'none')
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE tbl_name = 'parts' AND sql IS NOT NULL")
+    dependents = {row[0] for row in rows}
+    assert dependents == {'parts', 'idx_parts_name', 'trg_parts_insert'}  # idx_parts_legacy lost its column
+    assert 'parts__new' not in table_names(conn)
+    conn.execute("INSERT INTO parts (name) VALUES ('new part')")
+    assert conn.execute("SELECT COUNT(*) FROM parts_log").fetchone()[0] == 8
+    plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN SELECT id FROM parts WHERE name = 'part 3'"))
+    assert 'idx_parts_name' in plan
+    conn.close()
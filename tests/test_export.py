@@ -0,0 +1,45 @@
+# test_export.py - /export/<dataset> filter validation and read-pool connection handling
+import pytest
+
+pytest.importorskip('flask')
+import app  # noqa: E402
+
+
+@pytest.mark.parametrize('dataset, status', [
+    ('inventory', 'Completed'),
+    ('bookings', 'Available'),
+    ('orders', 'Available'),
+    ('inventory', 'Nonsense'),
+])
+def test_status_from_another_dataset_is_rejected(app_client, dataset, status):
+    response = app_client.get(f'/export/{dataset}?status={status}')
+    assert response.status_code == 400
+    assert status in response.get_json()['error_message']
+
+
+@pytest.mark.parametrize('dataset, status', [('inventory', 'Available'), ('bookings', 'Completed')])
+def test_status_of_the_dataset_is_exported(app_client, dataset, status):
+    response = app_client.get(f'/export/{dataset}?status={status}&format=json')
+    rows = response.get_json()
+    assert response.status_code == 200
+    assert rows and all(row['status'] == status for row in rows)
+
+
+def test_connection_released_after_streaming(app_client):
+    response = app_client.get('/export/inventory?format=csv')
+    response.get_data()
+    response.close()
+    assert app.get_db_pool(read_only=True).stats()['in_use'] == 0
+
+
+def test_connection_released_when_export_fails_before_streaming(app_client, monkeypatch):
+    def broken_export(*args, **kwargs):
+        raise RuntimeError("export setup failed")
+    monkeypatch.setattr(app, 'stream_export', broken_export)
+    app.app.testing = False  # Let Flask turn the exception into a 500 instead of re-raising it
+    try:
+        response = app_client.get('/export/inventory')
+    finally:
+        app.app.testing = True
+    assert response.status_code == 500
+    assert app.get_db_pool(read_only=True).stats()['in_use'] == 0
@@ -0,0 +1,102 @@
+# test_import_from_csv.py - Catalogue import: bulk FTS / catalogue_version sync behind the trigger gate
+import csv
+import sqlite3
+
+import pytest
+
+import import_from_csv
+
+
+def write_catalogue(path, count, soort='Screen'):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Artikelnummer', 'GPCID', 'Phone Type', 'Soort', 'Merk'])
+        for i in range(count):
+            writer.writerow([f"ART{i:06d}", f"GPC{i:06d}", f"Model {i % 40}", soort, 'Apple' if i % 2 else 'Samsung'])
+    return str(path)
+
+
+def part_types_triggers(conn):
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'part_types'")
+    return {row[0] for row in rows}
+
+
+@pytest.mark.parametrize('bulk_min_rows', [1, 10 ** 9])  # Bulk sync for every chunk, and never
+def test_import_keeps_fts_and_catalogue_version_in_sync(empty_db, tmp_path, monkeypatch, bulk_min_rows):
+    monkeypatch.setattr(import_from_csv, 'BULK_SYNC_MIN_ROWS', bulk_min_rows)
+    conn = sqlite3.connect(empty_db, isolation_level=None)
+    triggers = part_types_triggers(conn)
+    schema_cookie = conn.execute("PRAGMA schema_version").fetchone()[0]
+    version = conn.execute("SELECT version FROM catalogue_version").fetchone()[0]
+
+    summary = import_from_csv.import_part_types_from_csv(empty_db, write_catalogue(tmp_path / 'c.csv', 250),
+                                                         chunk_size=100, workers=1, backup=False)
+    assert summary['inserted'] == 250
+    assert part_types_triggers(conn) == triggers
+    conn.execute("INSERT INTO part_types_fts (part_types_fts) VALUES ('integrity-check')")
+    assert conn.execute("SELECT COUNT(*) FROM part_types_fts WHERE part_types_fts MATCH 'gpc00012*'").fetchone()[0] == 10
+    after_insert = conn.execute("SELECT version FROM catalogue_version").fetchone()[0]
+    assert after_insert > version
+
+    summary = import_from_csv.import_part_types_from_csv(empty_db, write_catalogue(tmp_path / 'u.csv', 250, soort='Battery'),
+                                                         upsert=True, chunk_size=100, workers=1, backup=False)
+    assert summary['updated'] == 250
+    assert conn.execute("SELECT version FROM catalogue_version").fetchone()[0] > after_insert
+    assert part_types_triggers(conn) == triggers
+    assert conn.execute("PRAGMA schema_version").fetchone()[0] == schema_cookie  # No DDL while importing
+    assert conn.execute("SELECT COUNT(*) FROM part_types_bulk_sync").fetchone()[0] == 0
+    conn.close()
+
+
+def test_failed_bulk_chunk_reopens_the_trigger_gate(empty_db, monkeypatch):
+    monkeypatch.setattr(import_from_csv, 'BULK_SYNC_MIN_ROWS', 1)
+    monkeypatch.setattr(import_from_csv, 'BULK_FTS_SYNC_SQL', "INSERT INTO no_such_table SELECT ?")
+    conn = sqlite3.connect(empty_db, isolation_level=None)
+    triggers = part_types_triggers(conn)
+    record = ('Apple X Screen', 'GPC1', 'ART1', 'Screen', 'Apple', 'X')
+    with pytest.raises(sqlite3.OperationalError):
+        import_from_csv.write_chunk(conn, [record], {}, {}, set(), upsert=False)
+    assert part_types_triggers(conn) == triggers
+    assert conn.execute("SELECT COUNT(*) FROM part_types_bulk_sync").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM part_types WHERE part_number = 'GPC1'").fetchone()[0] == 0
+    version = conn.execute("SELECT version FROM catalogue_version").fetchone()[0]
+    # With the gate open again the per-row triggers fire
+    conn.execute("INSERT INTO part_types (part_name, part_number) VALUES ('Apple X Screen', 'GPC2')")
+    assert conn.execute("SELECT version FROM catalogue_version").fetchone()[0] == version + 1
+    assert conn.execute("SELECT COUNT(*) FROM part_types_fts WHERE part_types_fts MATCH 'gpc2'").fetchone()[0] == 1
+    conn.close()
+
+
+@pytest.mark.parametrize('workers', [1, 2])  # Sequential text stream, and byte ranges in worker processes
+def test_late_windows_1252_byte_is_decoded_on_every_parse_path(empty_db, tmp_path, workers):
+    csv_path = tmp_path / 'ansi.csv'
+    rows = [f"ART{i:06d},GPC{i:06d},Model {i},Screen,Apple" for i in range(3000)]  # Well past SNIFF_SAMPLE_BYTES
+    rows.append("ART999999,GPC999999,Caf\xe9 Phone,Screen,Apple")
+    csv_path.write_bytes(("Artikelnummer,GPCID,Phone Type,Soort,Merk\n" + "\n".join(rows) + "\n").encode('latin-1'))
+    assert len(rows[0]) * 3000 > import_from_csv.SNIFF_SAMPLE_BYTES
+
+    summary = import_from_csv.import_part_types_from_csv(empty_db, str(csv_path), workers=workers, backup=False)
+    assert summary['inserted'] == 3001
+    conn = sqlite3.connect(empty_db)
+    assert conn.execute("SELECT model FROM part_types WHERE part_number = 'GPC999999'").fetchone()[0] == "Caf\u00e9 Phone"
+    conn.close()
+
+
+@pytest.mark.parametrize('value, stored', [
+    ('2024-03-05', '2024-03-05 00:00:00'),
+    (' 2024-03-05 ', '2024-03-05 00:00:00'),
+    ('2024-03-05 14:30:00', '2024-03-05 14:30:00'),
+])
+def test_parse_order_date(value, stored):
+    assert import_from_csv.parse_order_date(value) == stored
+
+
+@pytest.mark.parametrize('value', ['05-03-2024', '2024-13-01', '2024-02-30', 'yesterday', ''])
+def test_stock_import_rejects_malformed_order_date_before_writing(empty_db, tmp_path, value):
+    csv_path = tmp_path / 'stock.csv'
+    csv_path.write_text("GPCID,Artikelnummer,Aantal\nGPC1,ART1,2\n", encoding='utf-8')
+    with pytest.raises(ValueError):
+        import_from_csv.import_stock_receipt_from_csv(empty_db, str(csv_path), order_date=value, backup=False)
+    conn = sqlite3.connect(empty_db)
+    assert conn.execute("SELECT COUNT(*) FROM stock_orders").fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,84 @@
+# test_item_claims.py - Guarded UPDATE ... RETURNING claims: no double booking, all or nothing, FIFO
+import sqlite3
+
+import pytest
+
+from db_pool import begin_immediate
+from inventory_ops import claim_items, claim_available_units
+
+
+@pytest.fixture
+def conn(empty_db):
+    conn = sqlite3.connect(empty_db, isolation_level=None)
+    conn.execute("INSERT INTO part_types (id, part_name, part_number) VALUES (1, 'Screen A', 'GPC1'), "
+                 "(2, 'Battery B', 'GPC2')")
+    yield conn
+    conn.close()
+
+
+def add_items(conn, part_type_id, dates, status='Available'):
+    ids = []
+    for date_received in dates:
+        cursor = conn.execute("INSERT INTO inventory_items (part_type_id, status, date_received) VALUES (?, ?, ?)",
+                              (part_type_id, status, date_received))
+        ids.append(cursor.lastrowid)
+    return ids
+
+
+def statuses(conn, item_ids):
+    placeholders = ", ".join("?" * len(item_ids))
+    return dict(conn.execute(f"SELECT id, status FROM inventory_items WHERE id IN ({placeholders})", item_ids).fetchall())
+
+
+def claim_or_roll_back(conn, claim, *args, **kwargs):
+    """Runs a claim the way the app does: in begin_immediate(), rolled back when it raises."""
+    cursor = conn.cursor()
+    begin_immediate(conn)
+    try:
+        claimed = claim(cursor, *args, **kwargs)
+    except ValueError:
+        conn.rollback()
+        raise
+    conn.commit()
+    return claimed
+
+
+def test_second_claim_of_the_same_item_is_rejected(conn, empty_db):
+    item_id, = add_items(conn, 1, ['2024-01-01'])
+    assert claim_or_roll_back(conn, claim_items, [item_id, item_id]) == [item_id]
+
+    other = sqlite3.connect(empty_db, isolation_level=None)  # A second request on its own connection
+    with pytest.raises(ValueError, match=r"not Available \(Status: Reserved\)"):
+        claim_or_roll_back(other, claim_items, [item_id], status='Installed')
+    other.close()
+    assert statuses(conn, [item_id]) == {item_id: 'Reserved'}
+
+
+def test_claim_items_is_all_or_nothing(conn):
+    free, taken = add_items(conn, 1, ['2024-01-01', '2024-01-02'])
+    conn.execute("UPDATE inventory_items SET status = 'Broken' WHERE id = ?", (taken,))
+    with pytest.raises(ValueError) as error:
+        claim_or_roll_back(conn, claim_items, [free, taken, 999999])
+    assert f"Item (ID: {taken}) not Available (Status: Broken)." in str(error.value)
+    assert "ID 999999 not found" in str(error.value)
+    assert statuses(conn, [free, taken]) == {free: 'Available', taken: 'Broken'}
+
+
+def test_partial_quantity_claim_claims_nothing(conn):
+    item_ids = add_items(conn, 1, ['2024-01-01', '2024-01-02'])
+    with pytest.raises(ValueError, match="Only 2 Available unit"):
+        claim_or_roll_back(conn, claim_available_units, 1, 3)
+    assert set(statuses(conn, item_ids).values()) == {'Available'}
+    with pytest.raises(ValueError):
+        claim_or_roll_back(conn, claim_available_units, 1, 0)
+
+
+def test_claim_available_units_is_fifo_by_date_received(conn):
+    # Inserted out of date order; the two oldest (ties broken by id) must go first
+    newest, oldest, middle, middle_later_id = add_items(conn, 1, ['2024-03-01', '2024-01-01', '2024-02-01', '2024-02-01'])
+    add_items(conn, 2, ['2023-01-01'])  # Older, but another part type
+    add_items(conn, 1, ['2023-06-01'], status='Reserved')  # Older, but not Available
+    assert claim_or_roll_back(conn, claim_available_units, 1, 2) == sorted([oldest, middle])
+    assert claim_or_roll_back(conn, claim_available_units, 1, 1, status='Installed') == [middle_later_id]
+    assert statuses(conn, [newest, oldest, middle, middle_later_id]) == {
+        newest: 'Available', oldest: 'Reserved', middle: 'Reserved', middle_later_id: 'Installed'}
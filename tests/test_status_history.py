@@ -0,0 +1,37 @@
+# test_status_history.py - generate_data writes back-dated status paths and leaves the event triggers in place
+import shutil
+import sqlite3
+
+import generate_data
+from inventory_ops import booking_turnaround, status_history, time_in_status
+
+
+def test_generated_history_follows_status_paths(generated_db):
+    conn = sqlite3.connect(generated_db)
+    cursor = conn.cursor()
+    for booking_id, status, booking_date, last_updated in cursor.execute(
+            "SELECT id, status, booking_date, last_updated FROM bookings ORDER BY id LIMIT 50").fetchall():
+        history = status_history(cursor, 'booking', booking_id)
+        assert tuple(event['new_status'] for event in history) == generate_data.BOOKING_STATUS_PATHS[status]
+        assert history[0]['ts'] == booking_date and history[-1]['ts'] == last_updated
+
+    turnaround = booking_turnaround(cursor)
+    assert turnaround['bookings'] == cursor.execute("SELECT COUNT(*) FROM bookings WHERE status = 'Completed'").fetchone()[0]
+    assert 0 < turnaround['avg_days'] <= turnaround['max_days']
+    items = time_in_status(cursor, 'item')
+    assert items['Available']['stays'] > 0 and items['Available']['avg_days'] > 1
+    assert items['Reserved']['stays'] == items['Installed']['current']
+    conn.close()
+
+
+def test_event_triggers_are_restored(generated_db, tmp_path):
+    db_path = str(tmp_path / 'inventory.db')
+    shutil.copy(generated_db, db_path)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    booking_id = conn.execute("INSERT INTO bookings (customer_name, device_model, reported_issue) "
+                              "VALUES ('Test Customer', 'Phone X', 'No sound')").lastrowid
+    conn.execute("UPDATE bookings SET status = 'Cancelled' WHERE id = ?", (booking_id,))
+    history = status_history(conn.cursor(), 'booking', booking_id)
+    transitions = [(event['old_status'], event['new_status']) for event in history]
+    assert transitions == [(None, 'Booked In'), ('Booked In', 'Cancelled')]
+    conn.close()